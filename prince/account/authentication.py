@@ -0,0 +1,84 @@
+# authentication.py
+"""JWT authentication without a ``User`` query per request.
+
+Access tokens issued by ``get_tokens_for_user`` carry the username and the
+active/staff flags. ``StatelessJWTAuthentication`` builds ``request.user``
+from those claims with every other column deferred, so the rest of the row
+is only loaded if a view actually reads it.
+
+Revocation is checked against a short-lived cache of each user's
+active/staff state (``AUTH_USER_STATE_TTL`` seconds, one small query per
+user when it expires). Saving or deleting a user clears their entry in this
+process; other processes pick the change up within the TTL. Tokens issued
+before the claims existed fall back to the regular database lookup.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+USER_CLAIMS = ('username', 'is_active', 'is_staff')
+
+_MISSING = object()
+
+
+def user_state_key(user_id):
+    return f'account:user-state:{user_id}'
+
+
+def add_user_claims(token, user):
+    """Put the claims StatelessJWTAuthentication needs on ``token``"""
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def get_user_state(user_id):
+    """(is_active, is_staff) for ``user_id``, or None if the user is gone"""
+    key = user_state_key(user_id)
+    state = cache.get(key, _MISSING)
+    if state is _MISSING:
+        User = get_user_model()
+        state = User.objects.filter(pk=user_id).values_list('is_active', 'is_staff').first()
+        cache.set(key, state, getattr(settings, 'AUTH_USER_STATE_TTL', 30))
+    return state
+
+
+def forget_user_state(user_id):
+    cache.delete(user_state_key(user_id))
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that trusts the token's user claims"""
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN or any(claim not in validated_token for claim in USER_CLAIMS):
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        state = get_user_state(user_id)
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        is_active, is_staff = state
+        if not is_active or not validated_token['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        User = get_user_model()
+        id_field = User._meta.get_field(api_settings.USER_ID_FIELD)
+        claims = {
+            # simplejwt stores the id claim as a string
+            id_field.attname: id_field.to_python(user_id),
+            'username': validated_token['username'],
+            'is_active': True,
+            # A demotion takes effect as soon as the cached state expires
+            'is_staff': bool(validated_token['is_staff'] and is_staff),
+        }
+        fields = [field.attname for field in User._meta.concrete_fields if field.attname in claims]
+        return User.from_db(None, fields, [claims[name] for name in fields])
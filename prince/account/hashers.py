@@ -0,0 +1,36 @@
+# hashers.py
+"""Password hasher with a configurable cost for 4-digit POS PINs.
+
+``PIN_HASHER_POLICY`` picks the PBKDF2 iteration count. The hasher keeps
+Django's ``pbkdf2_sha256`` format, so hashes made under any policy still
+verify. ``authenticate()`` rehashes a PIN on the next successful login when
+its stored iteration count differs from the current policy.
+
+A 4-digit PIN has only 10,000 values, so hash cost adds little against an
+offline attack. Online guessing is stopped by ``account.throttling``.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+PIN_HASHER_POLICIES = {
+    'strict': PBKDF2PasswordHasher.iterations,  # Django's default
+    'balanced': 100_000,
+    'fast': 20_000,
+}
+
+
+def policy_iterations(policy):
+    try:
+        return PIN_HASHER_POLICIES[policy]
+    except KeyError:
+        raise ValueError(
+            f"Unknown PIN_HASHER_POLICY {policy!r}, expected one of {', '.join(PIN_HASHER_POLICIES)}"
+        )
+
+
+class PinPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the iteration count taken from PIN_HASHER_POLICY"""
+
+    @property
+    def iterations(self):
+        return policy_iterations(getattr(settings, 'PIN_HASHER_POLICY', 'strict'))
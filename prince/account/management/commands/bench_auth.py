@@ -0,0 +1,72 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from account.authentication import StatelessJWTAuthentication
+from account.views import get_tokens_for_user
+from orders.models import Cart
+from prince.benchmark import rolled_back, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Requests/sec of authenticated cart/ and orders/ calls with JWTAuthentication vs StatelessJWTAuthentication"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint per round')
+        parser.add_argument('--rounds', type=int, default=3)
+        parser.add_argument('--items', type=int, default=5, help='Lines in the benchmark cart')
+
+    def handle(self, *args, **options):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with rolled_back():
+            products = seed_catalog(products=max(options['items'], 1), categories=1)
+            user = User.objects.create_user(username='bench-auth', password='1234')
+            cart = Cart.objects.create(user=user)
+            for product in products[:options['items']]:
+                cart.items.create(item=product, quantity=1)
+            access = get_tokens_for_user(user)['access']
+
+            client = Client(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Bearer {access}')
+            auth_classes = (('JWTAuthentication', JWTAuthentication), ('Stateless', StatelessJWTAuthentication))
+            original = APIView.authentication_classes
+            results = {}
+            try:
+                # Rounds alternate between the classes so drift over the run hits both alike
+                for _ in range(options['rounds']):
+                    for label, auth_class in auth_classes:
+                        APIView.authentication_classes = [auth_class]
+                        cache.clear()
+                        for path in ('/api/cart/', '/api/orders/'):
+                            # Warm up: URL resolution, catalog cache, user state cache
+                            response = client.get(path)
+                            if response.status_code != 200:
+                                raise CommandError(f"{label} GET {path} returned {response.status_code}")
+
+                            queries.clear()
+                            start = time.perf_counter()
+                            with connection.execute_wrapper(count):
+                                for _ in range(options['requests']):
+                                    client.get(path)
+                            rate = options['requests'] / (time.perf_counter() - start)
+                            best = results.get((label, path), (0, 0))[0]
+                            results[label, path] = (max(rate, best), len(queries) / options['requests'])
+            finally:
+                APIView.authentication_classes = original
+
+        self.stdout.write(f"{'endpoint':<14} {'auth':<18} {'best req/s':>10} {'queries/req':>12}")
+        for (label, path), (rate, per_request) in sorted(results.items(), key=lambda entry: entry[0][1]):
+            self.stdout.write(f"{path:<14} {label:<18} {rate:>10.0f} {per_request:>12.1f}")
+        for path in ('/api/cart/', '/api/orders/'):
+            speedup = results['Stateless', path][0] / results['JWTAuthentication', path][0]
+            self.stdout.write(f"{path} speedup: {speedup:.2f}x")
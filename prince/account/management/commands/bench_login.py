@@ -0,0 +1,58 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from account.hashers import PIN_HASHER_POLICIES
+from account.throttling import login_limiter
+from prince.benchmark import rolled_back
+
+
+class Command(BaseCommand):
+    help = "Logins/sec through LoginView for each PIN_HASHER_POLICY, plus rehash and lockout checks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help='Logins per policy')
+
+    def login(self, client, phone, pin):
+        return client.post('/api/login/', {'phone': phone, 'password': pin}, content_type='application/json')
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST='localhost')
+        login_limiter.clear()
+
+        self.stdout.write(f"{'policy':<10} {'iterations':>10} {'logins/s':>9}")
+        with rolled_back():
+            for policy, iterations in PIN_HASHER_POLICIES.items():
+                with override_settings(PIN_HASHER_POLICY=policy):
+                    phone = f'bench-{policy}'
+                    User.objects.create_user(username=phone, password='1234')
+                    start = time.perf_counter()
+                    for _ in range(options['logins']):
+                        if self.login(client, phone, '1234').status_code != 200:
+                            raise CommandError(f"Login failed under the {policy} policy")
+                    rate = options['logins'] / (time.perf_counter() - start)
+                    self.stdout.write(f"{policy:<10} {iterations:>10} {rate:>9.1f}")
+
+            # A PIN hashed under one policy is rehashed on login under another
+            with override_settings(PIN_HASHER_POLICY='strict'):
+                User.objects.create_user(username='bench-rehash', password='1234')
+            with override_settings(PIN_HASHER_POLICY='fast'):
+                self.login(client, 'bench-rehash', '1234')
+            stored = User.objects.get(username='bench-rehash').password.split('$')[1]
+            if int(stored) != PIN_HASHER_POLICIES['fast']:
+                raise CommandError(f"PIN was not rehashed on login (still {stored} iterations)")
+            self.stdout.write(f"rehash on login: strict -> fast ({stored} iterations)")
+
+            # Locked-out phones are answered without hashing
+            for _ in range(login_limiter.max_failures):
+                self.login(client, 'bench-rehash', '0000')
+            start = time.perf_counter()
+            for _ in range(options['logins']):
+                if self.login(client, 'bench-rehash', '0000').status_code != 429:
+                    raise CommandError("Locked-out phone was not rejected with 429")
+            rate = options['logins'] / (time.perf_counter() - start)
+            self.stdout.write(f"{'locked out':<10} {'-':>10} {rate:>9.1f}")
+
+        login_limiter.clear()
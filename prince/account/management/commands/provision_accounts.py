@@ -0,0 +1,41 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from account.provisioning import AccountFormatError, parse_accounts, provision_accounts
+
+
+class Command(BaseCommand):
+    help = "Bulk create PIN accounts from a CSV or JSON file of name, phone and pin"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON file with name, phone and pin")
+        parser.add_argument('--format', choices=['csv', 'json'], help="Defaults to the file extension")
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, don't save anything")
+        parser.add_argument('--workers', type=int, help="Hashing processes (default ACCOUNT_PROVISION_WORKERS)")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+
+        try:
+            with open(path, 'rb') as f:
+                rows = parse_accounts(f.read(), file_format)
+        except OSError as e:
+            raise CommandError(f"Can't read {path}: {e}")
+        except AccountFormatError as e:
+            raise CommandError(str(e))
+
+        start = time.perf_counter()
+        result = provision_accounts(rows, dry_run=options['dry_run'], workers=options['workers'], processes=True)
+        elapsed = time.perf_counter() - start
+
+        if result['errors']:
+            for error in result['errors']:
+                details = '; '.join(f"{field}: {message}" for field, message in error['errors'].items())
+                self.stderr.write(f"Row {error['row']}: {details}")
+            raise CommandError(f"{len(result['errors'])} invalid row(s), no accounts created")
+
+        prefix = "Dry run: would create" if options['dry_run'] else "Created"
+        self.stdout.write(self.style.SUCCESS(f"{prefix} {result['created']} accounts in {elapsed:.1f}s"))
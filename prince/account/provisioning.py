@@ -0,0 +1,191 @@
+# provisioning.py
+"""Bulk creation of PIN accounts from CSV or JSON.
+
+Every row has the columns in ``ACCOUNT_FIELDS``, the same data SignupView
+takes one account at a time. PINs are hashed on a process pool by the
+``provision_accounts`` command and on threads (PBKDF2 releases the GIL) in
+AccountProvisionView, which must not fork its server. Phones are checked
+against one prefetched set of existing usernames and profile phones. Users
+and profiles are then inserted with ``bulk_create`` in chunks, inside one
+transaction; a phone registered in between is reported like any other
+taken phone.
+"""
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from .models import UserProfiles
+
+ACCOUNT_FIELDS = ['name', 'phone', 'pin']
+INSERT_CHUNK_SIZE = 500
+# Below this many PINs, starting workers costs more than it saves
+POOL_MIN_ROWS = 32
+
+
+class AccountFormatError(ValueError):
+    """Raised when a provisioning file can't be parsed at all"""
+
+
+def parse_accounts(content, file_format):
+    """Turn CSV or JSON text/bytes into a list of row dicts"""
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+
+    if file_format == 'csv':
+        reader = csv.DictReader(io.StringIO(content))
+        if not reader.fieldnames or not set(ACCOUNT_FIELDS) <= set(reader.fieldnames):
+            raise AccountFormatError(f"CSV header must include {', '.join(ACCOUNT_FIELDS)}")
+        return list(reader)
+
+    if file_format == 'json':
+        try:
+            data = json.loads(content)
+        except ValueError as e:
+            raise AccountFormatError(f"Invalid JSON: {e}")
+        return rows_from_data(data)
+
+    raise AccountFormatError(f"Unsupported format '{file_format}'. Use csv or json")
+
+
+def rows_from_data(data):
+    """Accept either a list of rows or {"rows": [...]}"""
+    if isinstance(data, dict):
+        data = data.get('rows')
+    if not isinstance(data, list):
+        raise AccountFormatError("Expected a list of rows")
+    return data
+
+
+def _text(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def existing_phones():
+    """Every phone already taken as a username or a profile phone, in one query"""
+    usernames = User.objects.values_list('username', flat=True)
+    phones = UserProfiles.objects.values_list('phone', flat=True)
+    return set(usernames.union(phones))
+
+
+def validate_accounts(rows):
+    """Validate all rows; return (cleaned_rows, errors) like validate_catalog"""
+    name_length = User._meta.get_field('first_name').max_length
+    phone_length = UserProfiles._meta.get_field('phone').max_length
+    taken = existing_phones()
+
+    cleaned_rows = []
+    errors = []
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'errors': {'row': 'Expected an object with account fields'}})
+            continue
+
+        cleaned = {field: _text(row.get(field)) for field in ACCOUNT_FIELDS}
+        row_errors = {}
+        if not cleaned['name']:
+            row_errors['name'] = 'This field is required.'
+        elif len(cleaned['name']) > name_length:
+            row_errors['name'] = 'Name is too long.'
+
+        if not cleaned['phone']:
+            row_errors['phone'] = 'This field is required.'
+        elif len(cleaned['phone']) > phone_length:
+            row_errors['phone'] = 'Phone is too long.'
+        elif cleaned['phone'] in taken:
+            row_errors['phone'] = 'An account with this phone already exists.'
+        elif cleaned['phone'] in seen:
+            row_errors['phone'] = 'Duplicate phone in this file.'
+        seen.add(cleaned['phone'])
+
+        # Same rule as SignupSerializer.validate_password
+        if len(cleaned['pin']) != 4 or not cleaned['pin'].isdigit():
+            row_errors['pin'] = 'PIN must be a 4-digit number.'
+
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+            continue
+        cleaned_rows.append(cleaned)
+
+    return cleaned_rows, errors
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+def hash_pins(pins, workers=None, processes=False):
+    """make_password() every PIN, on a thread or process pool for large batches"""
+    pins = list(pins)
+    if workers is None:
+        workers = getattr(settings, 'ACCOUNT_PROVISION_WORKERS', 0) or os.cpu_count() or 1
+    workers = min(workers, len(pins))
+    if workers <= 1 or len(pins) < POOL_MIN_ROWS:
+        return [make_password(pin) for pin in pins]
+
+    if not processes:
+        with ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(make_password, pins))
+
+    settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'prince.settings')
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(settings_module,)) as executor:
+        return list(executor.map(make_password, pins, chunksize=max(1, len(pins) // (workers * 4))))
+
+
+def _insert_accounts(cleaned_rows, passwords):
+    with transaction.atomic():
+        for start in range(0, len(cleaned_rows), INSERT_CHUNK_SIZE):
+            chunk = cleaned_rows[start:start + INSERT_CHUNK_SIZE]
+            users = User.objects.bulk_create([
+                User(username=row['phone'], first_name=row['name'], password=password)
+                for row, password in zip(chunk, passwords[start:start + INSERT_CHUNK_SIZE])
+            ])
+            if any(user.pk is None for user in users):
+                # Backends that can't return ids from a bulk insert
+                ids = dict(User.objects.filter(username__in=[row['phone'] for row in chunk]).values_list('username', 'id'))
+                for user in users:
+                    user.pk = ids[user.username]
+            UserProfiles.objects.bulk_create([
+                UserProfiles(user_id=user.pk, phone=user.username) for user in users
+            ])
+
+
+def provision_accounts(rows, dry_run=False, workers=None, processes=False):
+    """Validate and create accounts. Nothing is written if any row is invalid.
+
+    ``processes`` hashes the PINs on worker processes instead of threads;
+    only for the management command.
+    """
+    result = {'created': 0, 'errors': []}
+    cleaned_rows, errors = validate_accounts(rows)
+    if errors:
+        result['errors'] = errors
+        return result
+
+    result['created'] = len(cleaned_rows)
+    if dry_run or not cleaned_rows:
+        return result
+
+    passwords = hash_pins([row['pin'] for row in cleaned_rows], workers=workers, processes=processes)
+
+    try:
+        _insert_accounts(cleaned_rows, passwords)
+    except IntegrityError:
+        # Someone signed up with one of the phones since it was validated
+        _, errors = validate_accounts(rows)
+        result['created'] = 0
+        result['errors'] = errors or [
+            {'row': None, 'errors': {'phone': 'An account with one of these phones was just created.'}}
+        ]
+    return result
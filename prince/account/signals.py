@@ -0,0 +1,13 @@
+# signals.py
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import forget_user_state
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """Make token authentication see deactivations and demotions right away"""
+    forget_user_state(instance.pk)
@@ -1,3 +1,208 @@
-from django.test import TestCase
+from itertools import count
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from prince.testing import PIN, QueryCountMixin, auth_client, make_user
+from .authentication import user_state_key
+from .models import UserProfiles
+from .provisioning import POOL_MIN_ROWS, existing_phones
+from .throttling import login_limiter
+from .urls import urlpatterns
+
+phones = (f'70{n:08d}' for n in count())
+
+
+def make_users(size):
+    return [make_user(next(phones)) for _ in range(size)]
+
+
+@override_settings(QUERY_BUDGET_ACTION='raise', PIN_HASHER_POLICY='fast')
+class AccountQueryCountTests(QueryCountMixin, TestCase):
+    """The account endpoints run the same queries however many accounts exist"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = auth_client(make_user(next(phones), staff=True))
+
+    def test_routes_covered(self):
+        self.assertRoutesCovered(urlpatterns)
+
+    def test_signup(self):
+        def prepare(size):
+            make_users(size)
+            body = {'name': 'New Cashier', 'phone': next(phones), 'password': PIN}
+            return lambda: APIClient().post(reverse('signup'), body, format='json')
+        self.assertFlatQueries('POST signup', prepare, status=201)
+
+    def test_login(self):
+        def prepare(size):
+            user = make_users(size)[0]
+            body = {'phone': user.username, 'password': PIN}
+            return lambda: APIClient().post(reverse('login'), body, format='json')
+        self.assertFlatQueries('POST login', prepare)
+
+    def test_token_refresh(self):
+        def prepare(size):
+            user = make_users(size)[0]
+            response = APIClient().post(reverse('login'), {'phone': user.username, 'password': PIN}, format='json')
+            body = {'refresh': response.data['tokens']['refresh']}
+            return lambda: APIClient().post(reverse('token_refresh'), body, format='json')
+        self.assertFlatQueries('POST token refresh', prepare)
+
+    def test_account_provision(self):
+        def prepare(size):
+            make_users(size)
+            rows = [{'name': f'Cashier {i}', 'phone': next(phones), 'pin': PIN} for i in range(size)]
+            return lambda: self.admin.post(reverse('account-provision'), {'rows': rows}, format='json')
+        self.assertFlatQueries('POST accounts provision', prepare)
+
+
+@override_settings(PIN_HASHER_POLICY='fast')
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(next(phones), staff=True)
+        self.client = auth_client(self.user)
+
+    def test_user_comes_from_the_token_claims(self):
+        self.assertEqual(self.client.get(reverse('cart-detail')).status_code, 200)
+        # The active/staff state is cached, so the user row isn't read again
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('order-export')).status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('cart-detail')).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('cart-detail')).status_code, 401)
+
+    def test_demoted_user_loses_staff_access(self):
+        self.assertEqual(self.client.get(reverse('order-export')).status_code, 200)
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('order-export')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('cart-detail')).status_code, 200)
+
+    def test_promotion_needs_a_new_token(self):
+        cashier = make_user(next(phones))
+        client = auth_client(cashier)
+        User.objects.filter(pk=cashier.pk).update(is_staff=True)
+        self.assertEqual(client.get(reverse('order-export')).status_code, 403)
+        cashier.refresh_from_db()
+        self.assertEqual(auth_client(cashier).get(reverse('order-export')).status_code, 200)
+
+    def test_deleted_user_is_rejected(self):
+        self.user.delete()
+        self.assertEqual(self.client.get(reverse('cart-detail')).status_code, 401)
+
+    def test_change_in_another_process_applies_when_the_cached_state_expires(self):
+        self.assertEqual(self.client.get(reverse('cart-detail')).status_code, 200)
+        # No signal in this process: the cached state holds until it expires
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(reverse('cart-detail')).status_code, 200)
+        cache.delete(user_state_key(self.user.pk))
+        self.assertEqual(self.client.get(reverse('cart-detail')).status_code, 401)
+
+
+@override_settings(PIN_HASHER_POLICY='fast')
+class LoginLockoutTests(TestCase):
+    def setUp(self):
+        login_limiter.clear()
+        self.addCleanup(login_limiter.clear)
+        self.user = make_user(next(phones))
+
+    def login(self, pin):
+        return APIClient().post(reverse('login'), {'phone': self.user.username, 'password': pin}, format='json')
+
+    def test_phone_is_locked_out_after_too_many_failures(self):
+        for _ in range(login_limiter.max_failures):
+            self.assertEqual(self.login('0000').status_code, 400)
+        response = self.login(PIN)
+        self.assertEqual(response.status_code, 429)
+        retry_after = int(response['Retry-After'])
+        self.assertTrue(0 < retry_after <= login_limiter.window + 1)
+
+    def test_success_clears_the_failures(self):
+        for _ in range(login_limiter.max_failures - 1):
+            self.login('0000')
+        self.assertEqual(self.login(PIN).status_code, 200)
+        self.assertEqual(self.login('0000').status_code, 400)
+        self.assertEqual(self.login(PIN).status_code, 200)
+
+    def test_attempts_in_flight_count_against_the_limit(self):
+        # Attempts whose PIN hasn't been checked yet already use up the allowance
+        for _ in range(login_limiter.max_failures):
+            self.assertEqual(login_limiter.attempt(self.user.username), 0)
+        self.assertGreater(login_limiter.attempt(self.user.username), 0)
+        self.assertEqual(self.login(PIN).status_code, 429)
+
+
+@override_settings(PIN_HASHER_POLICY='fast')
+class AccountProvisioningTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        login_limiter.clear()
+        self.admin = auth_client(make_user(next(phones), staff=True))
+
+    def provision(self, rows, **params):
+        url = reverse('account-provision')
+        if params:
+            url += '?' + '&'.join(f'{key}={value}' for key, value in params.items())
+        return self.admin.post(url, {'rows': rows}, format='json')
+
+    def test_accounts_are_created_and_can_log_in(self):
+        rows = [{'name': f'Cashier {i}', 'phone': next(phones), 'pin': '4321'} for i in range(3)]
+        response = self.provision(rows)
+
+        self.assertEqual(response.data, {'created': 3, 'errors': []})
+        self.assertEqual(UserProfiles.objects.filter(phone__in=[row['phone'] for row in rows]).count(), 3)
+        login = APIClient().post(reverse('login'), {'phone': rows[0]['phone'], 'password': '4321'}, format='json')
+        self.assertEqual(login.status_code, 200)
+
+    def test_invalid_rows_save_nothing(self):
+        taken = make_user(next(phones)).username
+        phone = next(phones)
+        upload = SimpleUploadedFile('staff.csv', (
+            f'name,phone,pin\nAsha,{phone},1234\nRavi,{taken},1234\n,{next(phones)},12\nAsha again,{phone},1234\n'
+        ).encode())
+        response = self.admin.post(reverse('account-provision'), {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3, 4])
+        self.assertEqual(set(response.data['errors'][1]['errors']), {'name', 'pin'})
+        self.assertFalse(UserProfiles.objects.filter(phone=phone).exists())
+
+    def test_dry_run(self):
+        phone = next(phones)
+        response = self.provision([{'name': 'Asha', 'phone': phone, 'pin': '1234'}], dry_run=1)
+        self.assertEqual(response.data['created'], 1)
+        self.assertFalse(User.objects.filter(username=phone).exists())
+
+    def test_phone_registered_after_validation_is_a_row_error(self):
+        phone = next(phones)
+        rows = [{'name': 'Asha', 'phone': next(phones), 'pin': '1234'}, {'name': 'Ravi', 'phone': phone, 'pin': '1234'}]
+        make_user(phone)
+        # Validation runs before the other signup, the insert after it
+        with mock.patch('account.provisioning.existing_phones', side_effect=[set(), existing_phones()]):
+            response = self.provision(rows)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual(response.data['errors'], [
+            {'row': 2, 'errors': {'phone': 'An account with this phone already exists.'}}
+        ])
+        self.assertFalse(User.objects.filter(username=rows[0]['phone']).exists())
+
+    @override_settings(ACCOUNT_PROVISION_WORKERS=2)
+    def test_view_hashes_on_threads(self):
+        rows = [{'name': f'Cashier {i}', 'phone': next(phones), 'pin': '1234'} for i in range(POOL_MIN_ROWS)]
+        with mock.patch('account.provisioning.ProcessPoolExecutor', side_effect=AssertionError('forked')):
+            response = self.provision(rows)
+        self.assertEqual(response.data['created'], POOL_MIN_ROWS)
+        self.assertTrue(User.objects.get(username=rows[-1]['phone']).check_password('1234'))
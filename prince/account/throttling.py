@@ -0,0 +1,85 @@
+# throttling.py
+"""Per-process limiter for failed PIN logins.
+
+Failures are counted per phone number. Once a phone has
+``LOGIN_MAX_FAILURES`` failures within ``LOGIN_LOCKOUT_SECONDS``, LoginView
+answers 429 without running the password hasher. Each attempt is counted
+as a failure before the PIN is checked and a successful login clears the
+count. State is in memory and bounded to ``LOGIN_LIMITER_MAX_PHONES``
+phones (least recently failed are dropped first).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class LoginAttemptLimiter:
+    def __init__(self, max_failures=5, window=300, max_phones=10000):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_phones = max_phones
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, phone, now):
+        failures = [at for at in self._failures.get(phone, ()) if now - at < self.window]
+        if failures:
+            self._failures[phone] = failures
+        else:
+            self._failures.pop(phone, None)
+        return failures
+
+    def _retry_after(self, phone, now):
+        failures = self._recent(phone, now)
+        if len(failures) < self.max_failures:
+            return 0
+        return max(1, int(failures[-self.max_failures] + self.window - now) + 1)
+
+    def _record(self, phone, now):
+        failures = self._recent(phone, now)
+        failures.append(now)
+        self._failures[phone] = failures[-self.max_failures:]
+        self._failures.move_to_end(phone)
+        while len(self._failures) > self.max_phones:
+            self._failures.popitem(last=False)
+
+    def retry_after(self, phone):
+        """Seconds until ``phone`` may try again, or 0 if it may try now"""
+        with self._lock:
+            return self._retry_after(phone, time.monotonic())
+
+    def attempt(self, phone):
+        """Reserve a login attempt for ``phone`` before its PIN is checked.
+
+        Returns the seconds until the phone may try again, or 0 with the
+        attempt counted as a failure until ``succeeded()`` clears it. The
+        check and the count share one lock, so concurrent guesses can't all
+        pass the check before any of them is counted.
+        """
+        now = time.monotonic()
+        with self._lock:
+            retry_after = self._retry_after(phone, now)
+            if not retry_after:
+                self._record(phone, now)
+            return retry_after
+
+    def failed(self, phone):
+        with self._lock:
+            self._record(phone, time.monotonic())
+
+    def succeeded(self, phone):
+        with self._lock:
+            self._failures.pop(phone, None)
+
+    def clear(self):
+        with self._lock:
+            self._failures.clear()
+
+
+login_limiter = LoginAttemptLimiter(
+    max_failures=getattr(settings, 'LOGIN_MAX_FAILURES', 5),
+    window=getattr(settings, 'LOGIN_LOCKOUT_SECONDS', 300),
+    max_phones=getattr(settings, 'LOGIN_LIMITER_MAX_PHONES', 10000),
+)
@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import SignupView, LoginView
+from .views import SignupView, LoginView, AccountProvisionView
 from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
-    path('signup/', SignupView.as_view()),
-    path('login/', LoginView.as_view()),
+    path('signup/', SignupView.as_view(), name='signup'),
+    path('login/', LoginView.as_view(), name='login'),
      path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('accounts/provision/', AccountProvisionView.as_view(), name='account-provision'),
 ]
\ No newline at end of file
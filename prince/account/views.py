@@ -1,11 +1,19 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.permissions import IsAdminUser
 from .serializers import SignupSerializer, LoginSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import add_user_claims
+from .throttling import login_limiter
+from .provisioning import AccountFormatError, parse_accounts, provision_accounts, rows_from_data
+import logging
+
+logger = logging.getLogger(__name__)
 
 def get_tokens_for_user(user):
-    refresh = RefreshToken.for_user(user)
+    # Claims are copied to every access token minted from this refresh token
+    refresh = add_user_claims(RefreshToken.for_user(user), user)
     return {
         'refresh': str(refresh),
         'access': str(refresh.access_token),
@@ -25,11 +33,54 @@ class SignupView(APIView):
 
 class LoginView(APIView):
     def post(self, request):
+        # Reject locked-out phones before spending CPU on the hasher, and
+        # count this attempt before checking the PIN so parallel guesses can't
+        # all get in under the limit
+        phone = str(request.data.get('phone', '')).strip()
+        retry_after = login_limiter.attempt(phone) if phone else 0
+        if retry_after:
+            return Response(
+                {'error': 'Too many failed login attempts, try again later'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(retry_after)}
+            )
+
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
+            login_limiter.succeeded(phone)
             user = serializer.validated_data['user']
             tokens = get_tokens_for_user(user)
             return Response({
                 'tokens': tokens
             }, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AccountProvisionView(APIView):
+    """Bulk create PIN accounts from CSV or JSON (name, phone, pin).
+
+    Send a ``file`` upload (format taken from ``file_format`` or the file
+    extension) or a JSON body with the rows. Nothing is saved unless every
+    row is valid.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        dry_run = str(request.query_params.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        upload = request.FILES.get('file')
+
+        try:
+            if upload:
+                file_format = request.data.get('file_format') or upload.name.rsplit('.', 1)[-1]
+                rows = parse_accounts(upload.read(), file_format.lower())
+            else:
+                rows = rows_from_data(request.data)
+        except AccountFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = provision_accounts(rows, dry_run=dry_run)
+        if result['errors']:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f"Account provisioning ({len(rows)} rows, dry_run={dry_run}): {result['created']} created")
+        return Response(result, status=status.HTTP_200_OK)
@@ -0,0 +1,103 @@
+# async_views.py
+"""Async versions of the busiest cart and order endpoints.
+
+orders/urls.py serves these instead of the views in views.py when
+ASYNC_VIEWS is on, i.e. when the app runs under an ASGI server such as
+uvicorn. The request handling and the write transactions are shared with
+the sync views. Queries that stand alone use Django's async ORM. Helpers
+that run several queries or a transaction are called with one
+``sync_to_async``. Printing is done on the event loop, so a slow or
+unreachable printer no longer ties up a worker thread.
+"""
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+
+from prince.async_views import AsyncAPIView
+from products.price_cache import catalog_cache
+from .fast_serializers import serialize_cart
+from .models import Cart
+from .utils import aprint_counter_bill, aprint_kitchen_bill
+from .views import AddToCartView, CartDetailView, PlaceOrderView
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCartDetailView(AsyncAPIView, CartDetailView):
+    async def get(self, request):
+        """Get user's cart"""
+        try:
+            cart, created = await Cart.objects.aget_or_create(
+                user=request.user,
+                defaults={
+                    'order_type': 'delivery',
+                    'total_amount': 0
+                }
+            )
+            return Response(await sync_to_async(serialize_cart)(cart), status=status.HTTP_200_OK)
+        except Exception as e:
+            logger.error(f"Error fetching cart: {str(e)}")
+            return Response(
+                {'error': 'Failed to fetch cart', 'detail': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    # Rare writes: the sync handlers, run in a thread
+    async def patch(self, request):
+        return await sync_to_async(super().patch)(request)
+
+    async def delete(self, request):
+        return await sync_to_async(super().delete)(request)
+
+
+class AsyncAddToCartView(AsyncAPIView, AddToCartView):
+    async def post(self, request):
+        item, error = self.parse_item(request)
+        if error:
+            return error
+
+        if await sync_to_async(catalog_cache.product)(item['product_id']) is None:
+            return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(await sync_to_async(self.add_and_serialize)(request.user, item), status=status.HTTP_200_OK)
+
+    def add_and_serialize(self, user, item):
+        return serialize_cart(self.add_item(user, **item))
+
+
+class AsyncPlaceOrderView(AsyncAPIView, PlaceOrderView):
+    async def post(self, request):
+        cart = await Cart.objects.filter(user=request.user).afirst()
+        if cart is None:
+            return Response({'error': 'No cart found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if not await cart.items.aexists():
+            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
+
+        order_type, table_number, error = self.order_details(request, cart)
+        if error:
+            return error
+
+        # Printing stays outside the transaction so a retry never prints twice
+        started = time.perf_counter()
+        order, pricing, order_items = await sync_to_async(self.create_order)(
+            request.user, cart, order_type, table_number
+        )
+        if order is None:
+            # Emptied by another request since the check above
+            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
+        self.record_order(order, pricing, started)
+
+        order_data = self.order_data(request.user, order, pricing, order_items)
+
+        # Both printers at once; failures are logged and reported as False
+        print_kitchen, print_counter = await asyncio.gather(
+            aprint_kitchen_bill(order_data, settings.KITCHEN_PRINTER_IP),
+            aprint_counter_bill(order_data, settings.COUNTER_PRINTER_IP),
+        )
+        return self.placed_response(order, print_kitchen, print_counter)
@@ -0,0 +1,196 @@
+# export.py
+"""Streaming export of orders, their lines and extras for accounting.
+
+``stream_orders(since, until, file_format)`` yields the orders placed in
+``[since, until)`` as text chunks, oldest first:
+
+- ``csv``: one row per order line and one per extra on it, with the
+  order's columns repeated. ``line_type`` is ``item`` or ``extra``; an
+  item's ``line_total`` already includes its extras, so the item rows of
+  an order add up to ``order_total``.
+- ``ndjson``: one JSON object per order with its lines and their extras
+  nested.
+
+In the CSV, text typed in the shop (notes, table numbers, product and extra
+names) that starts like a spreadsheet formula is prefixed with ``'`` so
+spreadsheets show it as text instead of running it. NDJSON keeps it as is.
+
+Orders are read with ``.iterator(chunk_size=EXPORT_CHUNK_SIZE)`` and the
+lines and extras of each chunk fetched together, so memory stays the same
+however long the range is. Amounts are the ones stored when the order was
+placed; product and extra names are the current ones.
+"""
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localtime, make_aware
+
+from .models import Order, OrderItem, OrderItemExtra
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+EXPORT_CHUNK_SIZE = 500
+# Cells starting with these are formulas (or become one) in Excel and LibreOffice
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+CSV_FIELDS = [
+    'order_id', 'ordered_at', 'order_type', 'table_number', 'user_id', 'order_total',
+    'line_type', 'order_item_id', 'extra_line_id', 'product_id', 'product', 'extra_id', 'extra',
+    'quantity', 'line_total', 'note',
+]
+
+
+class ExportError(ValueError):
+    """Raised for an export range or format that can't be used"""
+
+
+def export_range(start=None, end=None):
+    """(since, until) datetimes for the local dates ``start`` to ``end``, both included.
+
+    Either may be empty for an open range. Raises ExportError for dates
+    that aren't YYYY-MM-DD or a start after the end.
+    """
+    bounds = []
+    for name, value, days in (('start', start, 0), ('end', end, 1)):
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ExportError(f"{name} must be a date as YYYY-MM-DD")
+        bounds.append(make_aware(datetime.combine(day + timedelta(days=days), time.min)))
+    since, until = bounds
+    if since and until and since >= until:
+        raise ExportError("start must not be after end")
+    return since, until
+
+
+def export_filename(since, until, file_format):
+    first = since.date().isoformat() if since else 'start'
+    last = (until - timedelta(days=1)).date().isoformat() if until else 'now'
+    return f'orders-{first}-{last}.{file_format}'
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_order_chunks(since=None, until=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of at most ``chunk_size`` orders as dicts, lines and extras included"""
+    orders = Order.objects.order_by('ordered_at', 'id')
+    if since:
+        orders = orders.filter(ordered_at__gte=since)
+    if until:
+        orders = orders.filter(ordered_at__lt=until)
+    rows = orders.values_list('id', 'ordered_at', 'order_type', 'table_number', 'user_id', 'total_amount')
+
+    for chunk in _chunks(rows.iterator(chunk_size=chunk_size), chunk_size):
+        order_ids = [row[0] for row in chunk]
+
+        extras = {}
+        extra_rows = (
+            OrderItemExtra.objects.filter(order_item__order_id__in=order_ids)
+            .order_by('id')
+            .values_list('order_item_id', 'id', 'extra_id', 'extra__name', 'quantity', 'total_amount')
+        )
+        for item_id, line_id, extra_id, name, quantity, total_amount in extra_rows:
+            extras.setdefault(item_id, []).append({
+                'id': line_id,
+                'extra_id': extra_id,
+                'extra': name,
+                'quantity': quantity,
+                'total_amount': str(total_amount),
+            })
+
+        items = {}
+        item_rows = (
+            OrderItem.objects.filter(order_id__in=order_ids)
+            .order_by('id')
+            .values_list('order_id', 'id', 'item_id', 'item__name', 'quantity', 'note', 'total_amount')
+        )
+        for order_id, line_id, product_id, name, quantity, note, total_amount in item_rows:
+            items.setdefault(order_id, []).append({
+                'id': line_id,
+                'product_id': product_id,
+                'product': name,
+                'quantity': quantity,
+                'note': note or '',
+                'total_amount': str(total_amount),
+                'extras': extras.get(line_id, []),
+            })
+
+        yield [
+            {
+                'id': order_id,
+                'ordered_at': localtime(ordered_at).isoformat(),
+                'order_type': order_type,
+                'table_number': table_number or '',
+                'user_id': user_id,
+                'total_amount': str(total_amount),
+                'items': items.get(order_id, []),
+            }
+            for order_id, ordered_at, order_type, table_number, user_id, total_amount in chunk
+        ]
+
+
+def spreadsheet_safe(text):
+    """``text`` with a leading ``'`` if a spreadsheet would read it as a formula"""
+    if text and text[0] in FORMULA_PREFIXES:
+        return "'" + text
+    return text
+
+
+def csv_rows(order):
+    """The CSV rows of one exported order"""
+    head = [
+        order['id'], order['ordered_at'], order['order_type'], spreadsheet_safe(order['table_number']),
+        order['user_id'], order['total_amount'],
+    ]
+    for item in order['items']:
+        product = spreadsheet_safe(item['product'])
+        yield head + [
+            'item', item['id'], '', item['product_id'], product, '', '',
+            item['quantity'], item['total_amount'], spreadsheet_safe(item['note']),
+        ]
+        for extra in item['extras']:
+            yield head + [
+                'extra', item['id'], extra['id'], item['product_id'], product,
+                extra['extra_id'], spreadsheet_safe(extra['extra']), extra['quantity'], extra['total_amount'], '',
+            ]
+
+
+def stream_orders(since=None, until=None, file_format='csv', chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the export as text, one chunk of orders at a time"""
+    if file_format not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported format '{file_format}'. Use csv or ndjson")
+    return _stream(iter_order_chunks(since, until, chunk_size), file_format)
+
+
+def _stream(order_chunks, file_format):
+    if file_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_FIELDS)
+        yield buffer.getvalue()
+        for orders in order_chunks:
+            buffer.seek(0)
+            buffer.truncate()
+            for order in orders:
+                writer.writerows(csv_rows(order))
+            yield buffer.getvalue()
+        return
+
+    for orders in order_chunks:
+        yield ''.join(json.dumps(order) + '\n' for order in orders)
@@ -0,0 +1,126 @@
+# fast_serializers.py
+"""Plain-dict serializers for the hot cart and order-history endpoints.
+
+Same output as ``CartSerializer``/``OrderSerializer`` built from a handful
+of ``values_list()`` queries instead of per-row ModelSerializer calls.
+FastSerializerTests in orders/tests.py checks both sides still match;
+``manage.py bench_serializers`` compares their speed at scale.
+"""
+from rest_framework import serializers
+
+from products.fast_serializers import build_products, decimal_str, product_values
+from products.models import Product
+from .models import OrderItem, OrderItemExtra
+from .pricing import line_total, price_cart
+
+ORDER_COLUMNS = ('id', 'order_type', 'total_amount', 'ordered_at', 'table_number')
+
+# Reuse DRF's own datetime formatting so timezone handling stays identical
+_datetime_field = serializers.DateTimeField()
+
+
+def _products_by_id(product_ids):
+    """{product_id: (ProductSerializer dict, price)}"""
+    rows = list(product_values(Product.objects.filter(id__in=product_ids).order_by('id')))
+    return {
+        row['id']: (data, row['price'])
+        for row, data in zip(rows, build_products(rows))
+    }
+
+
+def build_orders(rows):
+    """Turn order ``values()`` rows into OrderSerializer-shaped dicts"""
+    rows = list(rows)
+    order_ids = [row['id'] for row in rows]
+
+    items = list(
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .order_by('id')
+        .values_list('id', 'order_id', 'item_id', 'quantity', 'note')
+    )
+    extras = {}
+    extra_rows = (
+        OrderItemExtra.objects.filter(order_item__order_id__in=order_ids)
+        .order_by('id')
+        .values_list('order_item_id', 'id', 'extra_id', 'extra__name', 'extra__price', 'quantity', 'total_amount')
+    )
+    for item_id, extra_line_id, extra_id, name, price, quantity, total_amount in extra_rows:
+        extras.setdefault(item_id, []).append((
+            {
+                'id': extra_line_id,
+                'extra': {'id': extra_id, 'name': name, 'price': decimal_str(price)},
+                'quantity': quantity,
+                'total_amount': line_total(price, quantity),
+            },
+            total_amount,
+        ))
+
+    products = _products_by_id({item[2] for item in items})
+
+    items_by_order = {}
+    for item_id, order_id, product_id, quantity, note in items:
+        product, price = products[product_id]
+        item_extras = extras.get(item_id, [])
+        items_by_order.setdefault(order_id, []).append({
+            'id': item_id,
+            'item': product,
+            'quantity': quantity,
+            'note': note,
+            'extras': [data for data, _ in item_extras],
+            'total_amount': line_total(price, quantity, sum(total for _, total in item_extras)),
+        })
+
+    return [
+        {
+            'id': row['id'],
+            'order_type': row['order_type'],
+            'total_amount': decimal_str(row['total_amount']),
+            'ordered_at': _datetime_field.to_representation(row['ordered_at']),
+            'table_number': row['table_number'],
+            'items': items_by_order.get(row['id'], []),
+        }
+        for row in rows
+    ]
+
+
+def serialize_orders(queryset):
+    """Fast equivalent of ``OrderSerializer(queryset, many=True).data``"""
+    return build_orders(queryset.values(*ORDER_COLUMNS))
+
+
+def serialize_order(order):
+    """Fast equivalent of ``OrderSerializer(order).data``"""
+    return build_orders([{column: getattr(order, column) for column in ORDER_COLUMNS}])[0]
+
+
+def serialize_cart(cart):
+    """Fast equivalent of ``CartSerializer(cart).data``"""
+    pricing = price_cart(cart)
+    products = _products_by_id({line.product_id for line in pricing.lines})
+
+    return {
+        'id': cart.id,
+        'order_type': cart.order_type,
+        'total_amount': pricing.total,
+        'table_number': cart.table_number,
+        'items': [
+            {
+                'id': line.id,
+                'item': products[line.product_id][0],
+                'quantity': line.quantity,
+                'note': line.note,
+                'extras': [
+                    {
+                        'id': extra.id,
+                        'extra': {'id': extra.extra_id, 'name': extra.name, 'price': decimal_str(extra.unit_price)},
+                        'quantity': extra.quantity,
+                        'total_amount': extra.total,
+                        'extra_name': extra.name,
+                    }
+                    for extra in line.extras
+                ],
+                'total_amount': line.total,
+            }
+            for line in pricing.lines
+        ],
+    }
@@ -0,0 +1,54 @@
+import io
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from orders.fast_serializers import serialize_orders
+from orders.models import Order
+from prince.benchmark import measure, rolled_back, seed_catalog, seed_orders
+from prince.parsers import FastJSONParser
+from prince.renderers import FastJSONRenderer, orjson
+from products.fast_serializers import serialize_products
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark DRF's JSON renderer/parser against FastJSONRenderer/FastJSONParser"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed, FastJSON* classes use the stdlib fallback"))
+
+        with rolled_back():
+            products = seed_catalog(products=options['products'])
+            user = User.objects.create(username='bench-json')
+            seed_orders(user, products, orders=options['orders'])
+            payloads = [
+                ('menu', serialize_products(Product.objects.order_by('category__name', 'name', 'id'))),
+                ('order history', serialize_orders(Order.objects.filter(user=user).order_by('-ordered_at'))),
+            ]
+
+        repeat = options['repeat']
+        self.stdout.write(f"{'payload':<15} {'op':<7} {'bytes':>9} {'DRF ms':>8} {'fast ms':>8} {'speedup':>8}")
+        for label, data in payloads:
+            slow, slow_render, _ = measure(lambda: JSONRenderer().render(data), repeat)
+            fast, fast_render, _ = measure(lambda: FastJSONRenderer().render(data), repeat)
+            if slow != fast:
+                raise CommandError(f"Rendered {label} differs between renderers")
+
+            parsed, slow_parse, _ = measure(lambda: JSONParser().parse(io.BytesIO(slow)), repeat)
+            fast_parsed, fast_parse, _ = measure(lambda: FastJSONParser().parse(io.BytesIO(slow)), repeat)
+            if parsed != fast_parsed:
+                raise CommandError(f"Parsed {label} differs between parsers")
+
+            for op, slow_ms, fast_ms in (('render', slow_render, fast_render), ('parse', slow_parse, fast_parse)):
+                self.stdout.write(
+                    f"{label:<15} {op:<7} {len(slow):>9} {slow_ms:>8.2f} {fast_ms:>8.2f} {slow_ms / fast_ms:>7.1f}x"
+                )
@@ -0,0 +1,68 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from orders.fast_serializers import serialize_cart, serialize_orders
+from orders.models import Cart, CartItem, CartItemExtra, Order
+from orders.serializers import CartSerializer, OrderSerializer
+from prince.benchmark import measure, rolled_back, seed_catalog, seed_orders
+from products.fast_serializers import serialize_products
+from products.models import Product
+from products.serializers import ProductSerializer
+
+
+class Command(BaseCommand):
+    help = "Benchmark the values()-based fast serializers against the DRF serializers and check output parity"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        render = JSONRenderer().render
+
+        with rolled_back():
+            products = seed_catalog(products=options['products'])
+            user = User.objects.create(username='bench-serializers')
+            seed_orders(user, products, orders=options['orders'])
+            cart = Cart.objects.create(user=user)
+            for product in products[:20]:
+                cart_item = CartItem.objects.create(cart=cart, item=product, quantity=2)
+                for extra in product.extras.all():
+                    CartItemExtra.objects.create(cart_item=cart_item, extra=extra, quantity=1)
+
+            product_qs = Product.objects.order_by('category__name', 'name', 'id')
+            order_qs = Order.objects.filter(user=user).order_by('-ordered_at')
+            cases = [
+                (
+                    f"{options['products']} products",
+                    lambda: ProductSerializer(product_qs.select_related('category').prefetch_related('extras'), many=True).data,
+                    lambda: serialize_products(product_qs),
+                ),
+                (
+                    f"{options['orders']} orders",
+                    lambda: OrderSerializer(order_qs, many=True).data,
+                    lambda: serialize_orders(order_qs),
+                ),
+                (
+                    "cart with 20 items",
+                    lambda: CartSerializer(cart).data,
+                    lambda: serialize_cart(cart),
+                ),
+            ]
+
+            self.stdout.write(f"{'payload':<20} {'DRF ms':>10} {'fast ms':>10} {'speedup':>8}  parity")
+            failed = []
+            for label, drf, fast in cases:
+                drf_data, drf_ms, _ = measure(drf, options['repeat'])
+                fast_data, fast_ms, _ = measure(fast, options['repeat'])
+                parity = render(drf_data) == render(fast_data)
+                if not parity:
+                    failed.append(label)
+                self.stdout.write(
+                    f"{label:<20} {drf_ms:>10.1f} {fast_ms:>10.1f} {drf_ms / fast_ms:>7.1f}x  {'ok' if parity else 'MISMATCH'}"
+                )
+
+        if failed:
+            raise CommandError(f"Fast serializer output differs for: {', '.join(failed)}")
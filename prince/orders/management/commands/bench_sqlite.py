@@ -0,0 +1,143 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from prince.database import sqlite_pragmas
+
+SCHEMA = [
+    "CREATE TABLE product (id INTEGER PRIMARY KEY, name TEXT, price DECIMAL)",
+    "CREATE TABLE cart (id INTEGER PRIMARY KEY, total_amount DECIMAL)",
+    "CREATE TABLE cart_item (id INTEGER PRIMARY KEY, cart_id INTEGER, item_id INTEGER, quantity INTEGER)",
+    "CREATE INDEX cart_item_cart ON cart_item (cart_id)",
+]
+READ_SQL = (
+    "SELECT ci.id, ci.quantity, p.name, p.price FROM cart_item ci "
+    "JOIN product p ON p.id = ci.item_id WHERE ci.cart_id = ?"
+)
+
+
+class Command(BaseCommand):
+    help = "Cart read/write throughput on SQLite with many workers: stock settings vs prince.database pragmas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0, help='Duration per profile')
+        parser.add_argument('--carts', type=int, default=200)
+
+    def setup_database(self, path, pragmas, carts):
+        conn = sqlite3.connect(path)
+        for pragma in pragmas:
+            conn.execute(pragma)
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.executemany("INSERT INTO product VALUES (?, ?, ?)", [(i, f'Product {i}', 50 + i % 100) for i in range(500)])
+        conn.executemany("INSERT INTO cart VALUES (?, 0)", [(i,) for i in range(carts)])
+        conn.executemany(
+            "INSERT INTO cart_item (cart_id, item_id, quantity) VALUES (?, ?, ?)",
+            [(i % carts, i % 500, 1) for i in range(carts * 5)],
+        )
+        conn.commit()
+        conn.close()
+
+    def run_profile(self, path, pragmas, persistent, options):
+        stop = time.monotonic() + options['seconds']
+        results = {'read': [], 'write': [], 'locked': 0}
+        lock = threading.Lock()
+
+        def connect():
+            # isolation_level=None: explicit BEGIN/COMMIT like Django's autocommit
+            conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            for pragma in pragmas:
+                conn.execute(pragma)
+            return conn
+
+        def read(conn, rng):
+            conn.execute(READ_SQL, (rng.randrange(options['carts']),)).fetchall()
+
+        def write(conn, rng):
+            cart_id = rng.randrange(options['carts'])
+            conn.execute("BEGIN")
+            try:
+                conn.execute(
+                    "INSERT INTO cart_item (cart_id, item_id, quantity) VALUES (?, ?, 1)",
+                    (cart_id, rng.randrange(500)),
+                )
+                conn.execute(
+                    "UPDATE cart SET total_amount = (SELECT SUM(p.price * ci.quantity) FROM cart_item ci "
+                    "JOIN product p ON p.id = ci.item_id WHERE ci.cart_id = ?) WHERE id = ?",
+                    (cart_id, cart_id),
+                )
+                conn.execute("COMMIT")
+            except sqlite3.OperationalError:
+                conn.execute("ROLLBACK")
+                raise
+
+        def worker(kind, seed):
+            rng = random.Random(seed)
+            operation = read if kind == 'read' else write
+            timings = []
+            locked = 0
+            conn = connect() if persistent else None
+            while time.monotonic() < stop:
+                start = time.perf_counter()
+                # Without persistent connections every request opens the file again
+                current = conn or connect()
+                try:
+                    operation(current, rng)
+                    timings.append(time.perf_counter() - start)
+                except sqlite3.OperationalError:
+                    locked += 1
+                finally:
+                    if conn is None:
+                        current.close()
+            if conn is not None:
+                conn.close()
+            with lock:
+                results[kind].extend(timings)
+                results['locked'] += locked
+
+        threads = [
+            threading.Thread(target=worker, args=('read', i)) for i in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=('write', 1000 + i)) for i in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def handle(self, *args, **options):
+        profiles = [
+            # Django's defaults before prince.database: rollback journal, FULL sync, CONN_MAX_AGE=0
+            ('stock', [], False),
+            ('tuned', sqlite_pragmas(), True),
+        ]
+
+        self.stdout.write(
+            f"{options['readers']} readers, {options['writers']} writers, {options['seconds']:.0f}s per profile"
+        )
+        self.stdout.write(
+            f"{'profile':<8} {'reads/s':>9} {'read p95 ms':>12} {'writes/s':>9} {'write p95 ms':>13} {'locked':>7}"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for label, pragmas, persistent in profiles:
+                path = os.path.join(directory, f'{label}.sqlite3')
+                self.setup_database(path, pragmas, options['carts'])
+                results = self.run_profile(path, pragmas, persistent, options)
+
+                row = [label]
+                for kind in ('read', 'write'):
+                    timings = results[kind]
+                    p95 = statistics.quantiles(timings, n=20)[-1] * 1000 if len(timings) > 1 else 0
+                    row += [len(timings) / options['seconds'], p95]
+                self.stdout.write(
+                    f"{row[0]:<8} {row[1]:>9.0f} {row[2]:>12.2f} {row[3]:>9.0f} {row[4]:>13.2f} {results['locked']:>7}"
+                )
@@ -0,0 +1,36 @@
+import gzip
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.export import EXPORT_FORMATS, ExportError, export_range, stream_orders
+
+
+class Command(BaseCommand):
+    help = "Export the orders of a date range with their lines and extras as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day, YYYY-MM-DD (default: the first order)")
+        parser.add_argument('--end', help="Last day, YYYY-MM-DD, included (default: today)")
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', help="File to write to (defaults to stdout)")
+        parser.add_argument('--gzip', action='store_true', help="Gzip the output file")
+
+    def handle(self, *args, **options):
+        if options['gzip'] and not options['output']:
+            raise CommandError("--gzip needs --output")
+        try:
+            since, until = export_range(options['start'], options['end'])
+        except ExportError as e:
+            raise CommandError(str(e))
+        chunks = stream_orders(since, until, options['format'])
+
+        if options['output']:
+            opener = gzip.open if options['gzip'] else open
+            with opener(options['output'], 'wt', newline='', encoding='utf-8') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Orders exported to {options['output']}"))
+            return
+
+        for chunk in chunks:
+            self.stdout.write(chunk, ending='')
@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+
+def _use_database(path):
+    connection.close()
+    connection.settings_dict['NAME'] = path
+
+
+def _init_worker(settings_module, path):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+    _use_database(path)
+
+
+def _run_worker(args):
+    """One cashier: add to cart and place orders as fast as allowed"""
+    from django.contrib.auth.models import User
+    from orders.models import Cart
+    from orders.transactions import contention_stats, is_busy_error
+    from orders.views import AddToCartView, PlaceOrderView
+    from products.models import Product
+
+    worker, mode, seconds, rate = args
+    rng = random.Random(worker)
+    user = User.objects.get(username=f'stress-{worker}')
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    add_item = AddToCartView().add_item
+    create_order = PlaceOrderView().create_order
+    if mode == 'deferred':
+        # What the views did before: plain atomic(), no retries
+        add_item = transaction.atomic(add_item.__wrapped__.__get__(AddToCartView()))
+        create_order = transaction.atomic(create_order.__wrapped__.__get__(PlaceOrderView()))
+
+    counts = {'operations': 0, 'orders': 0, 'lock_errors': 0, 'other_errors': 0}
+    interval = 1.0 / rate if rate else 0
+    stop = time.monotonic() + seconds
+    next_at = time.monotonic()
+    while time.monotonic() < stop:
+        if interval:
+            next_at += interval
+            time.sleep(max(0, next_at - time.monotonic()))
+        try:
+            if rng.random() < 0.75:
+                add_item(user, rng.choice(product_ids), rng.randint(1, 3), '', [])
+            else:
+                # PlaceOrderView only reads the cart before its transaction
+                cart = Cart.objects.filter(user=user).first()
+                if cart is not None:
+                    order, _, _ = create_order(user, cart, 'parcel', None)
+                    counts['orders'] += order is not None
+            counts['operations'] += 1
+        except OperationalError as e:
+            counts['lock_errors' if is_busy_error(e) else 'other_errors'] += 1
+    counts.update(contention_stats.snapshot())
+    return counts
+
+
+class Command(BaseCommand):
+    help = "Hammer cart and order writes from many processes on a scratch SQLite copy and count lock errors"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=10.0)
+        parser.add_argument('--rate', type=float, default=0, help='Writes/sec per process (0 = as fast as possible)')
+        parser.add_argument('--mode', choices=['immediate', 'deferred', 'both'], default='both',
+                            help='immediate = write_transaction, deferred = plain transaction.atomic()')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("stress_writes only targets SQLite")
+
+        from django.contrib.auth.models import User
+        from prince.benchmark import seed_catalog
+
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'prince.settings')
+        modes = ['deferred', 'immediate'] if options['mode'] == 'both' else [options['mode']]
+        context = multiprocessing.get_context('spawn')
+        failed = False
+
+        self.stdout.write(
+            f"{options['processes']} processes, {options['seconds']:.0f}s, "
+            f"rate {options['rate'] or 'unlimited'} writes/s per process"
+        )
+        self.stdout.write(
+            f"{'mode':<10} {'writes/s':>9} {'orders':>7} {'lock errors':>12} {'retries':>8} {'max wait ms':>12}"
+        )
+        for mode in modes:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'stress.sqlite3')
+                original = connection.settings_dict['NAME']
+                _use_database(path)
+                try:
+                    call_command('migrate', verbosity=0)
+                    seed_catalog(products=50, categories=5)
+                    User.objects.bulk_create([User(username=f'stress-{i}') for i in range(options['processes'])])
+                finally:
+                    _use_database(original)
+
+                with context.Pool(options['processes'], initializer=_init_worker,
+                                  initargs=(settings_module, path)) as pool:
+                    results = pool.map(_run_worker, [
+                        (worker, mode, options['seconds'], options['rate'])
+                        for worker in range(options['processes'])
+                    ])
+
+            total = {key: sum(result[key] for result in results) for key in results[0]}
+            max_wait = max(result['max_lock_wait_ms'] for result in results)
+            self.stdout.write(
+                f"{mode:<10} {total['operations'] / options['seconds']:>9.0f} {total['orders']:>7} "
+                f"{total['lock_errors'] + total['failures']:>12} {total['retries']:>8} {max_wait:>12.1f}"
+            )
+            if total['other_errors']:
+                raise CommandError(f"{total['other_errors']} unexpected database errors in {mode} mode")
+            if mode == 'immediate' and total['lock_errors']:
+                failed = True
+
+        if failed:
+            raise CommandError("write_transaction let 'database is locked' errors through")
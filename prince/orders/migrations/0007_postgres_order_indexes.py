@@ -0,0 +1,30 @@
+# PostgreSQL-only indexes; a no-op on SQLite
+
+from django.db import migrations
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # ordered_at follows insertion order, so a BRIN index covers date-range
+    # scans (reports, exports) for a few pages instead of a full B-tree
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS orders_order_ordered_at_brin ON orders_order USING brin (ordered_at)'
+    )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS orders_order_ordered_at_brin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_user_recent_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -3,6 +3,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from products.models import Product, Extra
 from django.utils import timezone
+from .pricing import cart_extra_total, price_cart
 
 
 class Cart(models.Model):
@@ -26,6 +27,10 @@ class Cart(models.Model):
             self.table_number = None
         super().save(*args, **kwargs)
 
+    def calculate_total(self, refresh=False):
+        """Cart total, priced by orders.pricing"""
+        return price_cart(self, refresh=refresh).total
+
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -39,9 +44,8 @@ class CartItem(models.Model):
     @property
     def total_amount(self):
         """Calculate total amount including extras"""
-        base_total = self.item.price * self.quantity
-        extras_total = sum(extra.total_amount for extra in self.extras.all())
-        return base_total + extras_total
+        line = price_cart(self.cart).line(self.id)
+        return line.total if line else 0
 
     def __str__(self):
         return f"{self.item.name} x {self.quantity} in {self.cart.user.username}'s cart"
@@ -54,7 +58,7 @@ class CartItemExtra(models.Model):
 
     @property
     def total_amount(self):
-        return self.extra.price * self.quantity
+        return cart_extra_total(self.extra_id, self.quantity)
 
     def __str__(self):
         return f"{self.extra.name} x {self.quantity}"
@@ -73,6 +77,12 @@ class Order(models.Model):
     table_number = models.CharField(max_length=10, blank=True, null=True)
     ordered_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # Order history: filter by user, newest first
+            models.Index(fields=['user', '-ordered_at'], name='order_user_recent_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
@@ -0,0 +1,136 @@
+# pricing.py
+"""Cart and order line pricing.
+
+Everything that needs a line or cart total goes through here: the models,
+serializers, fast serializers, cart views, PlaceOrderView and the printed
+bills. Prices come from ``products.price_cache`` and all arithmetic is
+``Decimal``.
+
+``price_cart()`` prices every line and extra of a cart in one pass and
+keeps the result on the cart instance, so a view that recalculates the
+total and then renders the cart only prices it once.
+"""
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from products.price_cache import catalog_cache
+
+CENT = Decimal('0.01')
+
+PricedExtra = namedtuple('PricedExtra', 'id extra_id name quantity unit_price total')
+PricedLine = namedtuple('PricedLine', 'id product_id name quantity note unit_price base_total extras total')
+
+
+def to_decimal(value):
+    """Decimal from a Decimal, int, float or numeric string (0 if invalid)"""
+    if isinstance(value, Decimal):
+        return value
+    try:
+        return Decimal(str(value).strip())
+    except (InvalidOperation, ValueError, TypeError):
+        return Decimal('0')
+
+
+def line_total(unit_price, quantity, extras_total=0):
+    return unit_price * quantity + extras_total
+
+
+class CartPricing:
+    """Priced lines of one cart plus the cart total"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        # Start from 0 like the serializers always did (an empty cart is 0)
+        self.total = sum((line.total for line in lines), 0)
+        self._lines = {line.id: line for line in lines}
+        self._extras = {extra.id: extra for line in lines for extra in line.extras}
+
+    def line(self, line_id):
+        return self._lines.get(line_id)
+
+    def extra(self, extra_line_id):
+        return self._extras.get(extra_line_id)
+
+
+def price_lines(items, extras):
+    """Price raw cart rows.
+
+    ``items`` are (id, product_id, quantity, note) tuples and ``extras`` are
+    (id, line_id, extra_id, quantity) tuples. Lines whose product is gone
+    are left out.
+    """
+    items = list(items)
+    extras = list(extras)
+    products = catalog_cache.products({row[1] for row in items})
+    extra_records = catalog_cache.extras({row[2] for row in extras})
+
+    extras_by_line = {}
+    for extra_line_id, line_id, extra_id, quantity in extras:
+        record = extra_records.get(extra_id)
+        if record is None:
+            continue
+        extras_by_line.setdefault(line_id, []).append(PricedExtra(
+            extra_line_id, extra_id, record.name, quantity, record.price, line_total(record.price, quantity)
+        ))
+
+    lines = []
+    for line_id, product_id, quantity, note in items:
+        product = products.get(product_id)
+        if product is None:
+            continue
+        line_extras = extras_by_line.get(line_id, [])
+        base_total = line_total(product.price, quantity)
+        lines.append(PricedLine(
+            line_id, product_id, product.name, quantity, note, product.price, base_total,
+            line_extras, base_total + sum(extra.total for extra in line_extras),
+        ))
+    return CartPricing(lines)
+
+
+def price_cart(cart, refresh=False):
+    """Price a cart (memoized on the instance; pass refresh=True after changes)"""
+    pricing = getattr(cart, '_pricing', None)
+    if pricing is not None and not refresh:
+        return pricing
+
+    from .models import CartItemExtra
+
+    items = cart.items.order_by('id').values_list('id', 'item_id', 'quantity', 'note')
+    extras = (
+        CartItemExtra.objects.filter(cart_item__cart_id=cart.id)
+        .order_by('id')
+        .values_list('id', 'cart_item_id', 'extra_id', 'quantity')
+    )
+    cart._pricing = price_lines(items, extras)
+    return cart._pricing
+
+
+def cart_extra_total(extra_id, quantity):
+    """Total of one cart extra line, without loading (or pricing) its cart"""
+    extra = catalog_cache.extra(extra_id)
+    return line_total(extra.price, quantity) if extra else 0
+
+
+def order_item_total(product_id, quantity, extra_totals, fallback):
+    """Order history line total: current price x quantity plus the extras
+    as they were charged (what OrderItemSerializer has always shown)"""
+    product = catalog_cache.product(product_id)
+    base_total = line_total(product.price, quantity) if product else fallback
+    return base_total + sum(extra_totals)
+
+
+def order_extra_total(extra_id, quantity, fallback):
+    extra = catalog_cache.extra(extra_id)
+    return line_total(extra.price, quantity) if extra else fallback
+
+
+def bill_item_total(item, fallback):
+    """Total for one line of printed-bill data.
+
+    PlaceOrderView already puts the priced ``total_amount`` on each line;
+    ``fallback(item)`` is only used for payloads without one and is rounded
+    to cents.
+    """
+    if item.get('total_amount') is not None:
+        return to_decimal(item['total_amount'])
+    return to_decimal(fallback(item)).quantize(CENT)
@@ -3,6 +3,8 @@ from rest_framework import serializers
 from .models import Cart, CartItem, CartItemExtra, Order, OrderItem, OrderItemExtra
 from products.models import Product, Extra
 from products.serializers import ProductSerializer, ExtraSerializer
+from products.price_cache import catalog_cache
+from .pricing import order_extra_total, order_item_total
 
 
 class CartItemExtraSerializer(serializers.ModelSerializer):
@@ -15,10 +17,11 @@ class CartItemExtraSerializer(serializers.ModelSerializer):
         fields = ['id', 'extra', 'quantity', 'total_amount','extra_name']
 
     def get_total_amount(self, obj):
-        return obj.extra.price * obj.quantity
+        return obj.total_amount
     
     def get_extra_name(self, obj):
-        return obj.extra.name if obj.extra else None
+        extra = catalog_cache.extra(obj.extra_id)
+        return extra.name if extra else None
 
 class CartItemSerializer(serializers.ModelSerializer):
     item = ProductSerializer(read_only=True)
@@ -31,9 +34,7 @@ class CartItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'item', 'total_amount', 'extras']
 
     def get_total_amount(self, obj):
-        base_total = obj.item.price * obj.quantity
-        extras_total = sum(extra.total_amount for extra in obj.extras.all())
-        return base_total + extras_total
+        return obj.total_amount
 
     def update(self, instance, validated_data):
         instance.quantity = validated_data.get('quantity', instance.quantity)
@@ -52,24 +53,14 @@ class CartSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'total_amount', 'items']
 
     def get_total_amount(self, obj):
-        total = 0
-        for item in obj.items.all():
-            base_total = item.item.price * item.quantity
-            extras_total = sum(extra.total_amount for extra in item.extras.all())
-            total += base_total + extras_total
-        return total
+        return obj.calculate_total()
 
     def update(self, instance, validated_data):
         instance.order_type = validated_data.get('order_type', instance.order_type)
         instance.table_number = validated_data.get('table_number', instance.table_number)
 
         # Calculate total amount based on current items and extras
-        total = 0
-        for item in instance.items.all():
-            base_total = item.item.price * item.quantity
-            extras_total = sum(extra.total_amount for extra in item.extras.all())
-            total += base_total + extras_total
-        instance.total_amount = total
+        instance.total_amount = instance.calculate_total(refresh=True)
 
         instance.save()
         return instance
@@ -84,7 +75,7 @@ class OrderItemExtraSerializer(serializers.ModelSerializer):
         fields = ['id', 'extra', 'quantity', 'total_amount']
 
     def get_total_amount(self, obj):
-        return obj.extra.price * obj.quantity if obj.extra else obj.total_amount
+        return order_extra_total(obj.extra_id, obj.quantity, obj.total_amount)
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -97,9 +88,8 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'item', 'quantity', 'note', 'extras', 'total_amount']
 
     def get_total_amount(self, obj):
-        base_total = obj.item.price * obj.quantity if obj.item else obj.total_amount
-        extras_total = sum(extra.total_amount for extra in obj.extras.all())
-        return base_total + extras_total
+        extra_totals = [extra.total_amount for extra in obj.extras.all()]
+        return order_item_total(obj.item_id, obj.quantity, extra_totals, obj.total_amount)
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -1,3 +1,496 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import sys
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from itertools import count
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.cache import cache
+from django.db import OperationalError, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from prince.benchmark import FakePrinter, seed_orders
+from prince.testing import LARGE, QueryCountMixin, auth_client, fill_cart, make_catalog, make_user
+from products.price_cache import catalog_cache
+from .async_views import AsyncAddToCartView, AsyncCartDetailView, AsyncPlaceOrderView
+from .export import CSV_FIELDS, stream_orders
+from .fast_serializers import serialize_cart, serialize_order, serialize_orders
+from .models import Cart, CartItem, CartItemExtra, Order, OrderItem
+from .pricing import price_cart, price_lines
+from .serializers import CartSerializer, OrderSerializer
+from .transactions import contention_stats, write_transaction
+from .utils import load_printing
+from .views import AddToCartView, CartDetailView, PlaceOrderView
+from .urls import urlpatterns
+
+phones = (f'72{n:08d}' for n in count())
+
+
+@override_settings(QUERY_BUDGET_ACTION='raise', PIN_HASHER_POLICY='fast')
+class OrdersQueryCountTests(QueryCountMixin, TestCase):
+    """Cart and order endpoints run the same queries for 2 lines (or orders) as for 20"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.printer = FakePrinter()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.printer.close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.invalidate()
+        self.printing = override_settings(
+            KITCHEN_PRINTER_IP='127.0.0.1', COUNTER_PRINTER_IP='127.0.0.1', PRINTER_PORT=self.printer.port
+        )
+        self.printing.enable()
+        self.addCleanup(self.printing.disable)
+        # One cashier and one menu for every size, so the warm-up request
+        # fills the same caches the counted one reads
+        self.user = make_user(next(phones))
+        self.client = auth_client(self.user)
+        _, self.menu = make_catalog(LARGE, extras_per_product=2)
+        _, (self.dish,) = make_catalog(1, extras_per_product=2)
+
+    def cart_with(self, lines):
+        """Reset the cashier's cart to the first ``lines`` dishes of the menu"""
+        CartItem.objects.filter(cart__user=self.user).delete()
+        return fill_cart(self.user, self.menu[:lines])
+
+    def orders_of(self, count, lines=1):
+        Order.objects.filter(user=self.user).delete()
+        return seed_orders(self.user, self.menu, orders=count, items_per_order=lines)
+
+    def test_routes_covered(self):
+        self.assertRoutesCovered(urlpatterns)
+
+    def test_cart_detail_get(self):
+        def prepare(size):
+            self.cart_with(size)
+            return lambda: self.client.get(reverse('cart-detail'))
+        self.assertFlatQueries('GET cart', prepare)
+
+    def test_cart_detail_patch(self):
+        def prepare(size):
+            self.cart_with(size)
+            body = {'order_type': 'table', 'table_number': '4'}
+            return lambda: self.client.patch(reverse('cart-detail'), body, format='json')
+        self.assertFlatQueries('PATCH cart', prepare)
+
+    def test_cart_detail_delete(self):
+        def prepare(size):
+            self.cart_with(size)
+            return lambda: self.client.delete(reverse('cart-detail'))
+        self.assertFlatQueries('DELETE cart', prepare)
+
+    def test_add_to_cart(self):
+        def prepare(size):
+            self.cart_with(size)
+            extra = self.dish.extras.first()
+            body = {'item': self.dish.pk, 'quantity': 2, 'extras': [{'extra_id': extra.pk, 'quantity': 1}]}
+            return lambda: self.client.post(reverse('add-to-cart'), body, format='json')
+        self.assertFlatQueries('POST cart/add', prepare)
+
+    def test_update_cart_item(self):
+        def prepare(size):
+            item = self.cart_with(size).items.first()
+            url = reverse('update-cart-item', args=[item.pk])
+            return lambda: self.client.patch(url, {'quantity': 3}, format='json')
+        self.assertFlatQueries('PATCH cart/item/<id>/update', prepare)
+
+    def test_delete_cart_item(self):
+        def prepare(size):
+            item = self.cart_with(size).items.first()
+            return lambda: self.client.delete(reverse('delete-cart-item', args=[item.pk]))
+        self.assertFlatQueries('DELETE cart/item/<id>/delete', prepare)
+
+    def test_place_order(self):
+        def prepare(size):
+            self.cart_with(size)
+            return lambda: self.client.post(reverse('place-order'), {'order_type': 'parcel'}, format='json')
+        self.assertFlatQueries('POST order', prepare, status=201)
+
+    def test_order_list(self):
+        def prepare(size):
+            self.orders_of(size, lines=2)
+            return lambda: self.client.get(reverse('order-list'))
+        self.assertFlatQueries('GET orders', prepare)
+
+    def test_order_detail(self):
+        def prepare(size):
+            order = self.orders_of(1, lines=size)[0]
+            return lambda: self.client.get(reverse('order-detail', args=[order.pk]))
+        self.assertFlatQueries('GET orders/<id>', prepare)
+
+    def test_cart_item_extra(self):
+        def prepare(size):
+            item = self.cart_with(size).items.first()
+            extra = item.item.extras.order_by('id').last()
+            url = reverse('cart-item-extra', args=[item.pk])
+            return lambda: self.client.post(url, {'extra_id': extra.pk, 'quantity': 1}, format='json')
+        self.assertFlatQueries('POST cart/items/<id>/extras', prepare)
+
+    def test_cart_item_extra_delete(self):
+        def prepare(size):
+            cart = self.cart_with(size)
+            item_extra = CartItemExtra.objects.filter(cart_item__cart=cart).first()
+            url = reverse('cart-item-extra-delete', args=[item_extra.cart_item_id, item_extra.extra_id])
+            return lambda: self.client.delete(url)
+        self.assertFlatQueries('DELETE cart/items/<id>/extras/<id>', prepare)
+
+    def test_repeat_order(self):
+        def prepare(size):
+            # Half the order's dishes are already in the cart
+            self.cart_with(size // 2)
+            order = self.orders_of(1, lines=size)[0]
+            return lambda: self.client.post(reverse('repeat-order', args=[order.pk]))
+        self.assertFlatQueries('POST orders/<id>/repeat', prepare)
+
+    def test_order_export(self):
+        staff = auth_client(make_user(next(phones), staff=True))
+
+        def prepare(size):
+            self.orders_of(size, lines=2)
+            return lambda: staff.get(reverse('order-export'))
+        self.assertFlatQueries('GET orders/export', prepare)
+
+
+@override_settings(PIN_HASHER_POLICY='fast')
+class BulkWriteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.invalidate()
+        self.user = make_user(next(phones))
+        self.client = auth_client(self.user)
+        _, self.products = make_catalog(3, extras_per_product=2)
+
+    def test_repeat_order_merges_into_the_cart(self):
+        order = seed_orders(self.user, self.products, orders=1, items_per_order=3)[0]
+        fill_cart(self.user, self.products[:1])
+
+        self.client.post(reverse('repeat-order', args=[order.pk]))
+        response = self.client.post(reverse('repeat-order', args=[order.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        items = {item.item_id: item for item in CartItem.objects.filter(cart__user=self.user)}
+        self.assertEqual(len(items), 3)
+        # quantity 1 already in the cart, plus the order's quantities (1, 2, 3) twice
+        self.assertEqual([items[product.pk].quantity for product in self.products], [3, 4, 6])
+        for product in self.products:
+            extras = CartItemExtra.objects.filter(cart_item=items[product.pk])
+            self.assertEqual([extra.extra_id for extra in extras], [product.extras.order_by('id').first().pk])
+
+    def test_place_order_copies_every_line_and_extra(self):
+        cart = fill_cart(self.user, self.products)
+        printer = FakePrinter()
+        self.addCleanup(printer.close)
+        with override_settings(KITCHEN_PRINTER_IP='127.0.0.1', COUNTER_PRINTER_IP='127.0.0.1', PRINTER_PORT=printer.port):
+            response = self.client.post(reverse('place-order'), {'order_type': 'parcel'}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['order_id'])
+        self.assertEqual(sorted(item.item_id for item in order.items.all()), [p.pk for p in self.products])
+        for item in order.items.all():
+            self.assertEqual(item.extras.count(), 1)
+        self.assertFalse(Cart.objects.get(pk=cart.pk).items.exists())
+
+
+class PricingTests(TestCase):
+    def setUp(self):
+        catalog_cache.invalidate()
+        _, self.products = make_catalog(2, extras_per_product=2)
+        self.extras = [list(product.extras.order_by('id')) for product in self.products]
+
+    def test_line_and_extra_totals(self):
+        first, second = self.products
+        pricing = price_lines(
+            [(1, first.pk, 2, 'Less spicy'), (2, second.pk, 1, ''), (3, 0, 5, '')],
+            [(10, 1, self.extras[0][0].pk, 3), (11, 1, self.extras[0][1].pk, 1), (12, 2, 0, 1)],
+        )
+
+        line = pricing.line(1)
+        # 2 x 50 plus extras 3 x 10 and 1 x 11
+        self.assertEqual((line.base_total, line.total), (Decimal('100'), Decimal('141')))
+        self.assertEqual([extra.total for extra in line.extras], [Decimal('30'), Decimal('11')])
+        self.assertEqual(pricing.extra(11).name, 'Extra 1')
+        # A line whose product is gone and an extra that no longer exists are left out
+        self.assertIsNone(pricing.line(3))
+        self.assertEqual((pricing.line(2).total, pricing.extra(12)), (Decimal('51'), None))
+        self.assertEqual(pricing.total, Decimal('192'))
+        self.assertEqual(price_lines([], []).total, 0)
+
+    def test_price_cart_is_memoized_until_refreshed(self):
+        cart = fill_cart(make_user(next(phones)), self.products)
+        self.assertEqual(price_cart(cart).total, Decimal('121'))
+        with self.assertNumQueries(0):
+            pricing = price_cart(cart)
+            self.assertEqual(cart.calculate_total(), pricing.total)
+
+        CartItem.objects.filter(cart=cart, item=self.products[0]).update(quantity=3)
+        self.assertIs(price_cart(cart), pricing)
+        self.assertEqual(price_cart(cart, refresh=True).total, Decimal('221'))
+
+    def test_cart_extra_total_does_not_load_the_cart(self):
+        fill_cart(make_user(next(phones)), self.products)
+        extras = list(CartItemExtra.objects.order_by('id'))
+        catalog_cache.extras([extra.extra_id for extra in extras])
+        with self.assertNumQueries(0):
+            self.assertEqual([extra.total_amount for extra in extras], [Decimal('10'), Decimal('10')])
+
+
+@override_settings(WRITE_RETRY_ATTEMPTS=2, WRITE_RETRY_BASE_DELAY=0.01, WRITE_RETRY_MAX_DELAY=0.015)
+class WriteTransactionTests(TransactionTestCase):
+    def setUp(self):
+        contention_stats.reset()
+        sleep = mock.patch('orders.transactions.time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def flaky(self, *errors):
+        """A write_transaction function that raises ``errors`` in turn, then succeeds"""
+        calls = []
+
+        @write_transaction
+        def write():
+            calls.append(transaction.get_connection().in_atomic_block)
+            if len(calls) <= len(errors):
+                raise errors[len(calls) - 1]
+            return 'done'
+        return write, calls
+
+    def test_busy_database_is_retried_with_backoff(self):
+        write, calls = self.flaky(OperationalError('database is locked'), OperationalError('database is locked'))
+        with self.assertLogs('orders.transactions', 'WARNING') as logs:
+            self.assertEqual(write(), 'done')
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(calls, [True, True, True])
+        delays = [call.args[0] for call in self.sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        # Full jitter under a ceiling that doubles per retry and is capped
+        self.assertTrue(0 <= delays[0] <= 0.01 * 2 and 0 <= delays[1] <= 0.015)
+        self.assertEqual(contention_stats.snapshot()['retries'], 2)
+
+    def test_gives_up_after_the_last_retry(self):
+        write, calls = self.flaky(*[OperationalError('database is locked')] * 3)
+        with self.assertRaisesMessage(OperationalError, 'database is locked'), self.assertLogs('orders.transactions'):
+            write()
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(contention_stats.snapshot()['failures'], 1)
+
+    def test_other_errors_are_not_retried(self):
+        write, calls = self.flaky(OperationalError('no such table: orders_order'))
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+        self.sleep.assert_not_called()
+
+    def test_inside_a_transaction_it_joins_without_retrying(self):
+        write, calls = self.flaky(OperationalError('database is locked'))
+        with self.assertRaises(OperationalError), transaction.atomic():
+            write()
+        self.assertEqual(len(calls), 1)
+        self.sleep.assert_not_called()
+
+
+class AsyncPrintingTests(SimpleTestCase):
+    def test_printing_stack_loads_off_the_event_loop(self):
+        threads = []
+        with mock.patch.dict(sys.modules), mock.patch('orders.utils.import_module', side_effect=lambda name: (
+            threads.append(threading.current_thread())
+        )):
+            sys.modules.pop('escpos.printer', None)
+            asyncio.run(load_printing())
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+
+def without_ids(data):
+    """``data`` with the ids of rows created per request left out"""
+    if isinstance(data, list):
+        return [without_ids(value) for value in data]
+    if isinstance(data, dict):
+        return {key: without_ids(value) for key, value in data.items() if key not in ('id', 'order_id')}
+    return data
+
+
+@override_settings(PIN_HASHER_POLICY='fast')
+class AsyncViewTests(TestCase):
+    """The ASYNC_VIEWS cart and order views answer exactly like the sync ones"""
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.invalidate()
+        printer = FakePrinter()
+        self.addCleanup(printer.close)
+        printing = override_settings(
+            KITCHEN_PRINTER_IP='127.0.0.1', COUNTER_PRINTER_IP='127.0.0.1', PRINTER_PORT=printer.port
+        )
+        printing.enable()
+        self.addCleanup(printing.disable)
+        _, self.products = make_catalog(2, extras_per_product=2)
+
+    def call(self, view_class, user, method='get', data=None):
+        """(status, body) of one request straight to the view"""
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = auth_client(user)._credentials['HTTP_AUTHORIZATION']
+        if method == 'get':
+            request = RequestFactory().get('/', **headers)
+        else:
+            request = getattr(RequestFactory(), method)('/', json.dumps(data or {}), 'application/json', **headers)
+        view = view_class.as_view()
+        response = async_to_sync(view)(request) if iscoroutinefunction(view) else view(request)
+        response.render()
+        return response.status_code, json.loads(response.content)
+
+    def test_cart_detail(self):
+        user = make_user(next(phones))
+        cart = fill_cart(user, self.products)
+        CartItem.objects.filter(cart=cart).update(note='No onions')
+        self.assertEqual(self.call(AsyncCartDetailView, user), self.call(CartDetailView, user))
+        self.assertEqual(self.call(AsyncCartDetailView, None), self.call(CartDetailView, None))
+        self.assertEqual(self.call(AsyncCartDetailView, None)[0], 401)
+
+    def test_add_to_cart(self):
+        body = {'item': self.products[0].pk, 'quantity': 2, 'note': 'Less salt',
+                'extras': [{'extra_id': self.products[0].extras.first().pk, 'quantity': 1}]}
+        sync = self.call(AddToCartView, make_user(next(phones)), 'post', body)
+        answer = self.call(AsyncAddToCartView, make_user(next(phones)), 'post', body)
+        self.assertEqual((answer[0], without_ids(answer[1])), (sync[0], without_ids(sync[1])))
+
+        user = make_user(next(phones))
+        for body in ({'item': 999999}, {'quantity': 1}):
+            self.assertEqual(self.call(AsyncAddToCartView, user, 'post', body), self.call(AddToCartView, user, 'post', body))
+
+    def test_place_order(self):
+        body = {'order_type': 'table', 'table_number': '7'}
+        placed = []
+        for view_class in (PlaceOrderView, AsyncPlaceOrderView):
+            user = make_user(next(phones))
+            fill_cart(user, self.products)
+            code, data = self.call(view_class, user, 'post', body)
+            placed.append((code, without_ids(data)))
+            # The cart is emptied, and a second attempt is turned down
+            self.assertEqual(self.call(view_class, user, 'post', body)[0], 400)
+        self.assertEqual(placed[0], placed[1])
+        self.assertEqual(placed[0][0], 201)
+
+        user = make_user(next(phones))
+        self.assertEqual(self.call(AsyncPlaceOrderView, user, 'post', body), self.call(PlaceOrderView, user, 'post', body))
+
+
+@override_settings(PIN_HASHER_POLICY='fast')
+class FastSerializerTests(TestCase):
+    """The values()-based serializers render exactly what the DRF ones do"""
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.invalidate()
+        self.user = make_user(next(phones))
+        _, self.products = make_catalog(3, extras_per_product=2)
+
+    def assertSameJSON(self, fast, drf):
+        render = JSONRenderer().render
+        self.assertEqual(render(fast), render(drf))
+
+    def test_cart(self):
+        cart = fill_cart(self.user, self.products)
+        CartItem.objects.filter(pk=cart.items.order_by('id')[0].pk).update(note='No onions', quantity=3)
+        CartItemExtra.objects.filter(cart_item__cart=cart).update(quantity=2)
+        cart = Cart.objects.get(pk=cart.pk)
+        self.assertIsNone(cart.table_number)
+        self.assertSameJSON(serialize_cart(cart), CartSerializer(Cart.objects.get(pk=cart.pk)).data)
+
+    def test_orders(self):
+        orders = seed_orders(self.user, self.products, orders=3, items_per_order=2, extras_per_item=2)
+        OrderItem.objects.filter(order=orders[0]).update(note='Extra spicy')
+        # History lines use today's product price but the extras as charged
+        self.products[0].price = Decimal('75.50')
+        self.products[0].save()
+        queryset = Order.objects.filter(user=self.user).order_by('-ordered_at', '-id')
+        self.assertEqual([order.table_number for order in queryset], ['3', None, None])
+
+        self.assertSameJSON(serialize_orders(queryset), OrderSerializer(queryset, many=True).data)
+        order = Order.objects.get(pk=orders[0].pk)
+        self.assertSameJSON(serialize_order(order), OrderSerializer(order).data)
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = auth_client(make_user(next(phones), staff=True))
+        self.user = make_user(next(phones))
+        _, self.products = make_catalog(3, extras_per_product=2)
+        self.orders = seed_orders(self.user, self.products, orders=5, items_per_order=2)
+
+    def export(self, **params):
+        response = self.staff.get(reverse('order-export'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_has_a_row_per_line_and_extra(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual(list(rows[0]), CSV_FIELDS)
+        self.assertEqual(len([row for row in rows if row['line_type'] == 'item']), 10)
+        self.assertEqual(len([row for row in rows if row['line_type'] == 'extra']), 10)
+        self.assertEqual([int(row['order_id']) for row in rows[:4]], [self.orders[0].pk] * 4)
+
+    def test_csv_escapes_formulas(self):
+        order = self.orders[0]
+        Order.objects.filter(pk=order.pk).update(table_number='+1')
+        order.items.update(note='=HYPERLINK("http://example.com","Receipt")')
+        self.products[0].name = '@SUM(A1:A2)'
+        self.products[0].save()
+        _, body = self.export()
+        rows = [row for row in csv.DictReader(io.StringIO(body.decode())) if row['order_id'] == str(order.pk)]
+        self.assertEqual(rows[0]['table_number'], "'+1")
+        self.assertEqual(rows[0]['note'], '\'=HYPERLINK("http://example.com","Receipt")')
+        self.assertIn("'@SUM(A1:A2)", [row['product'] for row in rows])
+
+        _, body = self.export(file_format='ndjson')
+        exported = json.loads(body.decode().splitlines()[0])
+        self.assertEqual(exported['items'][0]['note'], '=HYPERLINK("http://example.com","Receipt")')
+
+    def test_ndjson_nests_lines_and_extras(self):
+        response, body = self.export(file_format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        orders = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([order['id'] for order in orders], [order.pk for order in self.orders])
+        self.assertEqual([len(item['extras']) for item in orders[0]['items']], [1, 1])
+
+    def test_date_range_and_gzip(self):
+        last_week = timezone.now() - timedelta(days=7)
+        Order.objects.filter(pk__in=[order.pk for order in self.orders[:3]]).update(ordered_at=last_week)
+        day = timezone.localdate().isoformat()
+
+        response, body = self.export(file_format='ndjson', start=day, end=day, gzip='1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn(f'orders-{day}-{day}.ndjson.gz', response['Content-Disposition'])
+        orders = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual([order['id'] for order in orders], [order.pk for order in self.orders[3:]])
+
+    def test_streams_one_chunk_of_orders_at_a_time(self):
+        chunks = list(stream_orders(file_format='ndjson', chunk_size=2))
+        self.assertEqual([len(chunk.splitlines()) for chunk in chunks], [2, 2, 1])
+
+    def test_staff_only_and_bad_ranges(self):
+        self.assertEqual(auth_client(self.user).get(reverse('order-export')).status_code, 403)
+        for params in ({'start': '2026-13-01'}, {'start': '2026-09-30', 'end': '2026-09-01'}, {'file_format': 'xml'}):
+            response = self.staff.get(reverse('order-export'), params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.data)
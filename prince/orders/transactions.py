@@ -0,0 +1,133 @@
+# transactions.py
+"""Write transactions that cope with SQLite lock contention.
+
+``transaction.atomic()`` on SQLite starts a deferred transaction. It takes
+the write lock at the first write, and if another connection already holds
+it the busy timeout does not help: SQLite answers "database is locked"
+straight away. ``write_transaction`` opens the transaction with ``BEGIN
+IMMEDIATE``, so the lock is taken (or waited for) before anything runs. If
+the busy timeout still runs out, the whole function is retried with
+jittered exponential backoff.
+
+The decorated function may run more than once, so keep side effects that
+must not repeat (printing, external calls) outside it.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+BUSY_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_busy_error(error):
+    return isinstance(error, OperationalError) and any(message in str(error) for message in BUSY_MESSAGES)
+
+
+class ContentionStats:
+    """Process-wide counters for write transactions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.transactions = 0
+            self.retries = 0
+            self.failures = 0
+            self.lock_wait_ms = 0.0
+            self.max_lock_wait_ms = 0.0
+
+    def record(self, retries, lock_wait_ms=None, failed=False):
+        with self._lock:
+            self.transactions += 1
+            self.retries += retries
+            self.failures += failed
+            if lock_wait_ms is not None:
+                self.lock_wait_ms += lock_wait_ms
+                self.max_lock_wait_ms = max(self.max_lock_wait_ms, lock_wait_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'transactions': self.transactions,
+                'retries': self.retries,
+                'failures': self.failures,
+                'lock_wait_ms': round(self.lock_wait_ms, 3),
+                'max_lock_wait_ms': round(self.max_lock_wait_ms, 3),
+            }
+
+
+contention_stats = ContentionStats()
+
+
+@contextmanager
+def _immediate(connection):
+    """Make the next BEGIN on a SQLite connection an IMMEDIATE one"""
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    connection.ensure_connection()
+    previous = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        yield
+    finally:
+        connection.transaction_mode = previous
+
+
+def _backoff(attempt):
+    base = getattr(settings, 'WRITE_RETRY_BASE_DELAY', 0.01)
+    cap = getattr(settings, 'WRITE_RETRY_MAX_DELAY', 0.5)
+    # "Full jitter": anywhere between 0 and the exponential ceiling
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def write_transaction(func=None, *, using=None):
+    """Decorator: run ``func`` in a BEGIN IMMEDIATE transaction, retrying when busy.
+
+    Inside an existing transaction it simply joins it (a savepoint), since
+    only the outermost block can be retried.
+    """
+    if func is None:
+        return lambda func: write_transaction(func, using=using)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        alias = using or DEFAULT_DB_ALIAS
+        connection = connections[alias]
+        if connection.in_atomic_block:
+            with transaction.atomic(using=alias):
+                return func(*args, **kwargs)
+
+        max_retries = getattr(settings, 'WRITE_RETRY_ATTEMPTS', 5)
+        attempt = 0
+        while True:
+            try:
+                start = time.perf_counter()
+                with _immediate(connection), transaction.atomic(using=alias):
+                    # BEGIN IMMEDIATE has returned, so the write lock is held
+                    lock_wait_ms = (time.perf_counter() - start) * 1000
+                    result = func(*args, **kwargs)
+            except OperationalError as e:
+                if not is_busy_error(e) or attempt >= max_retries:
+                    contention_stats.record(attempt, failed=is_busy_error(e))
+                    raise
+                attempt += 1
+                delay = _backoff(attempt)
+                logger.warning(f"{func.__qualname__}: {e}, retry {attempt}/{max_retries} in {delay * 1000:.0f}ms")
+                time.sleep(delay)
+                continue
+
+            contention_stats.record(attempt, lock_wait_ms)
+            return result
+
+    return wrapper
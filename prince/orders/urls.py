@@ -1,6 +1,14 @@
+from django.conf import settings
 from django.urls import path
 from .views import *
 
+if settings.ASYNC_VIEWS:
+    from .async_views import (
+        AsyncAddToCartView as AddToCartView,
+        AsyncCartDetailView as CartDetailView,
+        AsyncPlaceOrderView as PlaceOrderView,
+    )
+
 urlpatterns = [
     # Cart management
     path('cart/', CartDetailView.as_view(), name='cart-detail'),
@@ -13,6 +21,7 @@ urlpatterns = [
     # Orders
     path('order/', PlaceOrderView.as_view(), name='place-order'),
     path('orders/', OrderListView.as_view(), name='order-list'),
+    path('orders/export/', OrderExportView.as_view(), name='order-export'),
     path('orders/<int:order_id>/', OrderDetailView.as_view(), name='order-detail'),
     path('cart/items/<int:item_id>/extras/', CartItemExtraView.as_view(), name='cart-item-extra'),
     path('cart/items/<int:item_id>/extras/<int:extra_id>/', CartItemExtraView.as_view(), name='cart-item-extra-delete'),
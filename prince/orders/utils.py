@@ -1,9 +1,25 @@
 # utils.py
+"""Bill formatting and printing.
+
+python-escpos is only imported by ``network_printer()`` and
+``memory_printer()``, on the first print: loading its printer capability
+database takes a good part of a second, and the views import this module,
+so every worker and management command would pay for it at startup.
+Async printing awaits ``load_printing()`` first, which does that import
+on a worker thread instead of stalling the event loop.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.utils.timezone import localtime, now
-from escpos.printer import Network
+import asyncio
 import logging
-from datetime import datetime
-import pytz
+import sys
+import time
+from datetime import datetime, timezone
+from importlib import import_module
+
+from prince import metrics
+from .pricing import bill_item_total
 
 logger = logging.getLogger(__name__)
 
@@ -139,9 +155,7 @@ def get_extras_total(item):
 
 def get_item_total(item):
     """Get total price for an item including base price and extras"""
-    base_price = get_base_item_price(item)
-    extras_total = get_extras_total(item)
-    return base_price + extras_total
+    return bill_item_total(item, lambda item: get_base_item_price(item) + get_extras_total(item))
 
 
 def format_datetime(datetime_obj):
@@ -162,7 +176,7 @@ def format_datetime(datetime_obj):
                     datetime_obj = datetime.fromisoformat(datetime_obj)
                     # Assume UTC if no timezone info
                     if datetime_obj.tzinfo is None:
-                        datetime_obj = pytz.UTC.localize(datetime_obj)
+                        datetime_obj = datetime_obj.replace(tzinfo=timezone.utc)
                 else:
                     # Try to parse as ISO format
                     datetime_obj = datetime.fromisoformat(datetime_obj)
@@ -173,7 +187,7 @@ def format_datetime(datetime_obj):
 
         # Ensure we have a timezone-aware datetime
         if datetime_obj.tzinfo is None:
-            datetime_obj = pytz.UTC.localize(datetime_obj)
+            datetime_obj = datetime_obj.replace(tzinfo=timezone.utc)
 
         # Localize datetime to system timezone
         dt_local = localtime(datetime_obj)
@@ -189,206 +203,287 @@ def format_datetime(datetime_obj):
         return dt_local.strftime("%d-%m-%Y"), dt_local.strftime("%H:%M")
 
 
-def print_kitchen_bill(order_data, printer_ip):
-    """Print kitchen bill with improved formatting and fixed pricing"""
-    try:
-        printer = Network(printer_ip)
+def render_kitchen_bill(printer, order_data):
+    """Write the kitchen bill (improved formatting and fixed pricing) to an escpos printer"""
+    # Header
+    printer.set(align='center', bold=True, width=2, height=2)
+    printer.text("PRINCE BAKERY\n")
+    printer.text("KITCHEN COPY\n\n")
 
-        # Header
-        printer.set(align='center', bold=True, width=2, height=2)
-        printer.text("PRINCE BAKERY\n")
-        printer.text("KITCHEN COPY\n\n")
+    # Order type - Large single letter
+    order_type = order_data.get('order_type', 'delivery').upper()
+    printer.set(align='center', bold=True, width=8, height=8)
+    printer.text(f"{order_type[0]}\n")
 
-        # Order type - Large single letter
-        order_type = order_data.get('order_type', 'delivery').upper()
-        printer.set(align='center', bold=True, width=8, height=8)
-        printer.text(f"{order_type[0]}\n")
+    # Order type full name
+    printer.set(align='center', bold=True, width=2, height=2)
+    printer.text(f"{order_type}\n")
 
-        # Order type full name
-        printer.set(align='center', bold=True, width=2, height=2)
-        printer.text(f"{order_type}\n")
+    if order_type == 'TABLE' and order_data.get('table_number'):
+        printer.text(f"TABLE: {order_data['table_number']}\n")
 
-        if order_type == 'TABLE' and order_data.get('table_number'):
-            printer.text(f"TABLE: {order_data['table_number']}\n")
+    printer.text("\n")
 
-        printer.text("\n")
+    # Token & Time
+    printer.set(align='center', bold=True, width=1, height=1)
+    printer.text("=" * 32 + "\n")
+    printer.text(f"TOKEN: {order_data.get('id', 'N/A')}\n")
+
+    # Items - Improved formatting
+    printer.set(align='center', bold=True, width=2, height=2)
+    printer.text("ITEMS:\n\n")
 
-        # Token & Time
-        printer.set(align='center', bold=True, width=1, height=1)
-        printer.text("=" * 32 + "\n")
-        printer.text(f"TOKEN: {order_data.get('id', 'N/A')}\n")
+    total_calculated = 0
+    
+    for item in order_data.get("items", []):
+        qty = item.get("quantity", 1)
+        name = get_item_name(item)
+        
+        # Calculate item total (base + extras)
+        item_total = get_item_total(item)
+        total_calculated += item_total
 
-        # Items - Improved formatting
+        # Improved format with better spacing
         printer.set(align='center', bold=True, width=2, height=2)
-        printer.text("ITEMS:\n\n")
+        printer.text(f"{qty} x {name.upper()}\n")
+        printer.text(f"Rs {item_total:.2f}\n")
 
-        total_calculated = 0
-        
-        for item in order_data.get("items", []):
-            qty = item.get("quantity", 1)
-            name = get_item_name(item)
-            
-            # Calculate item total (base + extras)
-            item_total = get_item_total(item)
-            total_calculated += item_total
-
-            # Improved format with better spacing
-            printer.set(align='center', bold=True, width=2, height=2)
-            printer.text(f"{qty} x {name.upper()}\n")
-            printer.text(f"Rs {item_total:.2f}\n")
-
-            # Show extras details in smaller font with better formatting
-            extras = item.get('extras', [])
-            if extras:
-                printer.set(align='center', bold=False, width=1, height=1)
-                printer.text("Extras:\n")
-                for extra in extras:
-                    extra_name = extra.get('extra_name') or extra.get('name', 'Extra')
-                    if 'extra' in extra and isinstance(extra['extra'], dict):
-                        extra_name = extra['extra'].get('name', extra_name)
-                    
-                    extra_qty = extra.get('quantity', 1)
-                    printer.text(f"  • {extra_qty}x {extra_name}\n")
+        # Show extras details in smaller font with better formatting
+        extras = item.get('extras', [])
+        if extras:
+            printer.set(align='center', bold=False, width=1, height=1)
+            printer.text("Extras:\n")
+            for extra in extras:
+                extra_name = extra.get('extra_name') or extra.get('name', 'Extra')
+                if 'extra' in extra and isinstance(extra['extra'], dict):
+                    extra_name = extra['extra'].get('name', extra_name)
+                
+                extra_qty = extra.get('quantity', 1)
+                printer.text(f"  • {extra_qty}x {extra_name}\n")
 
-            # Note
-            note = item.get('note', '') or item.get('notes', '')
-            if note:
-                printer.set(align='center', bold=False, width=1, height=1)
-                printer.text(f"Note: {note}\n")
+        # Note
+        note = item.get('note', '') or item.get('notes', '')
+        if note:
+            printer.set(align='center', bold=False, width=1, height=1)
+            printer.text(f"Note: {note}\n")
 
-            printer.text("-" * 20 + "\n")
+        printer.text("-" * 20 + "\n")
 
-        # Total
-        printer.set(align='center', bold=True, width=2, height=2)
-        total_amount = order_data.get('total_amount')
-        if not total_amount or float(total_amount) == 0:
-            total_amount = total_calculated
-        printer.text(f"TOTAL: Rs {float(total_amount):.2f}\n")
-        printer.set(align='center', bold=False, width=1, height=1)
-        printer.text("=" * 32 + "\n")
-        printer.text("\n\n\n")
-
-        printer.cut()
-        printer.close()
-        return True
+    # Total
+    printer.set(align='center', bold=True, width=2, height=2)
+    total_amount = order_data.get('total_amount')
+    if not total_amount or float(total_amount) == 0:
+        total_amount = total_calculated
+    printer.text(f"TOTAL: Rs {float(total_amount):.2f}\n")
+    printer.set(align='center', bold=False, width=1, height=1)
+    printer.text("=" * 32 + "\n")
+    printer.text("\n\n\n")
 
-    except Exception as e:
-        logger.error(f"Kitchen printer failed: {e}")
-        return False
+    printer.cut()
 
 
-def print_counter_bill(order_data, printer_ip):
-    """Print counter bill with improved formatting and fixed pricing"""
-    try:
-        printer = Network(printer_ip)
+def render_counter_bill(printer, order_data):
+    """Write the counter bill (improved formatting and fixed pricing) to an escpos printer"""
+    # Header
+    printer.set(align='center', bold=True, width=2, height=2)
+    printer.text("PRINCE BAKERY\n")
 
-        # Header
-        printer.set(align='center', bold=True, width=2, height=2)
-        printer.text("PRINCE BAKERY\n")
+    printer.set(align='center', bold=False, width=1, height=1)
+    printer.text("CUSTOMER COPY\n")
+    printer.text("-" * 32 + "\n")
 
-        printer.set(align='center', bold=False, width=1, height=1)
-        printer.text("CUSTOMER COPY\n")
-        printer.text("-" * 32 + "\n")
+    # Token
+    printer.set(align='center', bold=True, width=3, height=3)
+    printer.text(f"TOKEN: {order_data.get('id', 'N/A')}\n\n")
 
-        # Token
-        printer.set(align='center', bold=True, width=3, height=3)
-        printer.text(f"TOKEN: {order_data.get('id', 'N/A')}\n\n")
+    # Order info
+    printer.set(align='left', bold=True, width=1, height=1)
+    order_type = order_data.get('order_type', 'delivery').upper()
+    printer.text(f"TYPE: {order_type}\n")
 
-        # Order info
-        printer.set(align='left', bold=True, width=1, height=1)
-        order_type = order_data.get('order_type', 'delivery').upper()
-        printer.text(f"TYPE: {order_type}\n")
+    if order_type == 'TABLE' and order_data.get('table_number'):
+        printer.text(f"TABLE: {order_data['table_number']}\n")
 
-        if order_type == 'TABLE' and order_data.get('table_number'):
-            printer.text(f"TABLE: {order_data['table_number']}\n")
+    # Fixed datetime formatting with fallback
+    ordered_at = order_data.get('ordered_at') or order_data.get('created_at', '')
+    date_str, time_str = format_datetime(ordered_at)
+    printer.text(f"DATE: {date_str}\n")
+    printer.text(f"TIME: {time_str}\n")
 
-        # Fixed datetime formatting with fallback
-        ordered_at = order_data.get('ordered_at') or order_data.get('created_at', '')
-        date_str, time_str = format_datetime(ordered_at)
-        printer.text(f"DATE: {date_str}\n")
-        printer.text(f"TIME: {time_str}\n")
+    printer.text("-" * 32 + "\n")
 
-        printer.text("-" * 32 + "\n")
+    # Items - Improved formatting
+    printer.set(bold=True)
+    printer.text("ITEMS:\n")
+    printer.set(bold=False)
 
-        # Items - Improved formatting
+    total_calculated = 0
+
+    for item in order_data.get("items", []):
+        qty = item.get('quantity', 1)
+        name = get_item_name(item)
+
+        # Calculate item total (base + extras)
+        item_total = get_item_total(item)
+        total_calculated += item_total
+
+        # Improved formatting with consistent alignment
         printer.set(bold=True)
-        printer.text("ITEMS:\n")
+        printer.text(f"{qty}x {name}\n")
         printer.set(bold=False)
+        
+        # Price aligned to the right
+        price_str = f"Rs {item_total:.2f}"
+        spaces = 32 - len(price_str)
+        printer.text(f"{' ' * spaces}{price_str}\n")
 
-        total_calculated = 0
+        # Show extras details with better formatting
+        extras = item.get('extras', [])
+        if extras:
+            printer.text("  Extras:\n")
+            for extra in extras:
+                extra_name = extra.get('extra_name') or extra.get('name', 'Extra')
+                if 'extra' in extra and isinstance(extra['extra'], dict):
+                    extra_name = extra['extra'].get('name', extra_name)
+                
+                extra_qty = extra.get('quantity', 1)
+                printer.text(f"    • {extra_qty}x {extra_name}\n")
 
-        for item in order_data.get("items", []):
-            qty = item.get('quantity', 1)
-            name = get_item_name(item)
+        # Notes
+        note = item.get('note', '') or item.get('notes', '')
+        if note:
+            printer.text(f"  Note: {note}\n")
+        
+        printer.text("\n")
 
-            # Calculate item total (base + extras)
-            item_total = get_item_total(item)
-            total_calculated += item_total
+    printer.text("-" * 32 + "\n")
 
-            # Improved formatting with consistent alignment
-            printer.set(bold=True)
-            printer.text(f"{qty}x {name}\n")
-            printer.set(bold=False)
-            
-            # Price aligned to the right
-            price_str = f"Rs {item_total:.2f}"
-            spaces = 32 - len(price_str)
-            printer.text(f"{' ' * spaces}{price_str}\n")
-
-            # Show extras details with better formatting
-            extras = item.get('extras', [])
-            if extras:
-                printer.text("  Extras:\n")
-                for extra in extras:
-                    extra_name = extra.get('extra_name') or extra.get('name', 'Extra')
-                    if 'extra' in extra and isinstance(extra['extra'], dict):
-                        extra_name = extra['extra'].get('name', extra_name)
-                    
-                    extra_qty = extra.get('quantity', 1)
-                    printer.text(f"    • {extra_qty}x {extra_name}\n")
+    # Total
+    printer.set(bold=True)
+    total_amount = order_data.get('total_amount')
+    if not total_amount or float(total_amount) == 0:
+        total_amount = total_calculated
+    
+    total_str = f"TOTAL: Rs {float(total_amount):.2f}"
+    spaces = 32 - len(total_str)
+    printer.text(f"{' ' * spaces}{total_str}\n")
+    printer.set(bold=False)
 
-            # Notes
-            note = item.get('note', '') or item.get('notes', '')
-            if note:
-                printer.text(f"  Note: {note}\n")
-            
-            printer.text("\n")
+    printer.text("-" * 32 + "\n")
 
-        printer.text("-" * 32 + "\n")
+    # Waiting message
+    printer.set(align='center', bold=True)
+    printer.text("PLEASE WAIT 20 MINUTES\n")
+    printer.text("FOR FOOD PREPARATION\n\n")
+    printer.set(bold=False)
 
-        # Total
-        printer.set(bold=True)
-        total_amount = order_data.get('total_amount')
-        if not total_amount or float(total_amount) == 0:
-            total_amount = total_calculated
-        
-        total_str = f"TOTAL: Rs {float(total_amount):.2f}"
-        spaces = 32 - len(total_str)
-        printer.text(f"{' ' * spaces}{total_str}\n")
-        printer.set(bold=False)
+    # Footer
+    printer.set(align='center')
+    printer.text("Thank you for your order!\n")
+    printer.text("\n\n\n")
 
-        printer.text("-" * 32 + "\n")
+    printer.cut()
 
-        # Waiting message
-        printer.set(align='center', bold=True)
-        printer.text("PLEASE WAIT 20 MINUTES\n")
-        printer.text("FOR FOOD PREPARATION\n\n")
-        printer.set(bold=False)
 
-        # Footer
-        printer.set(align='center')
-        printer.text("Thank you for your order!\n")
-        printer.text("\n\n\n")
+def _printer_port():
+    return getattr(settings, 'PRINTER_PORT', 9100)
+
+
+def _printer_timeout():
+    return getattr(settings, 'PRINTER_TIMEOUT', 60)
+
+
+def network_printer(printer_ip):
+    """An escpos printer on the network at ``printer_ip``"""
+    from escpos.printer import Network
+
+    return Network(printer_ip, port=_printer_port(), timeout=_printer_timeout())
+
+
+def memory_printer():
+    """An escpos printer that keeps what is written to it in ``.output``"""
+    from escpos.printer import Dummy
+
+    return Dummy()
 
-        printer.cut()
+
+async def load_printing():
+    """Import escpos on a worker thread (once), so the event loop keeps serving meanwhile"""
+    if 'escpos.printer' not in sys.modules:
+        await sync_to_async(import_module, thread_sensitive=False)('escpos.printer')
+
+
+def _print(render, label, order_data, printer_ip):
+    started = time.perf_counter()
+    try:
+        printer = network_printer(printer_ip)
+        render(printer, order_data)
         printer.close()
+        _record_print(label, started, failed=False)
+        return True
+
+    except Exception as e:
+        logger.error(f"{label} printer failed: {e}")
+        _record_print(label, started, failed=True)
+        return False
+
+
+def _record_print(label, started, failed):
+    printer = label.lower()
+    metrics.PRINT_ATTEMPTS.labels(printer).inc()
+    metrics.PRINT_DURATION.labels(printer).observe(time.perf_counter() - started)
+    if failed:
+        metrics.PRINT_FAILURES.labels(printer).inc()
+
+
+def print_kitchen_bill(order_data, printer_ip):
+    """Print kitchen bill with improved formatting and fixed pricing"""
+    return _print(render_kitchen_bill, 'Kitchen', order_data, printer_ip)
+
+
+def print_counter_bill(order_data, printer_ip):
+    """Print counter bill with improved formatting and fixed pricing"""
+    return _print(render_counter_bill, 'Counter', order_data, printer_ip)
+
+
+async def send_to_printer(printer_ip, data):
+    """Write raw ESC/POS bytes to a network printer without blocking the event loop"""
+    port, timeout = _printer_port(), _printer_timeout()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(printer_ip, port), timeout)
+    try:
+        writer.write(data)
+        await asyncio.wait_for(writer.drain(), timeout)
+    finally:
+        writer.close()
+
+
+async def _aprint(render, label, order_data, printer_ip):
+    started = time.perf_counter()
+    try:
+        await load_printing()
+        # Render into memory, then send it all in one write
+        printer = memory_printer()
+        render(printer, order_data)
+        await send_to_printer(printer_ip, printer.output)
+        _record_print(label, started, failed=False)
         return True
 
     except Exception as e:
-        logger.error(f"Counter printer failed: {e}")
+        logger.error(f"{label} printer failed: {e}")
+        _record_print(label, started, failed=True)
         return False
 
 
+async def aprint_kitchen_bill(order_data, printer_ip):
+    """Async print_kitchen_bill"""
+    return await _aprint(render_kitchen_bill, 'Kitchen', order_data, printer_ip)
+
+
+async def aprint_counter_bill(order_data, printer_ip):
+    """Async print_counter_bill"""
+    return await _aprint(render_counter_bill, 'Counter', order_data, printer_ip)
+
+
 def print_bill(order_data, printer_ip, print_type="counter"):
     """Generic print function"""
     if print_type == "kitchen":
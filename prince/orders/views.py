@@ -1,95 +1,115 @@
 # views.py
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework import status
-from django.db import transaction
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.text import compress_sequence
 from .models import Cart, CartItem, CartItemExtra, Order, OrderItem, OrderItemExtra
-from .serializers import OrderSerializer, CartSerializer, CartItemSerializer
-from products.models import Product, Extra
+from .serializers import CartSerializer
+from .export import ExportError, export_filename, export_range, stream_orders
+from .fast_serializers import serialize_cart, serialize_order, serialize_orders
+from .pricing import price_cart
+from .transactions import write_transaction
+from prince import metrics
+from prince.async_views import async_chunks
+from products.price_cache import catalog_cache
+from reports.rollups import record_sale
 from .utils import print_bill, print_kitchen_bill, print_counter_bill
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 
+def _recalculate_cart_total(cart):
+    """Reprice the cart after a change and save its total"""
+    cart.total_amount = cart.calculate_total(refresh=True)
+    cart.save()
+
+
+def _add_cart_item_extras(cart_item, extras):
+    """Attach [{extra_id, quantity}] to a cart item, skipping unknown extras"""
+    known = catalog_cache.extras(extra_data.get('extra_id') for extra_data in extras)
+    new_extras = []
+    for extra_data in extras:
+        extra_quantity = extra_data.get('quantity', 1)
+        try:
+            extra_id = int(extra_data.get('extra_id'))
+        except (TypeError, ValueError):
+            continue
+
+        if extra_id in known and extra_quantity > 0:
+            new_extras.append(CartItemExtra(cart_item=cart_item, extra_id=extra_id, quantity=extra_quantity))
+    CartItemExtra.objects.bulk_create(new_extras)
+
+
 class AddToCartView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 20
 
     def post(self, request):
-        user = request.user
+        item, error = self.parse_item(request)
+        if error:
+            return error
+
+        if catalog_cache.product(item['product_id']) is None:
+            return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        cart = self.add_item(request.user, **item)
+
+        # Return updated cart data
+        return Response(serialize_cart(cart), status=status.HTTP_200_OK)
+
+    def parse_item(self, request):
+        """(add_item kwargs, None) or (None, error response)"""
         product_id = request.data.get('item')
         quantity = int(request.data.get('quantity', 1))
         note = request.data.get('note', '')
         extras = request.data.get('extras', [])  # List of {extra_id, quantity}
 
         if not product_id:
-            return Response({'error': 'Product ID is required'}, status=status.HTTP_400_BAD_REQUEST)
+            return None, Response({'error': 'Product ID is required'}, status=status.HTTP_400_BAD_REQUEST)
 
         if quantity <= 0:
-            return Response({'error': 'Quantity must be greater than 0'}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
-            return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        with transaction.atomic():
-            # Get or create the cart
-            cart, created = Cart.objects.get_or_create(
-                user=user,
-                defaults={'order_type': 'delivery', 'total_amount': 0}
-            )
-
-            # Check if item already exists in cart
-            cart_item, item_created = CartItem.objects.get_or_create(
-                cart=cart,
-                item=product,
-                defaults={'quantity': quantity, 'note': note}
-            )
+            return None, Response({'error': 'Quantity must be greater than 0'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return {'product_id': int(product_id), 'quantity': quantity, 'note': note, 'extras': extras}, None
+
+    @write_transaction
+    def add_item(self, user, product_id, quantity, note, extras):
+        # Get or create the cart
+        cart, created = Cart.objects.get_or_create(
+            user=user,
+            defaults={'order_type': 'delivery', 'total_amount': 0}
+        )
+
+        # Check if item already exists in cart
+        cart_item, item_created = CartItem.objects.get_or_create(
+            cart=cart,
+            item_id=product_id,
+            defaults={'quantity': quantity, 'note': note}
+        )
+
+        if not item_created:
+            # Update existing item
+            cart_item.quantity += quantity
+            cart_item.note = note or cart_item.note
+            cart_item.save()
+            # Clear existing extras to add new ones
+            cart_item.extras.all().delete()
 
-            if not item_created:
-                # Update existing item
-                cart_item.quantity += quantity
-                cart_item.note = note or cart_item.note
-                cart_item.save()
-                # Clear existing extras to add new ones
-                cart_item.extras.all().delete()
-
-            # Add extras to cart item
-            if extras:
-                for extra_data in extras:
-                    extra_id = extra_data.get('extra_id')
-                    extra_quantity = extra_data.get('quantity', 1)
-                    
-                    if extra_id and extra_quantity > 0:
-                        try:
-                            extra = Extra.objects.get(id=extra_id)
-                            CartItemExtra.objects.create(
-                                cart_item=cart_item,
-                                extra=extra,
-                                quantity=extra_quantity
-                            )
-                        except Extra.DoesNotExist:
-                            continue
-
-            # Recalculate cart total
-            self._recalculate_cart_total(cart)
+        # Add extras to cart item
+        if extras:
+            _add_cart_item_extras(cart_item, extras)
 
-        # Return updated cart data
-        serializer = CartSerializer(cart)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-
-    def _recalculate_cart_total(self, cart):
-        """Helper method to recalculate cart total"""
-        total = 0
-        for item in cart.items.all():
-            base_total = item.item.price * item.quantity
-            extras_total = sum(extra.total_amount for extra in item.extras.all())
-            total += base_total + extras_total
-        cart.total_amount = total
-        cart.save()
+        # Recalculate cart total
+        _recalculate_cart_total(cart)
+        return cart
 
 
 class CartItemUpdateView(APIView):
@@ -98,7 +118,7 @@ class CartItemUpdateView(APIView):
 
     def patch(self, request, item_id):
         try:
-            cart_item = CartItem.objects.select_related('cart', 'item').get(
+            cart_item = CartItem.objects.select_related('cart').get(
                 id=item_id,
                 cart__user=request.user
             )
@@ -109,62 +129,48 @@ class CartItemUpdateView(APIView):
         note = request.data.get('note')
         extras = request.data.get('extras', [])
 
-        with transaction.atomic():
-            # Update quantity
-            if quantity is not None:
-                try:
-                    quantity = int(quantity)
-                    if quantity <= 0:
-                        return Response({'error': 'Quantity must be greater than 0'}, status=status.HTTP_400_BAD_REQUEST)
-                    cart_item.quantity = quantity
-                except (ValueError, TypeError):
-                    return Response({'error': 'Invalid quantity'}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Update note
-            if note is not None:
-                cart_item.note = note
-
-            cart_item.save()
+        # Validate quantity
+        if quantity is not None:
+            try:
+                quantity = int(quantity)
+                if quantity <= 0:
+                    return Response({'error': 'Quantity must be greater than 0'}, status=status.HTTP_400_BAD_REQUEST)
+            except (ValueError, TypeError):
+                return Response({'error': 'Invalid quantity'}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Update extras if provided
-            if extras:
-                cart_item.extras.all().delete()
-                for extra_data in extras:
-                    extra_id = extra_data.get('extra_id')
-                    extra_quantity = extra_data.get('quantity', 1)
-                    
-                    if extra_id and extra_quantity > 0:
-                        try:
-                            extra = Extra.objects.get(id=extra_id)
-                            CartItemExtra.objects.create(
-                                cart_item=cart_item,
-                                extra=extra,
-                                quantity=extra_quantity
-                            )
-                        except Extra.DoesNotExist:
-                            continue
-
-            # Recalculate cart total
-            cart = cart_item.cart
-            self._recalculate_cart_total(cart)
+        cart = self.update_item(cart_item, quantity, note, extras)
 
         # Return updated cart
-        cart_serializer = CartSerializer(cart)
+        cart_data = serialize_cart(cart)
+        item_data = next(item for item in cart_data['items'] if item['id'] == cart_item.id)
         return Response({
             'message': 'Cart item updated successfully',
-            'cart': cart_serializer.data,
-            'item': CartItemSerializer(cart_item).data
+            'cart': cart_data,
+            'item': item_data
         }, status=status.HTTP_200_OK)
 
-    def _recalculate_cart_total(self, cart):
-        """Helper method to recalculate cart total"""
-        total = 0
-        for item in cart.items.all():
-            base_total = item.item.price * item.quantity
-            extras_total = sum(extra.total_amount for extra in item.extras.all())
-            total += base_total + extras_total
-        cart.total_amount = total
-        cart.save()
+
+    @write_transaction
+    def update_item(self, cart_item, quantity, note, extras):
+        # Update quantity
+        if quantity is not None:
+            cart_item.quantity = quantity
+
+        # Update note
+        if note is not None:
+            cart_item.note = note
+
+        cart_item.save()
+
+        # Update extras if provided
+        if extras:
+            cart_item.extras.all().delete()
+            _add_cart_item_extras(cart_item, extras)
+
+        # Recalculate cart total
+        cart = cart_item.cart
+        _recalculate_cart_total(cart)
+        return cart
 
 
 class CartItemDeleteView(APIView):
@@ -180,29 +186,27 @@ class CartItemDeleteView(APIView):
         except CartItem.DoesNotExist:
             return Response({'error': 'Cart item not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        with transaction.atomic():
-            cart = cart_item.cart
-            cart_item.delete()
-
-            # Recalculate cart total
-            total = 0
-            for item in cart.items.all():
-                base_total = item.item.price * item.quantity
-                extras_total = sum(extra.total_amount for extra in item.extras.all())
-                total += base_total + extras_total
-            cart.total_amount = total
-            cart.save()
+        cart = self.remove_item(cart_item)
 
         # Return updated cart
-        cart_serializer = CartSerializer(cart)
         return Response({
             'message': 'Cart item removed successfully',
-            'cart': cart_serializer.data
+            'cart': serialize_cart(cart)
         }, status=status.HTTP_200_OK)
 
+    @write_transaction
+    def remove_item(self, cart_item):
+        cart = cart_item.cart
+        CartItem.objects.filter(id=cart_item.id).delete()
+
+        # Recalculate cart total
+        _recalculate_cart_total(cart)
+        return cart
+
 
 class PlaceOrderView(APIView):
     permission_classes = [IsAuthenticated]
+    query_budget = 18
 
     def post(self, request):
         try:
@@ -213,100 +217,86 @@ class PlaceOrderView(APIView):
         if not cart.items.exists():
             return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
 
+        order_type, table_number, error = self.order_details(request, cart)
+        if error:
+            return error
+
+        # Printing stays outside the transaction so a retry never prints twice
+        started = time.perf_counter()
+        order, pricing, order_items = self.create_order(request.user, cart, order_type, table_number)
+        if order is None:
+            # Emptied by another request since the check above
+            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
+        self.record_order(order, pricing, started)
+
+        order_data = self.order_data(request.user, order, pricing, order_items)
+
+        # Print to Kitchen and Counter
+        try:
+            print_kitchen = print_kitchen_bill(order_data, settings.KITCHEN_PRINTER_IP)
+            print_counter = print_counter_bill(order_data, settings.COUNTER_PRINTER_IP)
+        except Exception as e:
+            logger.error(f"Printing error for order {order.id}: {str(e)}")
+            print_kitchen = False
+            print_counter = False
+
+        return self.placed_response(order, print_kitchen, print_counter)
+
+    def order_details(self, request, cart):
+        """(order_type, table_number, None) or (..., error response)"""
         # Get order data from request or use cart data
         order_type = request.data.get('order_type', cart.order_type)
         table_number = request.data.get('table_number', cart.table_number)
 
         # Validate order type
         if order_type not in ['delivery', 'parcel', 'table']:
-            return Response({'error': 'Invalid order type'}, status=status.HTTP_400_BAD_REQUEST)
+            error = Response({'error': 'Invalid order type'}, status=status.HTTP_400_BAD_REQUEST)
+            return order_type, table_number, error
 
         # Validate table number for table orders
         if order_type == 'table' and not table_number:
-            return Response({'error': 'Table number is required for table orders'}, status=status.HTTP_400_BAD_REQUEST)
-
-        with transaction.atomic():
-            # Create Order instance
-            order = Order.objects.create(
-                user=request.user,
-                order_type=order_type,
-                table_number=table_number if order_type == 'table' else None,
-                total_amount=cart.total_amount
-            )
-
-            # Create OrderItems and OrderItemExtras
-            order_items = []
-            for cart_item in cart.items.all():
-                # Calculate base total for order item
-                base_total = cart_item.item.price * cart_item.quantity
-                extras_total = sum(extra.total_amount for extra in cart_item.extras.all())
-                
-                order_item = OrderItem.objects.create(
-                    order=order,
-                    item=cart_item.item,
-                    quantity=cart_item.quantity,
-                    note=cart_item.note,
-                    total_amount=base_total + extras_total
-                )
-                
-                # Create OrderItemExtras
-                for cart_extra in cart_item.extras.all():
-                    OrderItemExtra.objects.create(
-                        order_item=order_item,
-                        extra=cart_extra.extra,
-                        quantity=cart_extra.quantity,
-                        total_amount=cart_extra.total_amount
-                    )
-                
-                order_items.append(order_item)
+            error = Response({'error': 'Table number is required for table orders'}, status=status.HTTP_400_BAD_REQUEST)
+            return order_type, table_number, error
 
-            # Clear cart
-            cart.items.all().delete()
-            cart.total_amount = 0
-            cart.save()
+        return order_type, table_number, None
 
-        # Prepare order data for printing
+    def order_data(self, user, order, pricing, order_items):
+        """Order data for printing (Decimal totals straight from the pricing)"""
         order_data = {
             "id": order.id,
-            "user": order.user.username,
+            "user": user.username,
             "order_type": order.order_type,
             "table_number": order.table_number,
-            "total_amount": float(order.total_amount),
+            "total_amount": pricing.total,
             "ordered_at": order.ordered_at.strftime("%Y-%m-%d %H:%M:%S"),
             "items": []
         }
 
-        for order_item in order_items:
+        for order_item, line in order_items:
             item_data = {
-                "item_id": order_item.item.id,
-                "item_name": order_item.item.name,
-                "quantity": order_item.quantity,
-                "note": order_item.note,
-                "total_amount": float(order_item.total_amount),
+                "item_id": order_item.item_id,
+                "item_name": line.name,
+                "quantity": line.quantity,
+                "note": line.note,
+                "total_amount": line.total,
                 "extras": []
             }
             
-            for extra in order_item.extras.all():
+            for extra in line.extras:
                 item_data["extras"].append({
-                    "name": extra.extra.name,
+                    "name": extra.name,
                     "quantity": extra.quantity,
-                    "total_amount": float(extra.total_amount)
+                    "total_amount": extra.total
                 })
             
             order_data["items"].append(item_data)
+        return order_data
 
-        # Print to Kitchen and Counter
-        kitchen_ip = '192.168.0.101'
-        counter_ip = '192.168.0.100'
-
-        try:
-            print_kitchen = print_kitchen_bill(order_data, kitchen_ip)
-            print_counter = print_counter_bill(order_data, counter_ip)
-        except Exception as e:
-            logger.error(f"Printing error for order {order.id}: {str(e)}")
-            print_kitchen = False
-            print_counter = False
+    def record_order(self, order, pricing, started):
+        metrics.ORDER_PLACEMENT_DURATION.labels(order.order_type).observe(time.perf_counter() - started)
+        metrics.ORDER_ITEMS.labels(order.order_type).observe(sum(line.quantity for line in pricing.lines))
 
+    def placed_response(self, order, print_kitchen, print_counter):
         logger.info(f"Order {order.id} - Kitchen print: {'Success' if print_kitchen else 'Failed'}")
         logger.info(f"Order {order.id} - Counter print: {'Success' if print_counter else 'Failed'}")
 
@@ -330,8 +320,66 @@ class PlaceOrderView(APIView):
         }, status=status.HTTP_201_CREATED)
 
 
+    @write_transaction
+    def create_order(self, user, cart, order_type, table_number):
+        """Turn the cart into an order; returns (None, pricing, []) for an empty cart"""
+        # Two checkouts of one cart must not both turn it into an order. SQLite's
+        # BEGIN IMMEDIATE already serialises writers; PostgreSQL needs the row lock
+        if connection.features.has_select_for_update:
+            cart = Cart.objects.select_for_update().get(pk=cart.pk)
+
+        # Price inside the write transaction so the order matches the cart exactly
+        pricing = price_cart(cart, refresh=True)
+        if not pricing.lines:
+            return None, pricing, []
+
+        # Create Order instance
+        order = Order.objects.create(
+            user=user,
+            order_type=order_type,
+            table_number=table_number if order_type == 'table' else None,
+            total_amount=pricing.total
+        )
+
+        # Create OrderItems and OrderItemExtras from the priced cart lines
+        # (bulk_create sets the ids on SQLite and PostgreSQL)
+        created = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                item_id=line.product_id,
+                quantity=line.quantity,
+                note=line.note,
+                total_amount=line.total
+            )
+            for line in pricing.lines
+        ])
+        order_items = list(zip(created, pricing.lines))
+
+        OrderItemExtra.objects.bulk_create([
+            OrderItemExtra(
+                order_item=order_item,
+                extra_id=extra.extra_id,
+                quantity=extra.quantity,
+                total_amount=extra.total
+            )
+            for order_item, line in order_items
+            for extra in line.extras
+        ])
+
+        # Same transaction: a retried or failed checkout never counts twice
+        record_sale(order, pricing)
+
+        # Clear cart
+        cart.items.all().delete()
+        cart.total_amount = 0
+        cart.save()
+        return order, pricing, order_items
+
+
 class OrderListView(APIView):
     permission_classes = [IsAuthenticated]
+    read_from_replica = True
+    query_budget = 8
 
     def get(self, request):
         # Get query parameters for filtering
@@ -351,24 +399,58 @@ class OrderListView(APIView):
             except ValueError:
                 pass
         
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serialize_orders(orders), status=status.HTTP_200_OK)
 
 
 class OrderDetailView(APIView):
     permission_classes = [IsAuthenticated]
+    read_from_replica = True
+    query_budget = 8
 
     def get(self, request, order_id):
         try:
             order = Order.objects.get(id=order_id, user=request.user)
-            serializer = OrderSerializer(order)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(serialize_order(order), status=status.HTTP_200_OK)
         except Order.DoesNotExist:
             return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
+class OrderExportView(APIView):
+    """Stream every order in a date range with its lines and extras (see orders.export).
+
+    ``start`` and ``end`` are local dates (YYYY-MM-DD, both included, either
+    may be left out), ``file_format`` is csv or ndjson and ``gzip=1`` sends
+    a .gz file. Without it the response is still gzipped on the way when
+    the client accepts that (CompressionMiddleware).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'csv').lower()
+        try:
+            since, until = export_range(request.query_params.get('start'), request.query_params.get('end'))
+            chunks = stream_orders(since, until, file_format)
+        except ExportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+        filename = export_filename(since, until, file_format)
+        if str(request.query_params.get('gzip', '')).lower() in ('1', 'true', 'yes'):
+            chunks = compress_sequence(chunk.encode() for chunk in chunks)
+            content_type = 'application/gzip'
+            filename += '.gz'
+        if isinstance(request._request, ASGIRequest):
+            chunks = async_chunks(chunks)
+
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
 class CartDetailView(APIView):
     permission_classes = [IsAuthenticated]
+    # GET runs 6; PATCH re-prices and serializes the cart after saving it
+    query_budget = 10
 
     def get(self, request):
         """Get user's cart"""
@@ -380,8 +462,7 @@ class CartDetailView(APIView):
                     'total_amount': 0
                 }
             )
-            serializer = CartSerializer(cart)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(serialize_cart(cart), status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"Error fetching cart: {str(e)}")
             return Response(
@@ -413,9 +494,10 @@ class CartDetailView(APIView):
             serializer = CartSerializer(cart, data=request.data, partial=True)
             
             if serializer.is_valid():
-                updated_cart = serializer.save()
+                updated_cart = write_transaction(serializer.save)()
                 logger.info(f"Cart updated successfully: {updated_cart.order_type}, {updated_cart.table_number}")
-                return Response(serializer.data, status=status.HTTP_200_OK)
+                # CartSerializer's nested items would query per line
+                return Response(serialize_cart(updated_cart), status=status.HTTP_200_OK)
             else:
                 logger.error(f"Cart update validation errors: {serializer.errors}")
                 return Response(
@@ -435,10 +517,7 @@ class CartDetailView(APIView):
         try:
             cart = Cart.objects.filter(user=request.user).first()
             if cart:
-                with transaction.atomic():
-                    cart.items.all().delete()
-                    cart.total_amount = 0
-                    cart.save()
+                self.clear(cart)
                 return Response(
                     {'message': 'Cart cleared successfully'}, 
                     status=status.HTTP_200_OK
@@ -456,6 +535,13 @@ class CartDetailView(APIView):
             )
 
 
+    @write_transaction
+    def clear(self, cart):
+        cart.items.all().delete()
+        cart.total_amount = 0
+        cart.save()
+
+
 class CartItemExtraView(APIView):
     """Manage extras for cart items"""
     permission_classes = [IsAuthenticated]
@@ -483,44 +569,21 @@ class CartItemExtraView(APIView):
         except (ValueError, TypeError):
             return Response({'error': 'Invalid quantity'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            extra = Extra.objects.get(id=extra_id)
-        except Extra.DoesNotExist:
+        if catalog_cache.extra(extra_id) is None:
             return Response({'error': 'Extra not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        with transaction.atomic():
-            # Check if extra already exists for this cart item
-            cart_item_extra, created = CartItemExtra.objects.get_or_create(
-                cart_item=cart_item,
-                extra=extra,
-                defaults={'quantity': quantity}
-            )
-
-            if not created:
-                cart_item_extra.quantity += quantity
-                cart_item_extra.save()
-
-            # Recalculate cart total
-            cart = cart_item.cart
-            total = 0
-            for item in cart.items.all():
-                base_total = item.item.price * item.quantity
-                extras_total = sum(e.total_amount for e in item.extras.all())
-                total += base_total + extras_total
-            cart.total_amount = total
-            cart.save()
+        cart = self.add_extra(cart_item, int(extra_id), quantity)
 
         # Return updated cart
-        cart_serializer = CartSerializer(cart)
         return Response({
             'message': 'Extra added successfully',
-            'cart': cart_serializer.data
+            'cart': serialize_cart(cart)
         }, status=status.HTTP_200_OK)
 
     def delete(self, request, item_id, extra_id):
         """Remove extra from cart item"""
         try:
-            cart_item_extra = CartItemExtra.objects.get(
+            cart_item_extra = CartItemExtra.objects.select_related('cart_item__cart').get(
                 cart_item_id=item_id,
                 extra_id=extra_id,
                 cart_item__cart__user=request.user
@@ -528,26 +591,41 @@ class CartItemExtraView(APIView):
         except CartItemExtra.DoesNotExist:
             return Response({'error': 'Cart item extra not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        with transaction.atomic():
-            cart = cart_item_extra.cart_item.cart
-            cart_item_extra.delete()
-
-            # Recalculate cart total
-            total = 0
-            for item in cart.items.all():
-                base_total = item.item.price * item.quantity
-                extras_total = sum(e.total_amount for e in item.extras.all())
-                total += base_total + extras_total
-            cart.total_amount = total
-            cart.save()
+        cart = self.remove_extra(cart_item_extra)
 
         # Return updated cart
-        cart_serializer = CartSerializer(cart)
         return Response({
             'message': 'Extra removed successfully',
-            'cart': cart_serializer.data
+            'cart': serialize_cart(cart)
         }, status=status.HTTP_200_OK)
 
+    @write_transaction
+    def add_extra(self, cart_item, extra_id, quantity):
+        # Check if extra already exists for this cart item
+        cart_item_extra, created = CartItemExtra.objects.get_or_create(
+            cart_item=cart_item,
+            extra_id=extra_id,
+            defaults={'quantity': quantity}
+        )
+
+        if not created:
+            cart_item_extra.quantity += quantity
+            cart_item_extra.save()
+
+        # Recalculate cart total
+        cart = cart_item.cart
+        _recalculate_cart_total(cart)
+        return cart
+
+    @write_transaction
+    def remove_extra(self, cart_item_extra):
+        cart = cart_item_extra.cart_item.cart
+        CartItemExtra.objects.filter(id=cart_item_extra.id).delete()
+
+        # Recalculate cart total
+        _recalculate_cart_total(cart)
+        return cart
+
 
 class RepeatOrderView(APIView):
     """Add items from a previous order to cart"""
@@ -559,50 +637,56 @@ class RepeatOrderView(APIView):
         except Order.DoesNotExist:
             return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        with transaction.atomic():
-            # Get or create cart
-            cart, created = Cart.objects.get_or_create(
-                user=request.user,
-                defaults={'order_type': 'delivery', 'total_amount': 0}
-            )
-
-            # Add order items to cart
-            for order_item in order.items.all():
-                cart_item, item_created = CartItem.objects.get_or_create(
-                    cart=cart,
-                    item=order_item.item,
-                    defaults={
-                        'quantity': order_item.quantity,
-                        'note': order_item.note
-                    }
-                )
-
-                if not item_created:
-                    cart_item.quantity += order_item.quantity
-                    cart_item.save()
-                    # Clear existing extras
-                    cart_item.extras.all().delete()
-
-                # Add extras
-                for order_extra in order_item.extras.all():
-                    CartItemExtra.objects.create(
-                        cart_item=cart_item,
-                        extra=order_extra.extra,
-                        quantity=order_extra.quantity
-                    )
-
-            # Recalculate cart total
-            total = 0
-            for item in cart.items.all():
-                base_total = item.item.price * item.quantity
-                extras_total = sum(e.total_amount for e in item.extras.all())
-                total += base_total + extras_total
-            cart.total_amount = total
-            cart.save()
+        cart = self.add_order_items(request.user, order)
 
         # Return updated cart
-        cart_serializer = CartSerializer(cart)
         return Response({
             'message': 'Order items added to cart successfully',
-            'cart': cart_serializer.data
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+            'cart': serialize_cart(cart)
+        }, status=status.HTTP_200_OK)
+
+    @write_transaction
+    def add_order_items(self, user, order):
+        # Get or create cart
+        cart, created = Cart.objects.get_or_create(
+            user=user,
+            defaults={'order_type': 'delivery', 'total_amount': 0}
+        )
+
+        # Merge the order's lines into the cart in memory, then write them in
+        # bulk: a product already in the cart gets the quantity added and its
+        # extras replaced by the order line's
+        order_items = list(order.items.prefetch_related('extras'))
+        cart_items = {
+            cart_item.item_id: cart_item
+            for cart_item in CartItem.objects.filter(cart=cart, item_id__in={item.item_id for item in order_items})
+        }
+        new_items, updated_items, extras = {}, {}, {}
+        for order_item in order_items:
+            cart_item = cart_items.get(order_item.item_id)
+            if cart_item is None:
+                cart_item = cart_items[order_item.item_id] = CartItem(
+                    cart=cart, item_id=order_item.item_id, quantity=order_item.quantity, note=order_item.note
+                )
+                new_items[order_item.item_id] = cart_item
+            else:
+                cart_item.quantity += order_item.quantity
+                if cart_item.pk is not None:
+                    updated_items[order_item.item_id] = cart_item
+            extras[order_item.item_id] = [
+                (order_extra.extra_id, order_extra.quantity) for order_extra in order_item.extras.all()
+            ]
+
+        CartItem.objects.bulk_create(new_items.values())
+        if updated_items:
+            CartItem.objects.bulk_update(updated_items.values(), ['quantity'])
+            CartItemExtra.objects.filter(cart_item__in=[item.pk for item in updated_items.values()]).delete()
+        CartItemExtra.objects.bulk_create([
+            CartItemExtra(cart_item=cart_items[item_id], extra_id=extra_id, quantity=quantity)
+            for item_id, item_extras in extras.items()
+            for extra_id, quantity in item_extras
+        ])
+
+        # Recalculate cart total
+        _recalculate_cart_total(cart)
+        return cart
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'prince.settings')
+# Read by prince.database: no persistent database connections under ASGI
+os.environ['SERVING_ASGI'] = '1'
 
 application = get_asgi_application()
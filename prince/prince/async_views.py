@@ -0,0 +1,60 @@
+"""APIView with coroutine handlers, for running under ASGI.
+
+DRF's ``APIView.dispatch`` is synchronous. ``AsyncAPIView`` keeps the same
+request lifecycle but awaits the handler, so Django serves the view
+natively on the event loop under ASGI (under WSGI it still works, with an
+event loop per request). Authentication, permissions and throttling are
+synchronous in DRF and may touch the database, so they run through
+``sync_to_async``.
+
+Django's ORM can't run transactions from async code: wrap the write
+helpers (``write_transaction`` functions) in ``sync_to_async`` too.
+
+Under ASGI Django reads a whole synchronous ``StreamingHttpResponse``
+into memory before sending it; stream it through ``async_chunks()``.
+"""
+import inspect
+
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    async def dispatch(self, request, *args, **kwargs):
+        """Same as APIView.dispatch, awaiting the handler"""
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            # options() and http_method_not_allowed() are DRF's sync ones
+            if inspect.isawaitable(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+async def async_chunks(chunks):
+    """Async iterator over a sync one that may query, one chunk per thread hop"""
+    chunks = iter(chunks)
+    # thread_sensitive: every chunk runs on the thread that owns the connection
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
@@ -0,0 +1,135 @@
+"""Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks seed their own fixtures inside ``rolled_back()`` so they can be
+run against any database without leaving data behind.
+"""
+import socket
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back"""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def measure(func, repeat=5):
+    """Call ``func`` ``repeat`` times; return (last result, best ms, median ms)"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, min(timings), statistics.median(timings)
+
+
+def seed_catalog(products=1000, extras_per_product=2, categories=20):
+    """Bulk insert a synthetic menu and return the created products"""
+    from products.models import Category, Product, Extra
+    from products.price_cache import bump_catalog_version
+
+    Category.objects.bulk_create([Category(name=f'Bench Category {i:03d}') for i in range(categories)])
+    category_ids = list(
+        Category.objects.filter(name__startswith='Bench Category ').order_by('id').values_list('id', flat=True)
+    )
+
+    Product.objects.bulk_create([
+        Product(
+            category_id=category_ids[i % len(category_ids)],
+            name=f'Bench Product {i:05d}',
+            price=Decimal(40 + i % 200) + Decimal('0.50'),
+            is_popular=i % 10 == 0,
+        )
+        for i in range(products)
+    ], batch_size=500)
+    created = list(Product.objects.filter(name__startswith='Bench Product ').order_by('id'))
+
+    Extra.objects.bulk_create([
+        Extra(product=product, name=f'Bench Extra {j}', price=Decimal(10 + j * 5))
+        for product in created
+        for j in range(extras_per_product)
+    ], batch_size=500)
+    bump_catalog_version()
+    return created
+
+
+
+def seed_orders(user, products, orders=1000, items_per_order=3, extras_per_item=1):
+    """Bulk insert a synthetic order history for ``user``"""
+    from products.models import Extra
+    from orders.models import Order, OrderItem, OrderItemExtra
+
+    extras = {}
+    for extra in Extra.objects.filter(product__in=products).order_by('id'):
+        extras.setdefault(extra.product_id, []).append(extra)
+
+    Order.objects.bulk_create([
+        Order(user=user, order_type=('delivery', 'parcel', 'table')[i % 3],
+              table_number=str(i % 12 + 1) if i % 3 == 2 else None, total_amount=Decimal('0.00'))
+        for i in range(orders)
+    ], batch_size=500)
+    created = list(Order.objects.filter(user=user).order_by('id'))
+
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            item=products[(i * items_per_order + j) % len(products)],
+            quantity=j + 1,
+            total_amount=products[(i * items_per_order + j) % len(products)].price * (j + 1),
+        )
+        for i, order in enumerate(created)
+        for j in range(items_per_order)
+    ], batch_size=500)
+
+    OrderItemExtra.objects.bulk_create([
+        OrderItemExtra(order_item=item, extra=extra, quantity=1, total_amount=extra.price)
+        for item in OrderItem.objects.filter(order__user=user).order_by('id')
+        for extra in extras.get(item.item_id, [])[:extras_per_item]
+    ], batch_size=500)
+    return created
+
+
+class FakePrinter:
+    """TCP server that accepts and discards ESC/POS jobs (on a free port unless given one)"""
+
+    def __init__(self, port=0):
+        self.jobs = 0
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', port))
+        self.sock.listen(128)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.receive, args=(conn,), daemon=True).start()
+
+    def receive(self, conn):
+        with conn:
+            while conn.recv(65536):
+                pass
+        self.jobs += 1
+
+    def close(self):
+        self.sock.close()
@@ -0,0 +1,377 @@
+"""Load test with scripted POS sessions, used by the ``bench_pos`` command.
+
+A session is one customer at the till: the cashier logs in, loads the menu,
+adds a few items (some with extras), changes a quantity, places the order
+and checks the order history. ``clients`` cashiers run sessions back to
+back, either against the app in this process (``InProcessTransport``,
+WSGI without a server) or against a running server (``HttpTransport``).
+
+Results are kept per endpoint: the latencies, the unexpected statuses as
+errors, and orders answered with 206 (placed, but not printed). A summary
+can be saved as a JSON baseline and compared with a later run.
+"""
+import asyncio
+import http.client
+import io
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+PIN = '1234'
+
+# Statuses a healthy server answers with; anything else is an error
+EXPECTED = {
+    'login': {200},
+    'menu': {200},
+    'categories': {200},
+    'add': {200},
+    'update': {200},
+    'cart': {200},
+    'order': {201, 206},
+    'history': {200},
+    'order_detail': {200},
+}
+
+
+def _decode(raw):
+    try:
+        return json.loads(raw) if raw else None
+    except ValueError:
+        return None
+
+
+class InProcessTransport:
+    """Calls the WSGI application directly, so every middleware runs as in production"""
+
+    def __init__(self, app=None):
+        if app is None:
+            from django.core.wsgi import get_wsgi_application
+
+            app = get_wsgi_application()
+        self.app = app
+
+    def __call__(self, method, path, body=None, token=None):
+        path, _, query = path.partition('?')
+        data = json.dumps(body).encode() if body is not None else b''
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(data)),
+            'wsgi.input': io.BytesIO(data),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.url_scheme': 'http',
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if token:
+            environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        status = []
+        result = self.app(environ, lambda line, headers, exc_info=None: status.append(int(line.split()[0])))
+        try:
+            raw = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return status[0], _decode(raw)
+
+
+async def asgi_request(app, method, path, body=None, token=None):
+    """Call an ASGI application directly; returns the status"""
+    path, _, query = path.partition('?')
+    data = json.dumps(body).encode() if body is not None else b''
+    headers = [
+        (b'host', b'localhost'),
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(data)).encode()),
+    ]
+    if token:
+        headers.append((b'authorization', f'Bearer {token}'.encode()))
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': headers,
+        'server': ('localhost', 80),
+        'client': ('127.0.0.1', 0),
+    }
+    messages = [{'type': 'http.request', 'body': data, 'more_body': False}]
+    disconnected = asyncio.Event()
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await app(scope, receive, send)
+    disconnected.set()
+    return status[0]
+
+
+class HttpTransport:
+    """HTTP/1.1 with one keep-alive connection per cashier thread"""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"Not an http(s) URL: {base_url}")
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            connection = self._local.connection = connection_class(self.netloc, timeout=self.timeout)
+        return connection
+
+    def __call__(self, method, path, body=None, token=None):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, self.prefix + path, body=data, headers=headers)
+                response = connection.getresponse()
+                return response.status, _decode(response.read())
+            except (ConnectionError, http.client.HTTPException):
+                # The server closed the kept-alive connection; reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+
+class Recorder:
+    """Latencies and errors per endpoint, shared by the cashier threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.errors = {}
+        self.sessions = 0
+        self.failed_sessions = 0
+        self.session_errors = {}
+        self.unprinted_orders = 0
+
+    def record(self, endpoint, status, seconds):
+        with self._lock:
+            self.timings.setdefault(endpoint, []).append(seconds)
+            if status not in EXPECTED.get(endpoint, {200}):
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            if endpoint == 'order' and status == 206:
+                self.unprinted_orders += 1
+
+    def session_done(self, error=None):
+        """Count a session; ``error`` is the exception that ended a failed one"""
+        with self._lock:
+            self.sessions += 1
+            if error is not None:
+                self.failed_sessions += 1
+                name = type(error).__name__
+                self.session_errors[name] = self.session_errors.get(name, 0) + 1
+
+
+class SessionFailed(Exception):
+    pass
+
+
+class Cashier:
+    """One till: an account, a transport and a random number generator"""
+
+    def __init__(self, index, transport, recorder, phone_prefix='9000', seed=0):
+        self.phone = f'{phone_prefix}{index:05d}'
+        self.transport = transport
+        self.recorder = recorder
+        self.rng = random.Random(seed * 100003 + index)
+        self.token = None
+
+    def ensure_account(self):
+        """Sign the cashier up unless the account already exists (not timed)"""
+        status, _ = self.transport('POST', '/api/login/', {'phone': self.phone, 'password': PIN})
+        if status == 200:
+            return
+        status, data = self.transport(
+            'POST', '/api/signup/', {'name': f'Cashier {self.phone}', 'phone': self.phone, 'password': PIN}
+        )
+        if status != 201:
+            raise SessionFailed(f"Could not sign up {self.phone}: {status} {data}")
+
+    def call(self, endpoint, method, path, body=None):
+        started = time.perf_counter()
+        status, data = self.transport(method, path, body, self.token)
+        self.recorder.record(endpoint, status, time.perf_counter() - started)
+        if status not in EXPECTED.get(endpoint, {200}):
+            raise SessionFailed(f"{endpoint}: {method} {path} answered {status}")
+        return data
+
+    def session(self):
+        rng = self.rng
+        tokens = self.call('login', 'POST', '/api/login/', {'phone': self.phone, 'password': PIN})
+        self.token = tokens['tokens']['access']
+
+        menu = self.call('menu', 'GET', '/api/products/')
+        self.call('categories', 'GET', '/api/categories/')
+        if not menu:
+            raise SessionFailed("The menu is empty; seed a catalog first")
+
+        cart = None
+        for product in rng.sample(menu, min(len(menu), rng.randint(1, 4))):
+            item = {'item': product['id'], 'quantity': rng.randint(1, 3)}
+            extras = product.get('extras') or []
+            if extras and rng.random() < 0.5:
+                item['extras'] = [
+                    {'extra_id': extra['id'], 'quantity': 1}
+                    for extra in rng.sample(extras, rng.randint(1, len(extras)))
+                ]
+            cart = self.call('add', 'POST', '/api/cart/add/', item)
+
+        line = rng.choice(cart['items'])
+        self.call('update', 'PATCH', f"/api/cart/item/{line['id']}/update/", {'quantity': line['quantity'] + 1})
+        self.call('cart', 'GET', '/api/cart/')
+
+        order_type = rng.choice(['delivery', 'parcel', 'table'])
+        body = {'order_type': order_type}
+        if order_type == 'table':
+            body['table_number'] = str(rng.randint(1, 12))
+        placed = self.call('order', 'POST', '/api/order/', body)
+
+        self.call('history', 'GET', '/api/orders/?limit=10')
+        self.call('order_detail', 'GET', f"/api/orders/{placed['order_id']}/")
+
+    def run(self, stop_at, sessions, think):
+        done = 0
+        while (sessions and done < sessions) or (not sessions and time.monotonic() < stop_at):
+            try:
+                self.session()
+                self.recorder.session_done()
+            except Exception as e:
+                # An unexpected body or a dropped connection fails the session,
+                # not the cashier: it keeps going and the failure is counted
+                self.recorder.session_done(e)
+            done += 1
+            if think:
+                time.sleep(self.rng.uniform(0, 2 * think))
+
+
+def run_load(transport, clients=8, duration=20.0, sessions=0, think=0.0, phone_prefix='9000', seed=0):
+    """Run the cashiers; ``sessions`` per cashier, or as many as fit in ``duration`` seconds"""
+    recorder = Recorder()
+    cashiers = [Cashier(index, transport, recorder, phone_prefix, seed) for index in range(clients)]
+    for cashier in cashiers:
+        cashier.ensure_account()
+
+    # One session outside the timed run: imports, URL resolver, caches
+    Cashier(0, transport, Recorder(), phone_prefix, seed).session()
+
+    started = time.perf_counter()
+    stop_at = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=cashier.run, args=(stop_at, sessions, think))
+        for cashier in cashiers
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'elapsed': time.perf_counter() - started,
+        'timings': recorder.timings,
+        'errors': recorder.errors,
+        'sessions': recorder.sessions,
+        'failed_sessions': recorder.failed_sessions,
+        'session_errors': recorder.session_errors,
+        'unprinted_orders': recorder.unprinted_orders,
+    }
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def _endpoint_summary(timings, errors, elapsed):
+    ordered = sorted(timings)
+    return {
+        'requests': len(ordered),
+        'rps': round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+        'p90_ms': round(percentile(ordered, 0.90) * 1000, 2),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        'errors': errors,
+    }
+
+
+def summarise(result, **meta):
+    """The JSON-friendly report (and baseline) of a run"""
+    elapsed = result['elapsed']
+    endpoints = {
+        endpoint: _endpoint_summary(timings, result['errors'].get(endpoint, 0), elapsed)
+        for endpoint, timings in sorted(result['timings'].items())
+    }
+    everything = [seconds for timings in result['timings'].values() for seconds in timings]
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        **meta,
+        'elapsed': round(elapsed, 3),
+        'sessions': result['sessions'],
+        'sessions_per_s': round(result['sessions'] / elapsed, 2) if elapsed else 0.0,
+        'failed_sessions': result['failed_sessions'],
+        'session_errors': result['session_errors'],
+        'unprinted_orders': result['unprinted_orders'],
+        'endpoints': endpoints,
+        'all': _endpoint_summary(everything, sum(result['errors'].values()), elapsed),
+    }
+
+
+def compare(current, baseline, tolerance=0.25):
+    """(endpoint, metric, baseline, current, change, regressed) rows for the endpoints in both runs.
+
+    Regressions: p95 latency up, or throughput down, by more than
+    ``tolerance`` (a fraction), or any errors where the baseline had none.
+    """
+    rows = []
+    sections = [('all', current['all'], baseline['all'])] + [
+        (endpoint, summary, baseline['endpoints'][endpoint])
+        for endpoint, summary in current['endpoints'].items()
+        if endpoint in baseline['endpoints']
+    ]
+    for endpoint, now, before in sections:
+        for metric, higher_is_worse in (('p95_ms', True), ('rps', False)):
+            old, new = before[metric], now[metric]
+            change = (new - old) / old if old else 0.0
+            regressed = change > tolerance if higher_is_worse else change < -tolerance
+            rows.append((endpoint, metric, old, new, change, regressed))
+        if now['errors'] and not before['errors']:
+            rows.append((endpoint, 'errors', before['errors'], now['errors'], 0.0, True))
+    return rows
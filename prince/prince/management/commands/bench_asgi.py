@@ -0,0 +1,248 @@
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+
+from prince.benchmark import FakePrinter
+from prince.loadtest import asgi_request
+
+ENDPOINTS = ['products', 'cart', 'add', 'order']
+
+
+def _init_worker(env):
+    os.environ.update(env)
+    django.setup()
+
+
+def _prepare(clients):
+    """Migrate and seed the scratch database (runs in the worker)"""
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from prince.benchmark import seed_catalog
+
+    call_command('migrate', verbosity=0)
+    seed_catalog(products=200, categories=10)
+    User.objects.bulk_create([User(username=f'bench-{i}') for i in range(clients)])
+
+
+def _simulate_printer_latency(seconds):
+    """Network printers take a while to accept a job; model that as a delay before connecting"""
+    from orders import utils
+
+    network_printer = utils.network_printer
+
+    def slow_network_printer(printer_ip):
+        time.sleep(seconds)
+        return network_printer(printer_ip)
+
+    send_to_printer = utils.send_to_printer
+
+    async def slow_send_to_printer(printer_ip, data):
+        await asyncio.sleep(seconds)
+        await send_to_printer(printer_ip, data)
+
+    utils.network_printer = slow_network_printer
+    utils.send_to_printer = slow_send_to_printer
+
+
+def _session(rng, product_ids):
+    """One cashier's order: look at the menu and cart, add two items, check out"""
+    def add():
+        return ('add', 'POST', '/api/cart/add/', {'item': rng.choice(product_ids), 'quantity': rng.randint(1, 3)})
+
+    return [
+        ('products', 'GET', '/api/products/', None),
+        ('cart', 'GET', '/api/cart/', None),
+        add(),
+        add(),
+        ('order', 'POST', '/api/order/', {'order_type': 'parcel'}),
+    ]
+
+
+def _split(path):
+    path, _, query = path.partition('?')
+    return path, query
+
+
+def _wsgi_request(app, method, path, body, token):
+    path, query = _split(path)
+    data = json.dumps(body).encode() if body is not None else b''
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'HTTP_AUTHORIZATION': f'Bearer {token}',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(data)),
+        'wsgi.input': io.BytesIO(data),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http',
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    result = app(environ, lambda line, headers, exc_info=None: status.append(int(line.split()[0])))
+    try:
+        b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return status[0]
+
+
+def _run(mode, clients, threads, seconds, printer_latency):
+    """Drive the app with ``clients`` cashiers for ``seconds`` (runs in the worker)"""
+    from django.contrib.auth.models import User
+    from account.views import get_tokens_for_user
+    from products.models import Product
+
+    _simulate_printer_latency(printer_latency)
+    users = User.objects.filter(username__startswith='bench-').order_by('id')[:clients]
+    tokens = [get_tokens_for_user(user)['access'] for user in users]
+    product_ids = list(Product.objects.values_list('id', flat=True))
+    timings = {endpoint: [] for endpoint in ENDPOINTS}
+    counts = {'errors': 0, 'print_failures': 0}
+
+    def record(endpoint, status, elapsed):
+        timings[endpoint].append(elapsed)
+        counts['errors'] += status >= 500
+        counts['print_failures'] += endpoint == 'order' and status == 206
+
+    if mode == 'wsgi':
+        from django.core.wsgi import get_wsgi_application
+
+        app = get_wsgi_application()
+        # Warm up (imports, URL resolver, caches) outside the timed run
+        for endpoint, method, path, body in _session(random.Random(), product_ids):
+            _wsgi_request(app, method, path, body, tokens[0])
+        # Like a threaded WSGI worker: `threads` request threads fed from one FIFO queue
+        executor = ThreadPoolExecutor(threads)
+        lock = threading.Lock()
+
+        def client(index):
+            rng = random.Random(index)
+            while time.monotonic() < stop:
+                for endpoint, method, path, body in _session(rng, product_ids):
+                    began = time.perf_counter()
+                    status = executor.submit(_wsgi_request, app, method, path, body, tokens[index]).result()
+                    with lock:
+                        record(endpoint, status, time.perf_counter() - began)
+
+        start = time.perf_counter()
+        stop = time.monotonic() + seconds
+        clients = [threading.Thread(target=client, args=(index,)) for index in range(len(tokens))]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        executor.shutdown()
+    else:
+        from django.core.asgi import get_asgi_application
+
+        app = get_asgi_application()
+
+        async def client(index):
+            rng = random.Random(index)
+            while time.monotonic() < stop:
+                for endpoint, method, path, body in _session(rng, product_ids):
+                    began = time.perf_counter()
+                    status = await asgi_request(app, method, path, body, tokens[index])
+                    record(endpoint, status, time.perf_counter() - began)
+
+        async def main():
+            nonlocal start, stop
+            for endpoint, method, path, body in _session(random.Random(), product_ids):
+                await asgi_request(app, method, path, body, tokens[0])
+            start = time.perf_counter()
+            stop = time.monotonic() + seconds
+            await asyncio.gather(*(client(index) for index in range(len(tokens))))
+
+        start = stop = None
+        asyncio.run(main())
+
+    return {'elapsed': time.perf_counter() - start, 'timings': timings, **counts}
+
+
+class Command(BaseCommand):
+    help = (
+        "Throughput of one worker serving cart and order traffic: sync views under WSGI "
+        "vs async views (ASYNC_VIEWS) under ASGI, on a scratch SQLite database with a fake printer"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=32, help='Concurrent cashiers')
+        parser.add_argument('--threads', type=int, default=4, help='Request threads of the WSGI worker')
+        parser.add_argument('--seconds', type=float, default=10.0, help='Duration per mode')
+        parser.add_argument('--printer-latency', type=float, default=150,
+                            help='Milliseconds a printer takes to accept a job')
+        parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        modes = ['wsgi', 'asgi'] if options['mode'] == 'both' else [options['mode']]
+        printer = FakePrinter()
+        context = multiprocessing.get_context('spawn')
+
+        self.stdout.write(
+            f"{options['clients']} clients, WSGI threads {options['threads']}, {options['seconds']:.0f}s per mode, "
+            f"printer latency {options['printer_latency']:.0f}ms"
+        )
+        self.stdout.write(
+            f"{'mode':<5} {'endpoint':<9} {'requests':>9} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8}"
+        )
+        try:
+            for mode in modes:
+                with tempfile.TemporaryDirectory() as directory:
+                    env = {
+                        'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'bench.sqlite3')}",
+                        'ASYNC_VIEWS': str(mode == 'asgi'),
+                        'KITCHEN_PRINTER_IP': '127.0.0.1',
+                        'COUNTER_PRINTER_IP': '127.0.0.1',
+                        'PRINTER_PORT': str(printer.port),
+                    }
+                    # A fresh process per mode: settings and URLs are read at startup
+                    with context.Pool(1, initializer=_init_worker, initargs=(env,)) as pool:
+                        pool.apply(_prepare, (options['clients'],))
+                        result = pool.apply(_run, (
+                            mode, options['clients'], options['threads'], options['seconds'],
+                            options['printer_latency'] / 1000,
+                        ))
+                self.report(mode, result)
+        finally:
+            printer.close()
+
+    def report(self, mode, result):
+        elapsed = result['elapsed']
+        everything = []
+        for endpoint in ENDPOINTS:
+            timings = result['timings'][endpoint]
+            everything += timings
+            self.stdout.write(f"{mode:<5} {endpoint:<9} " + self.row(timings, elapsed))
+        self.stdout.write(f"{mode:<5} {'all':<9} " + self.row(everything, elapsed))
+        if result['errors'] or result['print_failures']:
+            self.stdout.write(self.style.WARNING(
+                f"{mode}: {result['errors']} server errors, {result['print_failures']} orders not printed"
+            ))
+
+    def row(self, timings, elapsed):
+        if len(timings) < 2:
+            return f"{len(timings):>9}"
+        quantiles = statistics.quantiles(timings, n=20)
+        return (
+            f"{len(timings):>9} {len(timings) / elapsed:>7.1f} "
+            f"{statistics.median(timings) * 1000:>8.1f} {quantiles[-1] * 1000:>8.1f}"
+        )
@@ -0,0 +1,161 @@
+import json
+import multiprocessing
+import os
+import tempfile
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from prince.benchmark import FakePrinter
+from prince.loadtest import HttpTransport, compare, run_load, summarise
+
+
+def _init_worker(env):
+    os.environ.update(env)
+    django.setup()
+
+
+def _prepare(products):
+    """Migrate and seed the scratch database (runs in the worker)"""
+    from django.core.management import call_command
+    from prince.benchmark import seed_catalog
+
+    call_command('migrate', verbosity=0)
+    seed_catalog(products=products, categories=max(1, products // 20))
+
+
+def _run_in_process(load):
+    from prince.loadtest import InProcessTransport
+
+    return run_load(InProcessTransport(), **load)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test with scripted cashier sessions (login, menu, add items with extras, change a quantity, "
+        "place the order, order history). Runs the app in a worker process on a scratch SQLite database, "
+        "or against a server with --url. Reports throughput and latency percentiles per endpoint"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server (default: run the app in-process)')
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent cashiers')
+        parser.add_argument('--duration', type=float, default=20.0, help='Seconds to run')
+        parser.add_argument('--sessions', type=int, default=0,
+                            help='Sessions per cashier instead of a duration (0 = use --duration)')
+        parser.add_argument('--think-ms', type=float, default=0,
+                            help='Average pause between sessions, in milliseconds')
+        parser.add_argument('--products', type=int, default=200, help='Size of the in-process menu')
+        parser.add_argument('--phone-prefix', default='9000',
+                            help='Cashier accounts are <prefix><5 digits>, signed up on first use')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--fake-printer-port', type=int, default=0,
+                            help='With --url: run a fake printer on this port for the server to print to')
+        parser.add_argument('--save-baseline', metavar='PATH', help='Write the results as a JSON baseline')
+        parser.add_argument('--compare', metavar='PATH', help='Compare with a saved baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p95 increase / throughput drop against the baseline (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        load = {
+            'clients': options['clients'],
+            'duration': options['duration'],
+            'sessions': options['sessions'],
+            'think': options['think_ms'] / 1000,
+            'phone_prefix': options['phone_prefix'],
+            'seed': options['seed'],
+        }
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        if options['url']:
+            result = self.run_against_server(options['url'], options['fake_printer_port'], load)
+            target = options['url']
+        else:
+            result = self.run_in_process(options['products'], load)
+            target = 'in-process'
+
+        summary = summarise(result, target=target, clients=options['clients'])
+        self.report(summary)
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline_file:
+                json.dump(summary, baseline_file, indent=2)
+            self.stdout.write(f"Baseline saved to {options['save_baseline']}")
+
+        if baseline is not None:
+            regressions = self.report_comparison(summary, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError(f"{regressions} regressions against {options['compare']}")
+
+    def run_against_server(self, url, printer_port, load):
+        printer = FakePrinter(printer_port) if printer_port else None
+        if printer:
+            self.stdout.write(f"Fake printer on 127.0.0.1:{printer.port}")
+        try:
+            return run_load(HttpTransport(url), **load)
+        except (ConnectionError, OSError) as e:
+            raise CommandError(f"Could not reach {url}: {e}")
+        finally:
+            if printer:
+                printer.close()
+
+    def run_in_process(self, products, load):
+        printer = FakePrinter()
+        context = multiprocessing.get_context('spawn')
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                env = {
+                    'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'loadtest.sqlite3')}",
+                    'KITCHEN_PRINTER_IP': '127.0.0.1',
+                    'COUNTER_PRINTER_IP': '127.0.0.1',
+                    'PRINTER_PORT': str(printer.port),
+                }
+                # A fresh process: the database settings are read at startup
+                with context.Pool(1, initializer=_init_worker, initargs=(env,)) as pool:
+                    pool.apply(_prepare, (products,))
+                    return pool.apply(_run_in_process, (load,))
+        finally:
+            printer.close()
+
+    def report(self, summary):
+        self.stdout.write(
+            f"{summary['target']}: {summary['clients']} cashiers, {summary['sessions']} sessions "
+            f"in {summary['elapsed']:.1f}s ({summary['sessions_per_s']:.1f}/s)"
+        )
+        self.stdout.write(
+            f"{'endpoint':<13} {'requests':>8} {'req/s':>7} {'p50 ms':>8} {'p90 ms':>8} "
+            f"{'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>6}"
+        )
+        for endpoint, row in list(summary['endpoints'].items()) + [('all', summary['all'])]:
+            self.stdout.write(
+                f"{endpoint:<13} {row['requests']:>8} {row['rps']:>7.1f} {row['p50_ms']:>8.1f} "
+                f"{row['p90_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f} "
+                f"{row['errors']:>6}"
+            )
+        if summary['failed_sessions'] or summary['unprinted_orders']:
+            self.stdout.write(self.style.WARNING(
+                f"{summary['failed_sessions']} sessions failed, {summary['unprinted_orders']} orders not printed"
+            ))
+        if summary.get('session_errors'):
+            errors = ', '.join(f"{name} x{count}" for name, count in sorted(summary['session_errors'].items()))
+            self.stdout.write(self.style.WARNING(f"Failed sessions ended with: {errors}"))
+
+    def report_comparison(self, summary, baseline, tolerance):
+        self.stdout.write(f"Against the baseline of {baseline.get('created', '?')} ({baseline.get('target', '?')}):")
+        if (baseline.get('target'), baseline.get('clients')) != (summary['target'], summary['clients']):
+            self.stdout.write(self.style.WARNING(
+                f"The baseline ran {baseline.get('clients')} cashiers against {baseline.get('target')}; "
+                f"the numbers are not directly comparable"
+            ))
+        regressions = 0
+        for endpoint, metric, old, new, change, regressed in compare(summary, baseline, tolerance):
+            line = f"{endpoint:<13} {metric:<7} {old:>9} -> {new:>9} ({change:+.0%})"
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line + ' REGRESSION'))
+            else:
+                self.stdout.write(line)
+        return regressions
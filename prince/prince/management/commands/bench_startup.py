@@ -0,0 +1,107 @@
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from prince.startup import import_times
+
+
+def _init_worker(env):
+    os.environ.update(env)
+    django.setup()
+
+
+def _prepare():
+    """Migrate and seed the scratch database (runs in the worker)"""
+    from django.core.management import call_command
+    from prince.benchmark import seed_catalog
+
+    call_command('migrate', verbosity=0)
+    seed_catalog(products=200, categories=10)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time to first request of a fresh WSGI and ASGI worker: interpreter start, imports and "
+        "app setup, then one request, in new processes on a scratch SQLite database. "
+        "Lists the slowest imports of the boot with --top"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Workers started per mode')
+        parser.add_argument('--path', default='/api/products/', help='The first request (a GET)')
+        parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='both')
+        parser.add_argument('--top', type=int, default=10, help='Slowest imports to list (0 for none)')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError("--runs must be at least 1")
+        modes = ['wsgi', 'asgi'] if options['mode'] == 'both' else [options['mode']]
+        context = multiprocessing.get_context('spawn')
+
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'startup.sqlite3')}",
+                'TRAFFIC_CAPTURE': '',
+                'QUERY_BUDGET_LOG': '',
+            }
+            with context.Pool(1, initializer=_init_worker, initargs=(env,)) as pool:
+                pool.apply(_prepare)
+
+            self.stdout.write(f"{options['runs']} workers per mode, first request GET {options['path']}")
+            self.stdout.write(
+                f"{'mode':<5} {'boot ms':>8} {'first ms':>9} {'total ms':>9} {'best ms':>8}"
+            )
+            for mode in modes:
+                worker_env = {**os.environ, **env, 'ASYNC_VIEWS': str(mode == 'asgi')}
+                runs = [self.start_worker(mode, options['path'], worker_env) for _ in range(options['runs'])]
+                self.report(mode, runs)
+            if options['top']:
+                self.report_imports(modes[0], options['path'], {**os.environ, **env}, options['top'])
+
+    def spawn(self, mode, path, env, *flags):
+        started = time.monotonic()
+        result = subprocess.run(
+            [sys.executable, *flags, '-m', 'prince.startup', mode, path],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f"The {mode} worker failed:\n{result.stderr}")
+        return started, json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+    def start_worker(self, mode, path, env):
+        started, stamps, _ = self.spawn(mode, path, env)
+        if stamps['status'] >= 400:
+            raise CommandError(f"GET {path} answered {stamps['status']}")
+        return {
+            'boot': (stamps['ready'] - started) * 1000,
+            'first': (stamps['responded'] - stamps['ready']) * 1000,
+            'total': (stamps['responded'] - started) * 1000,
+        }
+
+    def report(self, mode, runs):
+        def median(phase):
+            return statistics.median(run[phase] for run in runs)
+
+        self.stdout.write(
+            f"{mode:<5} {median('boot'):>8.1f} {median('first'):>9.1f} {median('total'):>9.1f} "
+            f"{min(run['total'] for run in runs):>8.1f}"
+        )
+
+    def report_imports(self, mode, path, env, top):
+        _, _, stderr = self.spawn(mode, path, env, '-X', 'importtime')
+        times = import_times(stderr)
+        total = sum(self_us for self_us, _ in times.values())
+        self.stdout.write(f"\nSlowest imports of a {mode} worker ({len(times)} modules, {total / 1000:.0f} ms):")
+        self.stdout.write(f"{'self ms':>8} {'cumulative ms':>14}  module")
+        slowest = sorted(times.items(), key=lambda item: -item[1][0])[:top]
+        for module, (self_us, cumulative_us) in slowest:
+            self.stdout.write(f"{self_us / 1000:>8.1f} {cumulative_us / 1000:>14.1f}  {module}")
@@ -0,0 +1,97 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from prince.database import sqlite_database
+
+SOURCE_ALIAS = 'sqlite_source'
+
+# Rebuilt by migrate on the target; their ids differ between databases
+EXCLUDED_MODELS = {
+    'contenttypes.contenttype',
+    'auth.permission',
+    'auth.group_permissions',
+    'auth.user_user_permissions',
+    'admin.logentry',
+    'sessions.session',
+}
+
+
+def models_in_dependency_order():
+    """Concrete models (M2M tables included) with FK targets before referrers"""
+    models = [
+        model for model in apps.get_models(include_auto_created=True)
+        if model._meta.label_lower not in EXCLUDED_MODELS
+        and model._meta.managed and not model._meta.proxy
+    ]
+    ordered = []
+    visiting = set()
+
+    def visit(model):
+        if model in ordered or model in visiting:
+            return
+        visiting.add(model)
+        for field in model._meta.concrete_fields:
+            target = field.related_model if field.is_relation else None
+            if target is not None and target is not model and target in models:
+                visit(target)
+        visiting.discard(model)
+        ordered.append(model)
+
+    for model in models:
+        visit(model)
+    return ordered
+
+
+class Command(BaseCommand):
+    help = "Copy every row from a SQLite database file into the configured (e.g. PostgreSQL) database in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="Path of the SQLite database to copy from")
+        parser.add_argument('--database', default='default', help="Target database alias (migrated, empty)")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        target = options['database']
+        batch_size = options['batch_size']
+        if connections[target].vendor == 'sqlite' and connections[target].settings_dict['NAME'] == options['source']:
+            raise CommandError("Source and target are the same database")
+
+        # Register the source file as an extra alias, with Django's defaults filled in
+        source = {DEFAULT_DB_ALIAS: {}, SOURCE_ALIAS: sqlite_database(options['source'])}
+        connections.settings[SOURCE_ALIAS] = connections.configure_settings(source)[SOURCE_ALIAS]
+
+        models = models_in_dependency_order()
+        non_empty = [model._meta.label for model in models if model._default_manager.using(target).exists()]
+        if non_empty:
+            raise CommandError(f"Target already has rows in: {', '.join(non_empty)}")
+
+        start = time.perf_counter()
+        with transaction.atomic(using=target):
+            for model in models:
+                copied = 0
+                batch = []
+                rows = model._default_manager.using(SOURCE_ALIAS).order_by('pk').iterator(chunk_size=batch_size)
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        model._default_manager.using(target).bulk_create(batch)
+                        copied += len(batch)
+                        batch = []
+                if batch:
+                    model._default_manager.using(target).bulk_create(batch)
+                    copied += len(batch)
+                if copied:
+                    self.stdout.write(f"{model._meta.label:<32} {copied:>9} rows")
+
+            # Explicit ids leave PostgreSQL sequences behind; move them past the copied rows
+            statements = connections[target].ops.sequence_reset_sql(no_style(), models)
+            with connections[target].cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+        connections[SOURCE_ALIAS].close()
+        self.stdout.write(self.style.SUCCESS(f"Copied {len(models)} tables in {time.perf_counter() - start:.1f}s"))
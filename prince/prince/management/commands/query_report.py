@@ -0,0 +1,87 @@
+import statistics
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from prince.query_budget import read_log
+
+SORT_KEYS = {
+    'queries': lambda row: row['avg_queries'],
+    'db': lambda row: row['avg_db_ms'],
+    'duplicates': lambda row: row['avg_duplicates'],
+    'over': lambda row: row['over_budget'],
+    'total': lambda row: row['p95_total_ms'],
+}
+
+
+def _p95(values):
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=20, method='inclusive')[-1]
+
+
+class Command(BaseCommand):
+    help = "Worst endpoints by queries, SQL time and duplicate queries, from the QUERY_BUDGET_LOG traffic log"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=None, help='Traffic log to read (default: QUERY_BUDGET_LOG)')
+        parser.add_argument('--last', type=int, default=0, help='Only the last N requests (0 = all)')
+        parser.add_argument('--sort', choices=sorted(SORT_KEYS), default='queries')
+        parser.add_argument('--limit', type=int, default=20, help='Endpoints to list')
+
+    def handle(self, *args, **options):
+        path = options['log'] or getattr(settings, 'QUERY_BUDGET_LOG', '')
+        if not path:
+            raise CommandError("No traffic log; set QUERY_BUDGET_LOG or pass --log")
+        try:
+            entries = read_log(path)
+        except FileNotFoundError:
+            raise CommandError(f"{path} does not exist")
+        if options['last']:
+            entries = entries[-options['last']:]
+        if not entries:
+            self.stdout.write("No requests logged")
+            return
+
+        by_endpoint = defaultdict(list)
+        for entry in entries:
+            by_endpoint[(entry['method'], entry['endpoint'])].append(entry)
+
+        rows = [self.summarise(method, endpoint, logged) for (method, endpoint), logged in by_endpoint.items()]
+        rows.sort(key=SORT_KEYS[options['sort']], reverse=True)
+
+        self.stdout.write(f"{len(entries)} requests, {len(rows)} endpoints, sorted by {options['sort']}")
+        self.stdout.write(
+            f"{'endpoint':<40} {'reqs':>6} {'queries':>8} {'p95 q':>6} {'max q':>6} {'budget':>6} "
+            f"{'over':>5} {'dupes':>6} {'db ms':>7} {'p95 ms':>8}"
+        )
+        for row in rows[:options['limit']]:
+            line = (
+                f"{row['name'][:40]:<40} {row['requests']:>6} {row['avg_queries']:>8.1f} "
+                f"{row['p95_queries']:>6.0f} {row['max_queries']:>6} {row['budget'] or '-':>6} "
+                f"{row['over_budget']:>5} {row['avg_duplicates']:>6.1f} {row['avg_db_ms']:>7.1f} "
+                f"{row['p95_total_ms']:>8.1f}"
+            )
+            self.stdout.write(self.style.WARNING(line) if row['over_budget'] else line)
+            if row['worst_duplicate']:
+                self.stdout.write(f"    repeated: {row['worst_duplicate'][:120]}")
+
+    def summarise(self, method, endpoint, entries):
+        queries = [entry['queries'] for entry in entries]
+        budget = entries[-1].get('budget')
+        worst = max(entries, key=lambda entry: entry['duplicates'])
+        return {
+            'name': f"{method} {endpoint}",
+            'requests': len(entries),
+            'avg_queries': statistics.fmean(queries),
+            'p95_queries': _p95(queries),
+            'max_queries': max(queries),
+            'budget': budget,
+            'over_budget': sum(1 for entry in entries if entry.get('budget') is not None
+                               and entry['queries'] > entry['budget']),
+            'avg_duplicates': statistics.fmean(entry['duplicates'] for entry in entries),
+            'avg_db_ms': statistics.fmean(entry['db_ms'] for entry in entries),
+            'p95_total_ms': _p95([entry['total_ms'] for entry in entries]),
+            'worst_duplicate': worst.get('worst_duplicate'),
+        }
@@ -0,0 +1,164 @@
+import json
+import multiprocessing
+import os
+import tempfile
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from prince.benchmark import FakePrinter
+from prince.loadtest import HttpTransport
+from prince.traffic import Replayer, latency_diff, read_capture, summarise_replay
+
+
+def _init_worker(env):
+    os.environ.update(env)
+    django.setup()
+
+
+def _replay_in_process(entries, catalog, replay):
+    """Migrate and seed the scratch database, then replay (runs in the worker)"""
+    from django.core.management import call_command
+    from prince.loadtest import InProcessTransport
+    from prince.synthetic import Generator
+    from prince.traffic import prepare_accounts
+
+    call_command('migrate', verbosity=0)
+    Generator(seed=catalog['seed']).catalog(catalog['categories'], catalog['products'], catalog['max_extras'])
+    replayer = Replayer(InProcessTransport(), entries, **replay)
+    prepare_accounts(replayer.accounts())
+    return replayer.run()
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a TRAFFIC_CAPTURE file and report latency per endpoint. Runs the app in a worker process "
+        "on a scratch SQLite database seeded with generate_data's catalog, or against a server with --url. "
+        "Compare with a saved run with --compare, or diff two saved runs with --diff"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('capture', nargs='?', help='File written by TrafficCaptureMiddleware')
+        parser.add_argument('--url', help='Base URL of a running server (default: run the app in-process)')
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help='1 = original pacing, 10 = ten times faster, 0 = as fast as possible')
+        parser.add_argument('--products', type=int, default=500, help='Size of the in-process menu')
+        parser.add_argument('--categories', type=int, default=25)
+        parser.add_argument('--max-extras', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the in-process menu')
+        parser.add_argument('--phone-prefix', default='9100',
+                            help='Replay accounts are <prefix><5 digits>, one per captured user')
+        parser.add_argument('--save', metavar='PATH', help='Write the results as JSON')
+        parser.add_argument('--compare', metavar='PATH', help='Diff against a saved run')
+        parser.add_argument('--diff', nargs=2, metavar=('BEFORE', 'AFTER'),
+                            help='Diff two saved runs without replaying')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p50/p95 increase over the other run (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        if options['diff']:
+            before, after = (self.load(path) for path in options['diff'])
+            return self.finish(self.report_diff(before, after, options['tolerance']), options['diff'][0])
+
+        if not options['capture']:
+            raise CommandError("Give a capture file to replay, or --diff with two saved runs")
+        if options['speed'] < 0:
+            raise CommandError("--speed can't be negative")
+        entries = read_capture(options['capture'])
+        if not entries:
+            raise CommandError(f"No requests in {options['capture']}")
+        baseline = self.load(options['compare']) if options['compare'] else None
+
+        replay = {'speed': options['speed'], 'phone_prefix': options['phone_prefix']}
+        if options['url']:
+            try:
+                result = Replayer(HttpTransport(options['url']), entries, **replay).run()
+            except (ConnectionError, OSError, RuntimeError) as e:
+                raise CommandError(f"Could not replay against {options['url']}: {e}")
+            target = options['url']
+        else:
+            catalog = {key: options[key] for key in ('products', 'categories', 'max_extras', 'seed')}
+            result = self.run_in_process(entries, catalog, replay)
+            target = 'in-process'
+
+        summary = summarise_replay(result, target=target, capture=options['capture'], speed=options['speed'])
+        self.report(summary)
+
+        if options['save']:
+            with open(options['save'], 'w') as results_file:
+                json.dump(summary, results_file, indent=2)
+            self.stdout.write(f"Results saved to {options['save']}")
+
+        if baseline is not None:
+            self.finish(self.report_diff(baseline, summary, options['tolerance']), options['compare'])
+
+    def load(self, path):
+        try:
+            with open(path) as results_file:
+                return json.load(results_file)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {path}: {e}")
+
+    def finish(self, regressions, against):
+        if regressions:
+            raise CommandError(f"{regressions} regressions against {against}")
+
+    def run_in_process(self, entries, catalog, replay):
+        printer = FakePrinter()
+        context = multiprocessing.get_context('spawn')
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                env = {
+                    'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'replay.sqlite3')}",
+                    'KITCHEN_PRINTER_IP': '127.0.0.1',
+                    'COUNTER_PRINTER_IP': '127.0.0.1',
+                    'PRINTER_PORT': str(printer.port),
+                    # Don't capture (or log) the replay itself
+                    'TRAFFIC_CAPTURE': '',
+                    'QUERY_BUDGET_LOG': '',
+                }
+                # A fresh process: the database settings are read at startup
+                with context.Pool(1, initializer=_init_worker, initargs=(env,)) as pool:
+                    return pool.apply(_replay_in_process, (entries, catalog, replay))
+        finally:
+            printer.close()
+
+    def report(self, summary):
+        self.stdout.write(
+            f"{summary['target']}: {summary['requests']} requests in {summary['elapsed']:.1f}s "
+            f"(captured over {summary['captured_span']:.1f}s, speed {summary['speed'] or 'max'}), "
+            f"{summary['skipped']} skipped, most behind schedule {summary['max_lag_ms']:.0f} ms"
+        )
+        self.stdout.write(
+            f"{'endpoint':<32} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+            f"{'was p50':>8} {'was p95':>8} {'errors':>6}"
+        )
+        for endpoint, row in summary['endpoints'].items():
+            self.stdout.write(
+                f"{endpoint:<32} {row['requests']:>8} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} "
+                f"{row['p99_ms']:>8.1f} {row['max_ms']:>8.1f} {row['captured_p50_ms']:>8.1f} "
+                f"{row['captured_p95_ms']:>8.1f} {row['errors']:>6}"
+            )
+        if summary['errors']:
+            self.stdout.write(self.style.WARNING(
+                f"{summary['errors']} requests answered differently than when captured (see errors)"
+            ))
+
+    def report_diff(self, before, after, tolerance):
+        self.stdout.write(
+            f"{before.get('target', '?')} ({before.get('created', '?')}) -> "
+            f"{after.get('target', '?')} ({after.get('created', '?')}):"
+        )
+        regressions = 0
+        for endpoint, metric, old, new, change, regressed in latency_diff(before, after, tolerance):
+            line = f"{endpoint:<32} {metric:<7} {old:>9} -> {new:>9} ({change:+.0%})"
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line + ' REGRESSION'))
+            else:
+                self.stdout.write(line)
+        for name, run, other in (('first', before, after), ('second', after, before)):
+            only = sorted(set(run['endpoints']) - set(other['endpoints']))
+            if only:
+                self.stdout.write(f"Only in the {name} run: {', '.join(only)}")
+        return regressions
@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from prince.routers import REPLICA_ALIAS
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database onto the replica file (a stand-in for replication in local testing)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep syncing every N seconds (0 = sync once)')
+
+    def handle(self, *args, **options):
+        if REPLICA_ALIAS not in connections.settings:
+            raise CommandError("No replica configured; set REPLICA_DATABASE_URL")
+        primary = connections['default'].settings_dict
+        replica = connections[REPLICA_ALIAS].settings_dict
+        if connections['default'].vendor != 'sqlite' or connections[REPLICA_ALIAS].vendor != 'sqlite':
+            raise CommandError("sync_replica only copies SQLite files; use real replication for PostgreSQL")
+        if str(primary['NAME']) == str(replica['NAME']):
+            raise CommandError("Primary and replica are the same file")
+
+        while True:
+            start = time.perf_counter()
+            # The backup API takes a consistent snapshot, even with writers on the WAL
+            source = sqlite3.connect(primary['NAME'])
+            target = sqlite3.connect(replica['NAME'])
+            try:
+                source.backup(target)
+            finally:
+                source.close()
+                target.close()
+            self.stdout.write(f"Synced replica in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,318 @@
+"""Counters and histograms, exposed at /metrics in the Prometheus text format.
+
+Each worker process keeps its values in a small memory-mapped file of
+``METRICS_DIR`` (``metrics_<pid>.db``). Updating a metric is a dict lookup
+and an in-place write into the map, with no I/O or cross-process locking.
+The /metrics view reads every file in the directory and adds them up, so
+whichever worker answers the scrape reports the whole server. Empty the
+directory when the server starts: the files of exited workers are still
+counted, which keeps counters monotonic across worker restarts but would
+double count after a full restart. Without ``METRICS_DIR`` the values live
+in anonymous memory and /metrics reports only the worker that answers.
+
+Metrics are declared at import time, so all processes know the same set::
+
+    ORDERS = Counter('prince_orders_total', 'Orders placed', ['order_type'])
+    ORDERS.labels('parcel').inc()
+"""
+import glob
+import hmac
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# File layout: bytes in use (uint32, padded to 8), then entries of
+# key length (uint32), UTF-8 key padded to a multiple of 8, float64 value
+_HEADER = struct.Struct('i4x')
+_KEY_LENGTH = struct.Struct('i')
+_VALUE = struct.Struct('d')
+_INITIAL_SIZE = 64 * 1024
+
+
+def _entries(data, used):
+    """(key, value, value offset) of each complete entry"""
+    position = _HEADER.size
+    while position + _KEY_LENGTH.size <= used:
+        length = _KEY_LENGTH.unpack_from(data, position)[0]
+        start = position + _KEY_LENGTH.size
+        value_at = start + length + (-(_KEY_LENGTH.size + length) % 8)
+        if value_at + _VALUE.size > used:
+            break
+        yield bytes(data[start:start + length]).decode(), _VALUE.unpack_from(data, value_at)[0], value_at
+        position = value_at + _VALUE.size
+
+
+class MmapStore:
+    """float64 values by key in a memory-mapped file (anonymous memory without a path)"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._file = None
+        if path:
+            self._file = open(path, 'a+b')
+            if os.fstat(self._file.fileno()).st_size < _INITIAL_SIZE:
+                self._file.truncate(_INITIAL_SIZE)
+        self._map_file(os.fstat(self._file.fileno()).st_size if path else _INITIAL_SIZE)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        # A reused pid's file: carry on from its values
+        self._positions = {key: offset for key, _, offset in _entries(self._map, self._used)}
+
+    def _map_file(self, size):
+        if self._file is not None:
+            self._map = mmap.mmap(self._file.fileno(), size)
+        else:
+            self._map = mmap.mmap(-1, size)
+        self._size = size
+
+    def _grow(self):
+        size = self._size * 2
+        old = self._map
+        if self._file is not None:
+            self._file.truncate(size)
+            self._map_file(size)
+        else:
+            self._map_file(size)
+            self._map[:self._used] = old[:self._used]
+        old.close()
+
+    def _add(self, key):
+        encoded = key.encode()
+        padding = -(_KEY_LENGTH.size + len(encoded)) % 8
+        value_at = self._used + _KEY_LENGTH.size + len(encoded) + padding
+        while value_at + _VALUE.size > self._size:
+            self._grow()
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _KEY_LENGTH.size:self._used + _KEY_LENGTH.size + len(encoded)] = encoded
+        _VALUE.pack_into(self._map, value_at, 0.0)
+        # Readers only look up to `used`, so publish the entry once it is complete
+        self._used = value_at + _VALUE.size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = value_at
+        return value_at
+
+    def inc(self, key, amount=1.0):
+        with self._lock:
+            position = self._positions.get(key)
+            if position is None:
+                position = self._add(key)
+            _VALUE.pack_into(self._map, position, _VALUE.unpack_from(self._map, position)[0] + amount)
+
+    def values(self):
+        with self._lock:
+            return {key: value for key, value, _ in _entries(self._map, self._used)}
+
+
+def read_store(path):
+    """Values of another process's store file"""
+    with open(path, 'rb') as store_file:
+        data = store_file.read()
+    if len(data) < _HEADER.size:
+        return {}
+    used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+    return {key: value for key, value, _ in _entries(data, used)}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def store():
+    """This process's store (a forked worker gets its own)"""
+    global _store
+    if _store is None or _store.pid != os.getpid():
+        with _store_lock:
+            if _store is None or _store.pid != os.getpid():
+                directory = getattr(settings, 'METRICS_DIR', '')
+                path = os.path.join(directory, f'metrics_{os.getpid()}.db') if directory else None
+                _store = MmapStore(path)
+    return _store
+
+
+def collect():
+    """{key: value} summed over every process's store"""
+    directory = getattr(settings, 'METRICS_DIR', '')
+    if not directory:
+        return store().values()
+    totals = {}
+    for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+        try:
+            values = read_store(path)
+        except OSError:
+            continue
+        for key, value in values.items():
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+REGISTRY = []
+
+HTTP_METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'])
+
+
+def method_label(method):
+    """The request method, or 'other' so made-up verbs can't add series without bound"""
+    return method if method in HTTP_METHODS else 'other'
+
+
+def _key(name, label_values, suffix='', bucket=None):
+    return json.dumps([name, suffix, label_values, bucket], separators=(',', ':'))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            child = self._children.setdefault(values, self.child(list(values)))
+        return child
+
+
+class _CounterChild:
+    def __init__(self, key):
+        self.key = key
+
+    def inc(self, amount=1):
+        store().inc(self.key, amount)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def child(self, values):
+        return _CounterChild(_key(self.name, values))
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets, bucket_keys, sum_key, count_key):
+        self.buckets = buckets
+        self.bucket_keys = bucket_keys
+        self.sum_key = sum_key
+        self.count_key = count_key
+
+    def observe(self, value):
+        target = store()
+        # Per-bucket counts; the cumulative ones Prometheus wants are built on export
+        target.inc(self.bucket_keys[bisect_left(self.buckets, value)])
+        target.inc(self.sum_key, value)
+        target.inc(self.count_key)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(bucket) for bucket in buckets))
+
+    def child(self, values):
+        bounds = self.buckets + (math.inf,)
+        return _HistogramChild(
+            self.buckets,
+            [_key(self.name, values, '_bucket', index) for index in range(len(bounds))],
+            _key(self.name, values, '_sum'),
+            _key(self.name, values, '_count'),
+        )
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def exposition():
+    """All registered metrics in the Prometheus text format"""
+    samples = {}
+    for key, value in collect().items():
+        name, suffix, label_values, bucket = json.loads(key)
+        samples.setdefault(name, {}).setdefault(tuple(label_values), {})[(suffix, bucket)] = value
+
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for label_values, values in sorted(samples.get(metric.name, {}).items()):
+            labels = _labels(metric.labelnames, label_values)
+            if metric.kind == 'counter':
+                lines.append(f'{metric.name}{labels} {_number(values.get(("", None), 0))}')
+                continue
+            cumulative = 0.0
+            for index, bound in enumerate(metric.buckets + (math.inf,)):
+                cumulative += values.get(('_bucket', index), 0)
+                le = _labels(metric.labelnames, label_values, [f'le="{_number(bound)}"'])
+                lines.append(f'{metric.name}_bucket{le} {_number(cumulative)}')
+            lines.append(f'{metric.name}_sum{labels} {_number(values.get(("_sum", None), 0))}')
+            lines.append(f'{metric.name}_count{labels} {_number(values.get(("_count", None), 0))}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """GET /metrics, for Prometheus to scrape with ``Authorization: Bearer METRICS_TOKEN``.
+
+    Without a METRICS_TOKEN it is only served with DEBUG on.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE)
+
+
+REQUEST_DURATION = Histogram(
+    'prince_http_request_duration_seconds', 'Time to respond to a request', ['view', 'method', 'status'],
+)
+REQUEST_DB_DURATION = Histogram(
+    'prince_http_request_db_seconds', 'SQL time per request', ['view'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+PRINT_ATTEMPTS = Counter('prince_print_attempts_total', 'Bills sent to a printer', ['printer'])
+PRINT_FAILURES = Counter('prince_print_failures_total', 'Bills that failed to print', ['printer'])
+PRINT_DURATION = Histogram('prince_print_duration_seconds', 'Time to send a bill to a printer', ['printer'])
+ORDER_PLACEMENT_DURATION = Histogram(
+    'prince_order_placement_seconds', 'Time to turn a cart into an order (write transaction, retries included)',
+    ['order_type'],
+)
+ORDER_ITEMS = Histogram(
+    'prince_order_items', 'Items (quantities summed) per order', ['order_type'],
+    buckets=(1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 50),
+)
@@ -0,0 +1,336 @@
+"""Project-wide middleware"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+from . import metrics, profiling, traffic
+from .query_budget import QueryStats, endpoint_name, finish_request
+from .routers import (
+    is_pinned_to_primary,
+    pin_to_primary,
+    replica_configured,
+    request_user_id,
+    set_request_replica_reads,
+)
+
+
+def _accepted_encodings(header):
+    """Encodings from an Accept-Encoding header, minus any with q=0"""
+    accepted = set()
+    for part in header.lower().split(','):
+        name, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip())
+    return accepted
+
+
+class CompressedBodyCache:
+    """Small LRU of compressed bodies keyed by encoding + body digest.
+
+    Catalog responses are byte-identical until the menu changes, so the
+    compressed snapshot is reused and only hashing the body costs CPU.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, encoding, content, compress):
+        key = (encoding, hashlib.blake2b(content, digest_size=16).digest())
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                return compressed
+
+        compressed = compress(content)
+        with self._lock:
+            self._entries[key] = compressed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compressed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Brotli or gzip compression for large API responses.
+
+    Only responses of at least ``COMPRESSION_MIN_SIZE`` bytes with a content
+    type in ``COMPRESSION_CONTENT_TYPES`` are compressed. Brotli is used when
+    the client accepts it and the ``brotli`` package is installed. GET
+    responses under ``COMPRESSION_CACHE_PREFIXES`` (the menu) keep their
+    compressed bytes in a per-process cache.
+    """
+    brotli_quality = 5
+    cache = CompressedBodyCache(getattr(settings, 'COMPRESSION_CACHE_SIZE', 32))
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.content_types = set(getattr(settings, 'COMPRESSION_CONTENT_TYPES', ['application/json']))
+        self.cache_prefixes = tuple(getattr(settings, 'COMPRESSION_CACHE_PREFIXES', ()))
+
+    def choose_encoding(self, request):
+        accepted = _accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+        return None
+
+    def compress(self, encoding, content):
+        if encoding == 'br':
+            return brotli.compress(content, quality=self.brotli_quality)
+        return compress_string(content)
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in self.content_types:
+            return response
+
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = self.choose_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            # Streamed exports are gzipped on the fly, chunk by chunk
+            accepted = _accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            if response.is_async or 'gzip' not in accepted:
+                return response
+            encoding = 'gzip'
+            response.streaming_content = compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            content = response.content
+            if (request.method == 'GET' and response.status_code == 200
+                    and request.path.startswith(self.cache_prefixes)):
+                compressed = self.cache.get_or_compress(
+                    encoding, content, lambda body: self.compress(encoding, body)
+                )
+            else:
+                compressed = self.compress(encoding, content)
+
+            # Return the compressed content only if it's actually shorter
+            if len(compressed) >= len(content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """Route reads of ``read_from_replica`` views to the replica database.
+
+    Only GET/HEAD requests to views with ``read_from_replica = True`` use the
+    replica, and only while the user isn't pinned to the primary by a recent
+    write. Successful writes pin the user. See ``prince.routers``.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not replica_configured() or request.method not in ('GET', 'HEAD'):
+            return None
+        view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+        if not getattr(view_class, 'read_from_replica', False):
+            return None
+        if is_pinned_to_primary(request_user_id(request)):
+            return None
+        set_request_replica_reads(True)
+        request._replica_reads = True
+        return None
+
+    def process_response(self, request, response):
+        if getattr(request, '_replica_reads', False):
+            # WSGI threads keep their context between requests
+            set_request_replica_reads(False)
+            request._replica_reads = False
+
+        if (replica_configured() and request.method not in self.safe_methods
+                and response.status_code < 400):
+            user_id = request_user_id(request)
+            if user_id is not None:
+                pin_to_primary(user_id)
+        return response
+
+
+class QueryBudgetMiddleware:
+    """Count each request's queries, report them in Server-Timing and enforce budgets.
+
+    Goes near the top of MIDDLEWARE so the queries of the middleware below it
+    (sessions, auth) are counted too. See ``prince.query_budget``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = request.query_stats = QueryStats()
+        started = time.perf_counter()
+        with stats.record():
+            response = self.get_response(request)
+        return finish_request(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats = request.query_stats = QueryStats()
+        started = time.perf_counter()
+        with stats.record():
+            response = await self.get_response(request)
+        return finish_request(request, response, stats, started)
+
+
+class MetricsMiddleware:
+    """Request latency by URL name, method and status, and SQL time per request.
+
+    Goes first in MIDDLEWARE. The SQL time is the ``request.query_stats``
+    left by QueryBudgetMiddleware, so that one must be installed too. See
+    ``prince.metrics``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    def observe(self, request, response, started):
+        # URL names, not paths, so ids don't make a new series per request
+        view = endpoint_name(request) or 'unmatched'
+        metrics.REQUEST_DURATION.labels(view, metrics.method_label(request.method), response.status_code).observe(
+            time.perf_counter() - started
+        )
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            metrics.REQUEST_DB_DURATION.labels(view).observe(stats.seconds)
+
+
+class TrafficCaptureMiddleware:
+    """Append sanitized request traces to ``TRAFFIC_CAPTURE`` for ``replay_traffic``.
+
+    Does nothing unless the setting names a file. Goes right after
+    MetricsMiddleware, so the captured time covers the rest of the stack.
+    See ``prince.traffic``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not traffic.capture_log.enabled:
+            return self.get_response(request)
+        body, upload = traffic.request_body(request)
+        started_at, started = time.time(), time.perf_counter()
+        response = self.get_response(request)
+        traffic.capture(request, response, started_at, time.perf_counter() - started, body, upload)
+        return response
+
+    async def __acall__(self, request):
+        if not traffic.capture_log.enabled:
+            return await self.get_response(request)
+        body, upload = traffic.request_body(request)
+        started_at, started = time.time(), time.perf_counter()
+        response = await self.get_response(request)
+        traffic.capture(request, response, started_at, time.perf_counter() - started, body, upload)
+        return response
+
+
+class ProfilingMiddleware:
+    """cProfile and tracemalloc profiles of single requests, kept for /api/profiles/.
+
+    Does nothing unless ``PROFILING`` is on; then profiles staff requests
+    sent with ``X-Profile: 1`` and a ``PROFILING_SAMPLE_RATE`` sample of the
+    rest. Goes right after TrafficCaptureMiddleware, above
+    QueryBudgetMiddleware so profiles can report its query counts. See
+    ``prince.profiling``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        reason = profiling.trigger(request)
+        if reason and profiling.claim():
+            return profiling.RequestProfile(request, reason).run(self.get_response)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        profiling.async_requests.enter()
+        try:
+            reason = profiling.trigger(request)
+            # Other requests on the event loop would be profiled along with this one
+            if reason and profiling.async_requests.in_flight == 1 and profiling.claim():
+                return await profiling.RequestProfile(request, reason).arun(self.get_response)
+            return await self.get_response(request)
+        finally:
+            profiling.async_requests.exit()
@@ -0,0 +1,411 @@
+"""Opt-in CPU and allocation profiles of single requests.
+
+With ``PROFILING`` on, ``ProfilingMiddleware`` profiles a request when
+
+- it carries ``X-Profile: 1`` and comes from a staff user, or
+- it is picked by ``PROFILING_SAMPLE_RATE`` (a fraction of all requests).
+
+A profile is a cProfile call tree (folded from the per-function stats the
+way pyinstrument shows it), the self time split into SQL, serializers,
+Decimal math, rendering and the rest, and the top tracemalloc allocations
+with the peak. The last ``PROFILING_KEEP`` profiles stay in a ring buffer
+in each process; staff fetch them at ``/api/profiles/`` and download the
+raw stats (``.prof``, for ``pstats`` or snakeviz) or a text report. The
+response of a profiled request carries its ``X-Profile-Id``.
+
+One request per process is profiled at a time; tracemalloc is global and
+slows every thread while it runs. cProfile only sees the thread it runs
+on: under ASGI the work async views hand to ``sync_to_async`` threads
+shows up as time spent awaiting.
+
+Under ASGI cProfile and tracemalloc stay on across every ``await``, so
+any other request's coroutines that run on the event loop meanwhile land
+in the profile and its allocation peak. An async request is therefore
+only profiled when no other async request is in flight in the process,
+and the profile's ``overlapping_requests`` counts those that started
+while it ran. If that count isn't 0, the profile covers the whole
+process, not only its own request.
+"""
+import cProfile
+import itertools
+import marshal
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .query_budget import endpoint_name
+from .traffic import authenticated_user
+
+HEADER = 'X-Profile'
+TOP_ALLOCATIONS = 25
+# Never profiled: the profiles themselves and Prometheus scrapes
+SKIPPED_PREFIXES = ('/api/profiles/', '/metrics')
+# (bucket, substrings of a profiled function's file or name), first match wins
+BUCKETS = (
+    ('sql', ('/django/db/', 'sqlite3', 'psycopg')),
+    ('serializers', ('/rest_framework/serializers.py', '/rest_framework/fields.py',
+                     '/rest_framework/relations.py', 'serializers.py')),
+    ('decimal', ('decimal',)),
+    ('rendering', ('/rest_framework/renderers.py', 'renderers.py', '/json/', 'orjson')),
+)
+
+_active = threading.Lock()
+
+
+class AsyncRequests:
+    """Async requests of this process: how many are in flight and how many ever started"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.started = 0
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.started += 1
+
+    def exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+async_requests = AsyncRequests()
+
+
+def _staff_token(request):
+    """Whether the request carries a valid access token with the staff claim.
+
+    The signature is checked (an HMAC, no query) before anything is
+    started, so a forged token can't turn profiling on; the profile is
+    still only kept once the view has authenticated a staff user.
+    """
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return False
+    try:
+        return bool(AccessToken(token).get('is_staff'))
+    except TokenError:
+        return False
+
+
+def trigger(request):
+    """'header', 'sample' or None: whether (and why) to profile ``request``"""
+    if not getattr(settings, 'PROFILING', False) or request.path.startswith(SKIPPED_PREFIXES):
+        return None
+    if request.headers.get(HEADER, '').lower() in ('1', 'true', 'yes') and _staff_token(request):
+        return 'header'
+    rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+    if rate and random.random() < rate:
+        return 'sample'
+    return None
+
+
+def bucket(function):
+    """Which part of the stack a pstats function key belongs to"""
+    filename, _, name = function
+    where = f'{filename} {name}'
+    for label, needles in BUCKETS:
+        if any(needle in where for needle in needles):
+            return label
+    return 'other'
+
+
+def breakdown(stats):
+    """{bucket: ms} of self time"""
+    totals = {label: 0.0 for label, _ in BUCKETS}
+    totals['other'] = 0.0
+    for function, (_, _, self_time, _, _) in stats.stats.items():
+        totals[bucket(function)] += self_time * 1000
+    return {label: round(ms, 3) for label, ms in totals.items()}
+
+
+def _describe(function):
+    filename, line, name = function
+    if filename == '~':
+        return name, '', 0
+    return name, filename, line
+
+
+def call_tree(stats, min_fraction=0.005, max_depth=40):
+    """Nested {'function', 'file', 'line', 'ms', 'calls', 'children'} from cProfile stats.
+
+    cProfile keeps time per caller/callee pair, not per call path, so deep
+    in the tree a function's time is split across its callers in
+    proportion. Branches under ``min_fraction`` of the total are dropped.
+    """
+    entries = stats.stats
+    callees = {}
+    for function, (_, _, _, _, callers) in entries.items():
+        for caller, (calls, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, []).append((function, calls, cumulative))
+    roots = [(function, value[1], value[3]) for function, value in entries.items() if not value[4]]
+    total = sum(cumulative for _, _, cumulative in roots) or 1e-9
+
+    def build(function, calls, cumulative, path):
+        name, filename, line = _describe(function)
+        node = {'function': name, 'file': filename, 'line': line, 'ms': round(cumulative * 1000, 3),
+                'calls': calls, 'children': []}
+        if len(path) < max_depth:
+            for child, child_calls, child_time in sorted(callees.get(function, ()), key=lambda edge: -edge[2]):
+                if child_time >= total * min_fraction and child not in path:
+                    node['children'].append(build(child, child_calls, child_time, path | {child}))
+        return node
+
+    return [
+        build(function, calls, cumulative, {function})
+        for function, calls, cumulative in sorted(roots, key=lambda root: -root[2])
+        if cumulative >= total * min_fraction
+    ]
+
+
+def render_tree(nodes, total_ms=None, depth=0):
+    """The call tree as indented text lines"""
+    if total_ms is None:
+        total_ms = sum(node['ms'] for node in nodes) or 1e-9
+    lines = []
+    for node in nodes:
+        where = f"  {node['file']}:{node['line']}" if node['file'] else ''
+        lines.append(
+            f"{node['ms']:>10.2f} ms {node['ms'] / total_ms:>6.1%}  {'  ' * depth}{node['function']}"
+            f" x{node['calls']}{where}"
+        )
+        lines += render_tree(node['children'], total_ms, depth + 1)
+    return lines
+
+
+def top_allocations(snapshot):
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ))
+    return [
+        {'file': stat.traceback[0].filename, 'line': stat.traceback[0].lineno,
+         'kb': round(stat.size / 1024, 2), 'count': stat.count}
+        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+    ]
+
+
+class ProfileStore:
+    """The last ``size`` profiles of this process"""
+
+    def __init__(self, size=50):
+        self._lock = threading.Lock()
+        self._profiles = deque(maxlen=size)
+        self._ids = itertools.count(1)
+
+    def add(self, record, raw_stats):
+        with self._lock:
+            record['id'] = next(self._ids)
+            self._profiles.append((record, raw_stats))
+        return record['id']
+
+    def list(self):
+        with self._lock:
+            return [record for record, _ in reversed(self._profiles)]
+
+    def get(self, profile_id):
+        with self._lock:
+            for record, raw_stats in self._profiles:
+                if record['id'] == profile_id:
+                    return record, raw_stats
+        return None, None
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+profiles = ProfileStore(getattr(settings, 'PROFILING_KEEP', 50))
+
+
+class RequestProfile:
+    """cProfile and tracemalloc around one request"""
+
+    def __init__(self, request, reason):
+        self.request = request
+        self.reason = reason
+        self.profiler = cProfile.Profile()
+        self.tracing_before = None
+        # async_requests.started when an async profile began
+        self.requests_before = None
+
+    def run(self, get_response):
+        response = None
+        try:
+            self.start()
+            response = _request(get_response, self.request)
+        finally:
+            self.stop(response)
+        return response
+
+    async def arun(self, get_response):
+        """Profile an async request; the caller has checked it is the only one in flight"""
+        response = None
+        try:
+            # Counted before start() so this request itself isn't an overlap
+            self.requests_before = async_requests.started
+            self.start()
+            response = await _arequest(get_response, self.request)
+        finally:
+            self.stop(response)
+        return response
+
+    def start(self):
+        if tracemalloc.is_tracing():
+            self.tracing_before = tracemalloc.take_snapshot()
+        else:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+        self.profiler.enable()
+
+    def stop(self, response):
+        try:
+            self.profiler.disable()
+            total_ms = (time.perf_counter() - self.started) * 1000
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if self.tracing_before is None:
+                tracemalloc.stop()
+        finally:
+            _active.release()
+
+        if response is None:
+            # The view raised; nothing to attach the profile to
+            return None
+        user = authenticated_user(self.request)
+        if self.reason == 'header' and not (user is not None and user.is_staff):
+            return None
+
+        if self.tracing_before is not None:
+            allocations = [
+                {'file': stat.traceback[0].filename, 'line': stat.traceback[0].lineno,
+                 'kb': round(stat.size_diff / 1024, 2), 'count': stat.count_diff}
+                for stat in snapshot.compare_to(self.tracing_before, 'lineno')[:TOP_ALLOCATIONS]
+            ]
+        else:
+            allocations = top_allocations(snapshot)
+
+        stats = pstats.Stats(self.profiler)
+        query_stats = getattr(self.request, 'query_stats', None)
+        record = {
+            'created': timezone.now().isoformat(),
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'view': endpoint_name(self.request),
+            'status': response.status_code,
+            'user_id': user.pk if user is not None else None,
+            'reason': self.reason,
+            'total_ms': round(total_ms, 3),
+            'db_ms': round(query_stats.db_ms, 3) if query_stats is not None else None,
+            'queries': query_stats.count if query_stats is not None else None,
+            'breakdown': breakdown(stats),
+            'peak_kb': round(peak / 1024, 2),
+            # Async requests that shared the event loop with this one (see the module docstring)
+            'overlapping_requests': (
+                async_requests.started - self.requests_before if self.requests_before is not None else 0
+            ),
+            'allocations': allocations,
+            'tree': call_tree(stats),
+        }
+        profile_id = profiles.add(record, marshal.dumps(stats.stats))
+        response.headers['X-Profile-Id'] = str(profile_id)
+        return profile_id
+
+
+def claim():
+    """Whether this request may be profiled: one at a time per process.
+
+    Every ``claim()`` that returns True must be followed by a
+    ``RequestProfile(...).run()`` or ``arun()``, which gives it back.
+    """
+    return _active.acquire(blocking=False)
+
+
+def _request(get_response, request):
+    # The root of every call tree: the frames that called enable() aren't in it
+    return get_response(request)
+
+
+async def _arequest(get_response, request):
+    return await get_response(request)
+
+
+def summary(record):
+    return {key: value for key, value in record.items() if key not in ('tree', 'allocations')}
+
+
+def report(record):
+    """Plain-text report of a profile"""
+    lines = [
+        f"{record['method']} {record['path']} ({record['view']}) -> {record['status']}, "
+        f"{record['total_ms']:.1f} ms, {record['queries']} queries / {record['db_ms']} ms SQL, "
+        f"peak {record['peak_kb']:.0f} KiB ({record['reason']}, {record['created']})",
+    ]
+    if record['overlapping_requests']:
+        lines.append(
+            f"Includes the event-loop work of {record['overlapping_requests']} other request(s) "
+            "that ran meanwhile: a process-wide profile"
+        )
+    lines += ['', 'Self time by part of the stack:']
+    lines += [f"  {label:<12} {ms:>10.2f} ms" for label, ms in record['breakdown'].items()]
+    lines += ['', 'Call tree:'] + render_tree(record['tree'])
+    lines += ['', 'Top allocations:']
+    lines += [
+        f"  {row['kb']:>10.1f} KiB {row['count']:>7} blocks  {row['file']}:{row['line']}"
+        for row in record['allocations']
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+class ProfileListView(APIView):
+    """The profiles kept by the process that answers"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response([summary(record) for record in profiles.list()], status=status.HTTP_200_OK)
+
+
+class ProfileDetailView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id):
+        record, _ = profiles.get(profile_id)
+        if record is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(record, status=status.HTTP_200_OK)
+
+
+class ProfileDownloadView(APIView):
+    """``?file_format=prof`` (default, for pstats/snakeviz) or ``txt``"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, profile_id):
+        record, raw_stats = profiles.get(profile_id)
+        if record is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        file_format = request.query_params.get('file_format', 'prof').lower()
+        if file_format == 'prof':
+            response = HttpResponse(raw_stats, content_type='application/octet-stream')
+        elif file_format == 'txt':
+            response = HttpResponse(report(record), content_type='text/plain; charset=utf-8')
+        else:
+            return Response({'error': "Unsupported format. Use prof or txt"}, status=status.HTTP_400_BAD_REQUEST)
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile_id}.{file_format}"'
+        return response
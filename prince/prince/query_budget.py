@@ -0,0 +1,235 @@
+"""Per-request SQL query accounting and budgets.
+
+``QueryBudgetMiddleware`` records every query a request runs (on every
+database alias): how many, the total SQL time, and how many of them repeat
+an earlier query of the same request. A repeated query is usually an N+1
+loop in a serializer. The numbers go into the ``Server-Timing`` header,
+optionally into a JSON-lines log (``QUERY_BUDGET_LOG``) that the
+``query_report`` command summarises, and are checked against the view's
+query budget.
+
+Budgets come from ``QUERY_BUDGETS`` (``{url name: max queries}``), then a
+``query_budget`` attribute on the view class, then
+``QUERY_BUDGET_DEFAULT``. What happens when a request goes over is set by
+``QUERY_BUDGET_ACTION``: ``'log'`` a warning, ``'warn'`` with a
+``QueryBudgetWarning`` (tests can turn it into an error with ``-W error``)
+or ``'raise'`` ``QueryBudgetExceeded``, which fails the request in tests.
+"""
+import json
+import logging
+import re
+import threading
+import time
+import warnings
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# IN (%s, %s, %s) -> IN (...), so lookups of different sizes share a fingerprint
+_IN_LIST = re.compile(r'\bIN \((?:%s, )*%s\)')
+_SPACE = re.compile(r'\s+')
+
+
+class QueryBudgetWarning(UserWarning):
+    pass
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """Queries that differ only in their parameters share a fingerprint"""
+    return _IN_LIST.sub('IN (...)', _SPACE.sub(' ', sql)).strip()
+
+
+# The QueryStats of the request being served. Connections are per thread and
+# under ASGI a request's queries run on sync_to_async threads, so rather than
+# wrapping one thread's connections per request, every connection forwards to
+# whatever the current context is recording.
+_current_stats = ContextVar('query_stats', default=None)
+
+
+def _dispatch(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def install(connection):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+@receiver(connection_created)
+def _install_on_connect(sender, connection, **kwargs):
+    install(connection)
+
+
+class QueryStats:
+    """Execute wrapper that tallies the queries run while it is recording"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            # Fingerprinting waits until the end, once per distinct statement
+            self.statements[sql] += 1
+
+    @contextmanager
+    def record(self):
+        """Tally the queries run in this context (threads started with sync_to_async included)"""
+        for alias in connections:
+            install(connections[alias])
+        token = _current_stats.set(self)
+        try:
+            yield self
+        finally:
+            _current_stats.reset(token)
+
+    @property
+    def db_ms(self):
+        return self.seconds * 1000
+
+    def duplicates(self):
+        """{fingerprint: times run} for the fingerprints run more than once"""
+        counts = Counter()
+        for sql, times in self.statements.items():
+            counts[fingerprint(sql)] += times
+        return {sql: times for sql, times in counts.items() if times > 1}
+
+    def duplicate_count(self, duplicates=None):
+        """Queries that repeat an earlier one"""
+        duplicates = self.duplicates() if duplicates is None else duplicates
+        return sum(times - 1 for times in duplicates.values())
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else None
+
+
+def view_budget(request):
+    """Max queries for the view that handled ``request``, or None for no limit"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if match.view_name in budgets:
+        return budgets[match.view_name]
+    view_class = getattr(match.func, 'view_class', None) or getattr(match.func, 'cls', None)
+    budget = getattr(view_class, 'query_budget', None)
+    return budget if budget is not None else getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+
+
+def server_timing(stats, total_ms, duplicates):
+    return (
+        f'db;dur={stats.db_ms:.1f};desc="{stats.count} queries", '
+        f'dupq;desc="{duplicates} duplicate queries", '
+        f'total;dur={total_ms:.1f}'
+    )
+
+
+def enforce_budget(request, stats, budget, duplicates):
+    if budget is None or stats.count <= budget:
+        return
+    worst = max(duplicates.items(), key=lambda item: item[1]) if duplicates else None
+    message = (
+        f"{request.method} {request.path} ({endpoint_name(request)}) ran {stats.count} queries, "
+        f"budget {budget}"
+        + (f"; repeated {worst[1]}x: {worst[0][:200]}" if worst else "")
+    )
+    action = getattr(settings, 'QUERY_BUDGET_ACTION', 'log')
+    if action == 'raise':
+        raise QueryBudgetExceeded(message)
+    if action == 'warn':
+        warnings.warn(message, QueryBudgetWarning)
+    else:
+        logger.warning(message)
+
+
+class TrafficLog:
+    """Appends one JSON line per request to the file named by ``setting`` (when set)"""
+
+    def __init__(self, setting='QUERY_BUDGET_LOG'):
+        self.setting = setting
+        self._lock = threading.Lock()
+        self._path = None
+        self._file = None
+
+    @property
+    def enabled(self):
+        return bool(getattr(settings, self.setting, ''))
+
+    def write(self, entry):
+        path = getattr(settings, self.setting, '')
+        if not path:
+            return
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._path != path:
+                if self._file is not None:
+                    self._file.close()
+                # Line-buffered appends, so several processes can share the file
+                self._file = open(path, 'a', buffering=1)
+                self._path = path
+            self._file.write(line)
+
+
+traffic_log = TrafficLog()
+
+
+def read_log(path):
+    """The logged requests, skipping lines torn by concurrent appends"""
+    entries = []
+    with open(path) as log:
+        for line in log:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def finish_request(request, response, stats, started):
+    """Headers, log entry and budget check once the response is ready"""
+    total_ms = (time.perf_counter() - started) * 1000
+    duplicates = stats.duplicates() if stats.count else {}
+    duplicate_count = stats.duplicate_count(duplicates)
+    budget = view_budget(request)
+
+    if getattr(settings, 'QUERY_BUDGET_HEADERS', True):
+        timing = server_timing(stats, total_ms, duplicate_count)
+        existing = response.get('Server-Timing')
+        response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+
+    traffic_log.write({
+        'ts': round(time.time(), 3),
+        'method': request.method,
+        'endpoint': endpoint_name(request) or request.path,
+        'status': response.status_code,
+        'queries': stats.count,
+        'db_ms': round(stats.db_ms, 2),
+        'duplicates': duplicate_count,
+        'total_ms': round(total_ms, 2),
+        'budget': budget,
+        'worst_duplicate': max(duplicates, key=duplicates.get)[:300] if duplicates else None,
+    })
+    enforce_budget(request, stats, budget, duplicates)
+    return response
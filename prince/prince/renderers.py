@@ -0,0 +1,61 @@
+"""JSON renderer backed by orjson, with a stdlib fallback.
+
+orjson is optional: when it isn't installed ``FastJSONRenderer`` behaves
+exactly like DRF's ``JSONRenderer``. Values orjson can't encode natively go
+through ``default()``, which mirrors DRF's encoder so output is the same
+either way.
+"""
+from django.db.models.fields.files import FieldFile
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class JSONEncoder(encoders.JSONEncoder):
+    """DRF's encoder, plus file/image fields rendered as their URL"""
+
+    def default(self, obj):
+        if isinstance(obj, FieldFile):
+            return obj.url if obj else None
+        return super().default(obj)
+
+
+_encoder = JSONEncoder()
+
+
+def default(obj):
+    """orjson fallback for Decimal, datetimes, files and lazy strings"""
+    return _encoder.default(obj)
+
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+else:
+    ORJSON_OPTIONS = 0
+
+
+class FastJSONRenderer(JSONRenderer):
+    encoder_class = JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Pretty printing (browsable API, `; indent=`) is rare, leave it to json
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which json handles
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same strict javascript subset escaping as JSONRenderer
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,122 @@
+"""Read-replica routing.
+
+Views that only read (the catalog and order history) set
+``read_from_replica = True``. ``ReplicaRoutingMiddleware`` turns replica
+reads on for GET/HEAD requests to those views, and ``ReplicaRouter`` then
+sends their queries to the ``replica`` alias. Everything else, including
+every write and the cart, stays on ``default``. Accounts and sessions are
+always read from ``default`` too, so a new user can log in straight away.
+
+A user who has just written is pinned to the primary for
+``REPLICA_STICKY_SECONDS``, so an order they just placed shows up in their
+history even before the replica catches up. The pin is kept in Django's
+cache. This project doesn't set CACHES, so that is the per-process
+LocMemCache: with more than one worker process, point CACHES at a shared
+backend (Redis, Memcached) before turning the replica on, or a request
+served by another worker won't see the pin and may read stale data.
+"""
+import base64
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+REPLICA_ALIAS = 'replica'
+
+# Authentication must never see a lagging copy
+PRIMARY_ONLY_APPS = {'auth', 'sessions', 'contenttypes'}
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in connections.settings
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Route reads in the block to the replica (if one is configured)"""
+    token = _replica_reads.set(enabled and replica_configured())
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def primary_reads():
+    """Route reads in the block to the primary, e.g. for caches that must not lag"""
+    return replica_reads(False)
+
+
+def set_request_replica_reads(enabled):
+    """Turn replica reads on or off for the rest of the current request.
+
+    For ReplicaRoutingMiddleware: under ASGI its hooks run in different
+    contexts, so a ``replica_reads()`` block can't span them.
+    """
+    _replica_reads.set(enabled and replica_configured())
+
+
+def token_claims(token):
+    """The claims of a JWT, read without verifying the signature ({} if unreadable)"""
+    payload = token.split('.')[1] if token.count('.') == 2 else ''
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except ValueError:
+        return {}
+    return claims if isinstance(claims, dict) else {}
+
+
+def token_user_id(token):
+    """The ``user_id`` claim of a JWT, read without verifying the signature"""
+    return token_claims(token).get('user_id')
+
+
+def request_user_id(request):
+    """User id for stickiness, without a database query.
+
+    DRF authenticates inside the view, after routing is decided, so the
+    JWT payload is read unverified here. That's safe because it only picks
+    which copy of the data a request reads; DRF still authenticates it.
+    """
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() == 'bearer' and token.count('.') == 2:
+        return token_user_id(token)
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return None
+
+
+def _sticky_key(user_id):
+    return f'replica:sticky:{user_id}'
+
+
+def pin_to_primary(user_id):
+    cache.set(_sticky_key(user_id), True, getattr(settings, 'REPLICA_STICKY_SECONDS', 5))
+
+
+def is_pinned_to_primary(user_id):
+    return user_id is not None and cache.get(_sticky_key(user_id), False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary (see sync_replica)
+        return db == 'default'
@@ -14,6 +14,8 @@ from pathlib import Path
 from decouple import config
 import os
 
+from .database import database_from_url, default_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -40,16 +42,25 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'products',
     'account',
-    'orders'
+    'orders',
+    'reports',
+    # Project-level management commands (prince/management/commands)
+    'prince',
 ]
 
 MIDDLEWARE = [
+    'prince.middleware.MetricsMiddleware',
+    'prince.middleware.TrafficCaptureMiddleware',
+    'prince.middleware.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'prince.middleware.QueryBudgetMiddleware',
+    'prince.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'prince.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,31 +88,131 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'prince.wsgi.application'
 
+# Serve cart, order and product list endpoints with async views. Turn on when
+# running under an ASGI server, e.g. `uvicorn prince.asgi:application`
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': config('DB_NAME', default=''),
-#         'USER': config('DB_USER', default=''),
-#         'PASSWORD': config('DB_PASSWORD', default=''),
-#         'HOST': config('DB_HOST', default='localhost'),
-#         'PORT': config('DB_PORT', default='5432'),
-#     }
-# }
-
+# DATABASE_URL picks SQLite or PostgreSQL; tuning lives in prince/database.py.
+# DB_CONN_MAX_AGE is ignored (always 0) under ASGI or with ASYNC_VIEWS on
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': default_database(BASE_DIR / 'db.sqlite3'),
 }
 
+# Optional read replica for catalog and order history reads (prince.routers)
+REPLICA_DATABASE_URL = config('REPLICA_DATABASE_URL', default='')
+if REPLICA_DATABASE_URL:
+    DATABASES['replica'] = database_from_url(REPLICA_DATABASE_URL)
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS = ['prince.routers.ReplicaRouter']
+
+# Seconds a user reads from the primary after a write, so they see their own changes.
+# The pin lives in the cache: with several workers CACHES must be shared (not LocMem)
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+# Retries of orders.transactions.write_transaction when the database is locked
+WRITE_RETRY_ATTEMPTS = config('WRITE_RETRY_ATTEMPTS', default=5, cast=int)
+WRITE_RETRY_BASE_DELAY = config('WRITE_RETRY_BASE_DELAY', default=0.01, cast=float)
+WRITE_RETRY_MAX_DELAY = config('WRITE_RETRY_MAX_DELAY', default=0.5, cast=float)
+
+# Per-request query accounting (prince.query_budget): Server-Timing headers, an
+# optional JSON-lines traffic log for `manage.py query_report`, and budgets
+QUERY_BUDGET_HEADERS = config('QUERY_BUDGET_HEADERS', default=True, cast=bool)
+QUERY_BUDGET_LOG = config('QUERY_BUDGET_LOG', default='')
+QUERY_BUDGET_ACTION = config('QUERY_BUDGET_ACTION', default='log')  # 'log', 'warn' or 'raise'
+QUERY_BUDGET_DEFAULT = config('QUERY_BUDGET_DEFAULT', default=None, cast=lambda value: int(value) if value else None)
+# {url name: max queries}, overriding the views' query_budget attributes
+QUERY_BUDGETS = {}
+
+# Sanitized request traces for `manage.py replay_traffic` (prince.traffic), off
+# unless set to a file; several processes can append to the same one
+TRAFFIC_CAPTURE = config('TRAFFIC_CAPTURE', default='')
+
+# Per-request cProfile/tracemalloc profiles (prince.profiling), off by default.
+# When on, staff requests sent with "X-Profile: 1" are profiled, plus this
+# fraction of all requests; the last PROFILING_KEEP per process are at /api/profiles/
+PROFILING = config('PROFILING', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_KEEP = config('PROFILING_KEEP', default=50, cast=int)
+
+# Prometheus metrics at /metrics (prince.metrics). With several worker processes
+# set METRICS_DIR to a directory they share, emptied when the server starts
+METRICS_DIR = config('METRICS_DIR', default='')
+# Scrapes must send "Authorization: Bearer <token>"; unset, /metrics is only served with DEBUG on
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# ESC/POS network printers for order bills
+KITCHEN_PRINTER_IP = config('KITCHEN_PRINTER_IP', default='192.168.0.101')
+COUNTER_PRINTER_IP = config('COUNTER_PRINTER_IP', default='192.168.0.100')
+PRINTER_PORT = config('PRINTER_PORT', default=9100, cast=int)
+PRINTER_TIMEOUT = config('PRINTER_TIMEOUT', default=60, cast=float)
+
+# Response compression (prince.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+# No text/html: pages like the admin's carry CSRF tokens next to reflected
+# input, which compression would leak through the response size (BREACH)
+COMPRESSION_CONTENT_TYPES = [
+    'application/json',
+    'application/x-ndjson',
+    'text/csv',
+    'text/plain',
+]
+# GET responses under these paths keep their compressed bytes cached
+COMPRESSION_CACHE_PREFIXES = ['/api/products/', '/api/categories/', '/api/extras/']
+COMPRESSION_CACHE_SIZE = config('COMPRESSION_CACHE_SIZE', default=32, cast=int)
+
+# Sales reports (reports.views): day and hour reports cover the last DEFAULT_DAYS
+# days unless given a range, and at most MAX_DAYS; no report returns more than MAX_ROWS rows
+SALES_REPORT_DEFAULT_DAYS = config('SALES_REPORT_DEFAULT_DAYS', default=7, cast=int)
+SALES_REPORT_MAX_DAYS = config('SALES_REPORT_MAX_DAYS', default=92, cast=int)
+SALES_REPORT_MAX_ROWS = config('SALES_REPORT_MAX_ROWS', default=1000, cast=int)
+
+# Per-process catalog price cache (products.price_cache)
+CATALOG_CACHE_MAX_PRODUCTS = config('CATALOG_CACHE_MAX_PRODUCTS', default=5000, cast=int)
+CATALOG_CACHE_MAX_EXTRAS = config('CATALOG_CACHE_MAX_EXTRAS', default=20000, cast=int)
+# Seconds between checks for catalog changes made by other processes
+CATALOG_CACHE_CHECK_INTERVAL = config('CATALOG_CACHE_CHECK_INTERVAL', default=5.0, cast=float)
+
+# PIN hashing cost: strict (Django default), balanced or fast. Stored PINs
+# are rehashed on the next login after this changes (account.hashers)
+PIN_HASHER_POLICY = config('PIN_HASHER_POLICY', default='strict')
+
+PASSWORD_HASHERS = [
+    'account.hashers.PinPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Failed PIN logins per phone before LoginView answers 429 (account.throttling)
+LOGIN_MAX_FAILURES = config('LOGIN_MAX_FAILURES', default=5, cast=int)
+LOGIN_LOCKOUT_SECONDS = config('LOGIN_LOCKOUT_SECONDS', default=300, cast=int)
+LOGIN_LIMITER_MAX_PHONES = config('LOGIN_LIMITER_MAX_PHONES', default=10000, cast=int)
+
+# Processes used to hash PINs during bulk provisioning (0 = one per CPU)
+ACCOUNT_PROVISION_WORKERS = config('ACCOUNT_PROVISION_WORKERS', default=0, cast=int)
+
+# Seconds account.authentication trusts a cached user active/staff state
+AUTH_USER_STATE_TTL = config('AUTH_USER_STATE_TTL', default=30, cast=int)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Builds request.user from the token claims instead of a query
+        'account.authentication.StatelessJWTAuthentication',
+    ),
+    # orjson-backed when installed, same output as the stock JSON classes
+    'DEFAULT_RENDERER_CLASSES': (
+        'prince.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'prince.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
 }
 
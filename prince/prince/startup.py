@@ -0,0 +1,49 @@
+"""Time to first request of a fresh worker, used by the ``bench_startup`` command.
+
+``python -m prince.startup wsgi|asgi PATH`` boots the application the way
+a server worker does, by importing ``prince.wsgi`` or ``prince.asgi``,
+answers one GET of PATH in process and prints a JSON line with
+``time.monotonic()`` stamps of when the app was ready and when the
+response was. The command notes the time before spawning it, so the
+interpreter's own startup is counted too.
+"""
+import json
+import sys
+import time
+
+
+def import_times(report):
+    """{module: (self µs, cumulative µs)} from the stderr of ``python -X importtime``"""
+    times = {}
+    for line in report.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        try:
+            times[module.strip()] = (int(self_us), int(cumulative_us))
+        except ValueError:
+            # The header line
+            continue
+    return times
+
+
+def main(mode, path):
+    if mode == 'wsgi':
+        from prince.wsgi import application
+        from prince.loadtest import InProcessTransport
+
+        ready = time.monotonic()
+        status, _ = InProcessTransport(application)('GET', path)
+    else:
+        import asyncio
+
+        from prince.asgi import application
+        from prince.loadtest import asgi_request
+
+        ready = time.monotonic()
+        status = asyncio.run(asgi_request(application, 'GET', path))
+    print(json.dumps({'ready': ready, 'responded': time.monotonic(), 'status': status}))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:3])
@@ -0,0 +1,260 @@
+"""Synthetic catalogs and order histories at production scale.
+
+Used by the ``generate_data`` command. Everything is drawn from one
+``random.Random(seed)``, so the same options give the same data (and the
+same ids on an empty database). The shapes follow a busy restaurant till:
+
+- product popularity is Zipf-like: a few dishes take most of the orders,
+  and the most ordered ones are flagged ``is_popular``
+- categories differ in size, prices are log-normal around a typical dish
+- most orders have 1-3 lines, mostly of quantity 1; a share of the lines
+  (``extras_rate``) carry one or two of the product's extras
+- orders cluster around lunch and dinner, with busier weekends
+
+Rows are written with ``bulk_create`` in chunks of ``batch_size``, one
+transaction per chunk, so millions of orders never sit in memory at once.
+"""
+import math
+import random
+from datetime import datetime, time as day_time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+CATEGORY_NAMES = [
+    'Biryani', 'Shawarma', 'Burgers', 'Pizza', 'Fried Rice', 'Noodles', 'Mandi', 'Grills', 'Starters',
+    'Soups', 'Salads', 'Sandwiches', 'Rolls', 'Curries', 'Breads', 'Seafood', 'Juices', 'Shakes',
+    'Mojitos', 'Desserts', 'Ice Creams', 'Tea & Coffee', 'Combos', 'Kids Menu', 'Breakfast',
+]
+DISH_WORDS = [
+    'Chicken', 'Beef', 'Mutton', 'Fish', 'Prawn', 'Paneer', 'Veg', 'Egg', 'Mushroom', 'Special',
+    'Spicy', 'Malabar', 'Arabian', 'Peri Peri', 'Garlic', 'Pepper', 'Butter', 'Classic', 'Royal', 'Mini',
+]
+EXTRA_NAMES = [
+    'Extra Cheese', 'Mayonnaise', 'Extra Chicken', 'Fried Egg', 'Raita', 'Garlic Sauce', 'French Fries',
+    'Pickle', 'Extra Gravy', 'Soft Drink', 'Ice Cream Scoop', 'Jalapenos',
+]
+NOTES = ['Less spicy', 'No onion', 'Extra spicy', 'Pack separately', 'No mayo']
+
+# Lines per order and quantity per line, as (value, weight)
+LINES_PER_ORDER = [(1, 30), (2, 30), (3, 20), (4, 10), (5, 5), (6, 3), (8, 2)]
+QUANTITIES = [(1, 70), (2, 20), (3, 7), (4, 3)]
+ORDER_TYPES = [('table', 40), ('parcel', 35), ('delivery', 25)]
+# Orders per hour of the day: open 07:00-23:59, peaks at lunch and dinner
+HOURLY = [0, 0, 0, 0, 0, 0, 0, 2, 4, 4, 3, 4, 9, 12, 10, 5, 4, 5, 7, 10, 12, 10, 6, 3]
+# Monday .. Sunday
+WEEKDAYS = [0.9, 0.85, 0.9, 0.95, 1.1, 1.3, 1.25]
+
+
+def _cumulative(weights):
+    """Running totals, for ``random.choices(cum_weights=...)``"""
+    cum_weights = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cum_weights.append(total)
+    return cum_weights
+
+
+def _weighted(pairs):
+    return [value for value, _ in pairs], _cumulative(weight for _, weight in pairs)
+
+
+def _price(rng, median, step=Decimal('5')):
+    """Log-normal price rounded to ``step`` rupees"""
+    value = Decimal(str(rng.lognormvariate(math.log(median), 0.45)))
+    return max(step, (value / step).quantize(Decimal('1')) * step)
+
+
+def _batches(total, batch_size):
+    start = 0
+    while start < total:
+        yield start, min(batch_size, total - start)
+        start += batch_size
+
+
+class Generator:
+    def __init__(self, seed=0, batch_size=5000, zipf=1.1, extras_rate=0.3, log=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.zipf = zipf
+        self.extras_rate = extras_rate
+        self.log = log or (lambda message: None)
+
+    def catalog(self, categories=25, products=2000, max_extras=4):
+        """Create the categories, products and extras; returns the products"""
+        from products.models import Category, Extra, Product
+        from products.price_cache import bump_catalog_version
+
+        rng = self.rng
+        names = [
+            CATEGORY_NAMES[i % len(CATEGORY_NAMES)] + (f' {i // len(CATEGORY_NAMES) + 1}' if i >= len(CATEGORY_NAMES) else '')
+            for i in range(categories)
+        ]
+        with transaction.atomic():
+            created_categories = Category.objects.bulk_create(
+                [Category(name=name) for name in names], batch_size=self.batch_size
+            )
+        # Some categories are much bigger than others
+        category_cum = _cumulative([rng.paretovariate(1.5) for _ in created_categories])
+        category_medians = {category.pk: rng.choice([60, 90, 120, 160, 220, 300]) for category in created_categories}
+
+        # Popularity rank by position: product i is the (rank[i])th most ordered
+        ranks = list(range(1, products + 1))
+        rng.shuffle(ranks)
+        popular_cutoff = max(1, products // 20)
+
+        created_products = []
+        for start, count in _batches(products, self.batch_size):
+            batch = []
+            for i in range(start, start + count):
+                category = rng.choices(created_categories, cum_weights=category_cum)[0]
+                name = f'{rng.choice(DISH_WORDS)} {category.name} {i + 1:05d}'
+                batch.append(Product(
+                    category=category,
+                    name=name,
+                    price=_price(rng, category_medians[category.pk]),
+                    is_popular=ranks[i] <= popular_cutoff,
+                ))
+            with transaction.atomic():
+                created_products += Product.objects.bulk_create(batch)
+            self.log(f"products {start + count}/{products}")
+
+        extras = []
+        for product in created_products:
+            # A third of the dishes have no extras
+            for name in rng.sample(EXTRA_NAMES, rng.choice([0, 0, 1, 2, 3, max_extras])):
+                extras.append(Extra(product=product, name=name, price=_price(rng, 25)))
+        for start, count in _batches(len(extras), self.batch_size):
+            with transaction.atomic():
+                Extra.objects.bulk_create(extras[start:start + count])
+        self.log(f"extras {len(extras)}")
+
+        bump_catalog_version()
+        self.popularity = {product.pk: ranks[i] for i, product in enumerate(created_products)}
+        return created_products
+
+    def cashiers(self, count, pin='1234', phone_prefix='8000'):
+        """Cashier accounts (PIN login) for the orders; existing ones are reused"""
+        from django.contrib.auth.hashers import make_password
+        from django.contrib.auth.models import User
+        from account.models import UserProfiles
+
+        phones = [f'{phone_prefix}{i:06d}' for i in range(count)]
+        existing = set(User.objects.filter(username__in=phones).values_list('username', flat=True))
+        # One hash for every account: hashing a PIN per user would dominate the run
+        password = make_password(pin)
+        new = [User(username=phone, first_name=f'Cashier {i}', password=password)
+               for i, phone in enumerate(phones) if phone not in existing]
+        with transaction.atomic():
+            users = User.objects.bulk_create(new, batch_size=self.batch_size)
+            UserProfiles.objects.bulk_create(
+                [UserProfiles(user=user, phone=user.username) for user in users], batch_size=self.batch_size
+            )
+        return list(User.objects.filter(username__in=phones).order_by('id'))
+
+    def order_times(self, orders, days, end):
+        """``orders`` timestamps over the ``days`` days before midnight ``end``, in time order"""
+        rng = self.rng
+        first_day = end - timedelta(days=days)
+        day_weights = [WEEKDAYS[(first_day + timedelta(days=d)).weekday()] for d in range(days)]
+        total_weight = sum(day_weights)
+        hour_cum = _cumulative(HOURLY)
+        hours = list(range(24))
+
+        remaining = orders
+        for d, weight in enumerate(day_weights):
+            count = remaining if d == days - 1 else min(remaining, round(orders * weight / total_weight))
+            remaining -= count
+            day = first_day + timedelta(days=d)
+            offsets = sorted(
+                h * 3600 + rng.randrange(3600)
+                for h in rng.choices(hours, cum_weights=hour_cum, k=count)
+            )
+            for offset in offsets:
+                yield day + timedelta(seconds=offset)
+
+    def orders(self, orders, users, products, days=90, end=None):
+        """Create an order history; returns the number of orders, lines and extras written"""
+        from orders.models import Order, OrderItem, OrderItemExtra
+        from orders.pricing import line_total
+        from products.models import Extra
+
+        rng = self.rng
+        end = end or timezone.localdate()
+        # The history runs up to the end of the ``end`` day
+        end = timezone.make_aware(datetime.combine(end + timedelta(days=1), day_time.min))
+
+        popularity = getattr(self, 'popularity', None) or {}
+        products = sorted(products, key=lambda product: product.pk)
+        if not popularity:
+            # An existing catalog: rank by position, the flagged popular dishes first
+            ordered = sorted(products, key=lambda product: (not product.is_popular, product.pk))
+            popularity = {product.pk: rank for rank, product in enumerate(ordered, 1)}
+        product_cum = _cumulative([1 / popularity[product.pk] ** self.zipf for product in products])
+
+        extras_by_product = {}
+        for extra in Extra.objects.filter(product__in=products).order_by('id'):
+            extras_by_product.setdefault(extra.product_id, []).append(extra)
+
+        line_values, line_cum = _weighted(LINES_PER_ORDER)
+        quantity_values, quantity_cum = _weighted(QUANTITIES)
+        type_values, type_cum = _weighted(ORDER_TYPES)
+        # Each cashier's share of the orders
+        user_cum = _cumulative([rng.uniform(0.5, 1.5) for _ in users])
+
+        times = self.order_times(orders, days, end)
+        written = {'orders': 0, 'items': 0, 'extras': 0}
+        for start, count in _batches(orders, self.batch_size):
+            batch = []
+            for ordered_at in (next(times) for _ in range(count)):
+                lines = []
+                for product in rng.choices(products, cum_weights=product_cum, k=rng.choices(line_values, cum_weights=line_cum)[0]):
+                    quantity = rng.choices(quantity_values, cum_weights=quantity_cum)[0]
+                    available = extras_by_product.get(product.pk)
+                    extras = []
+                    if available and rng.random() < self.extras_rate:
+                        extras = [(extra, 1) for extra in rng.sample(available, min(len(available), rng.choice([1, 1, 2])))]
+                    note = rng.choice(NOTES) if rng.random() < 0.05 else None
+                    lines.append((product, quantity, note, extras))
+                order_type = rng.choices(type_values, cum_weights=type_cum)[0]
+                batch.append((ordered_at, order_type, rng.choices(users, cum_weights=user_cum)[0], lines))
+
+            with transaction.atomic():
+                created = Order.objects.bulk_create([
+                    Order(
+                        user=user,
+                        order_type=order_type,
+                        table_number=str(rng.randint(1, 20)) if order_type == 'table' else None,
+                        ordered_at=ordered_at,
+                        total_amount=sum(
+                            line_total(product.price, quantity, sum(line_total(extra.price, qty) for extra, qty in extras))
+                            for product, quantity, note, extras in lines
+                        ),
+                    )
+                    for ordered_at, order_type, user, lines in batch
+                ])
+                items = []
+                item_extras = []
+                for order, (_, _, _, lines) in zip(created, batch):
+                    for product, quantity, note, extras in lines:
+                        extra_totals = [line_total(extra.price, qty) for extra, qty in extras]
+                        items.append(OrderItem(
+                            order=order, item=product, quantity=quantity, note=note,
+                            total_amount=line_total(product.price, quantity, sum(extra_totals)),
+                        ))
+                        item_extras.append(extras)
+                items = OrderItem.objects.bulk_create(items)
+                extra_rows = [
+                    OrderItemExtra(order_item=item, extra=extra, quantity=qty, total_amount=line_total(extra.price, qty))
+                    for item, extras in zip(items, item_extras)
+                    for extra, qty in extras
+                ]
+                OrderItemExtra.objects.bulk_create(extra_rows)
+
+            written['orders'] += len(created)
+            written['items'] += len(items)
+            written['extras'] += len(extra_rows)
+            self.log(f"orders {written['orders']}/{orders}")
+        return written
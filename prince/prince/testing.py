@@ -0,0 +1,163 @@
+"""Query-count regression tests for the API.
+
+``QueryCountMixin.assertFlatQueries`` calls an endpoint against a small and
+a large fixture and fails when the number of SQL queries differs: a query
+run once per row (an N+1) makes the count grow with the fixture. Each test
+class prints a table of the queries and wall time per endpoint when it
+finishes, so a change in either shows up in the test output.
+"""
+import logging
+import sys
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from prince.query_budget import fingerprint
+
+PIN = '1234'
+SMALL = 2
+LARGE = 20
+
+
+def make_user(phone, staff=False):
+    from account.models import UserProfiles
+
+    user = User.objects.create_user(username=phone, password=PIN, first_name=f'Cashier {phone}', is_staff=staff)
+    UserProfiles.objects.create(user=user, phone=phone)
+    return user
+
+
+def auth_client(user):
+    from account.views import get_tokens_for_user
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {get_tokens_for_user(user)['access']}")
+    return client
+
+
+def make_catalog(products, extras_per_product=1, name='Menu'):
+    """A new category with ``products`` products; returns (category, products)"""
+    from products.models import Category, Extra, Product
+    from products.price_cache import bump_catalog_version
+
+    category = Category.objects.create(name=f'{name} {Category.objects.count() + 1}')
+    created = Product.objects.bulk_create([
+        Product(category=category, name=f'{category.name} Dish {i:03d}', price=Decimal(50 + i))
+        for i in range(products)
+    ])
+    Extra.objects.bulk_create([
+        Extra(product=product, name=f'Extra {j}', price=Decimal(10 + j))
+        for product in created
+        for j in range(extras_per_product)
+    ])
+    bump_catalog_version()
+    return category, created
+
+
+def fill_cart(user, products):
+    """Put each product (with its first extra) in the user's cart; returns the cart"""
+    from orders.models import Cart, CartItem, CartItemExtra
+    from products.models import Extra
+
+    cart, _ = Cart.objects.get_or_create(user=user, defaults={'order_type': 'delivery', 'total_amount': 0})
+    items = CartItem.objects.bulk_create([CartItem(cart=cart, item=product, quantity=1) for product in products])
+    first_extras = {}
+    for extra in Extra.objects.filter(product__in=products).order_by('id'):
+        first_extras.setdefault(extra.product_id, extra)
+    CartItemExtra.objects.bulk_create([
+        CartItemExtra(cart_item=item, extra=first_extras[item.item_id])
+        for item in items
+        if item.item_id in first_extras
+    ])
+    return cart
+
+
+class QueryCountMixin:
+    """Mix into a TestCase; ``self.sizes`` are the fixture sizes compared"""
+    sizes = (SMALL, LARGE)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.query_table = []
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.query_table:
+            cls.print_query_table()
+        super().tearDownClass()
+
+    @classmethod
+    def print_query_table(cls):
+        small, large = cls.sizes
+        out = sys.stderr
+        out.write(f"\n{cls.__name__}: queries and wall time with {small} and with {large} rows\n")
+        out.write(f"{'endpoint':<34} {f'q@{small}':>7} {f'q@{large}':>7} {f'ms@{small}':>7} {f'ms@{large}':>7}\n")
+        for endpoint, runs in cls.query_table:
+            (small_queries, small_ms), (large_queries, large_ms) = runs
+            out.write(
+                f"{endpoint:<34} {small_queries:>7} {large_queries:>7} {small_ms:>7.1f} {large_ms:>7.1f}\n"
+            )
+
+    def count_queries(self, call):
+        """(response, captured queries, ms) for one request"""
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as context:
+            response = call()
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        return response, context.captured_queries, (time.perf_counter() - started) * 1000
+
+    def assertFlatQueries(self, endpoint, prepare, status=200):
+        """Fail unless the query count is the same for every fixture size.
+
+        ``prepare(size)`` builds the fixture and returns the request to
+        make, as a function without arguments. Each size is requested once
+        to warm up (caches, the user's cart) and then again, freshly
+        prepared, to count.
+        """
+        runs = []
+        statements = []
+        for size in self.sizes:
+            # Cold caches can take the warm-up over the view's query budget;
+            # only the counted request is held to it
+            logging.disable(logging.WARNING)
+            try:
+                with override_settings(QUERY_BUDGET_ACTION='log'):
+                    prepare(size)()
+            finally:
+                logging.disable(logging.NOTSET)
+            response, queries, ms = self.count_queries(prepare(size))
+            self.assertEqual(
+                response.status_code, status,
+                f"{endpoint} with {size} rows: {getattr(response, 'data', None)}"
+            )
+            runs.append((len(queries), ms))
+            statements.append(Counter(fingerprint(query['sql']) for query in queries))
+        self.query_table.append((endpoint, runs))
+
+        counts = [queries for queries, _ in runs]
+        if len(set(counts)) > 1:
+            grown = (statements[-1] - statements[0]).most_common(3)
+            self.fail(
+                f"{endpoint}: {counts} queries for {list(self.sizes)} rows; repeated per row: "
+                + '; '.join(f"{count}x {sql}" for sql, count in grown)
+            )
+
+    def assertRoutesCovered(self, urlpatterns):
+        """Every named route needs a ``test_<name>`` method (dashes as underscores)"""
+        tests = {name for name in dir(self) if name.startswith('test_')}
+        missing = [
+            pattern.name for pattern in urlpatterns
+            if pattern.name and not any(
+                test == f"test_{pattern.name.replace('-', '_')}"
+                or test.startswith(f"test_{pattern.name.replace('-', '_')}_")
+                for test in tests
+            )
+        ]
+        self.assertEqual(missing, [], "Routes without a query-count test")
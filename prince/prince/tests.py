@@ -0,0 +1,527 @@
+import asyncio
+import base64
+import io
+import json
+import marshal
+import os
+import subprocess
+import sys
+import tempfile
+import uuid
+from datetime import date, datetime, time, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, router, transaction
+from django.http import HttpResponse, JsonResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.views import APIView
+
+from . import metrics
+from .async_views import AsyncAPIView
+from .database import database_from_url, sqlite_database
+from .loadtest import Cashier, Recorder
+from .middleware import CompressionMiddleware, ProfilingMiddleware
+from .parsers import FastJSONParser
+from .profiling import profiles, report, trigger
+from .renderers import FastJSONRenderer
+from .routers import REPLICA_ALIAS, is_pinned_to_primary, replica_reads, _sticky_key
+from .query_budget import QueryBudgetExceeded, QueryBudgetWarning, QueryStats, fingerprint, read_log
+from .startup import import_times
+from .testing import PIN, auth_client, make_catalog, make_user
+from .traffic import read_capture, sanitize, user_key
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    def test_no_persistent_connections_under_asgi(self):
+        with mock.patch.dict(os.environ, {'DB_CONN_MAX_AGE': '30'}):
+            self.assertEqual(sqlite_database('db.sqlite3')['CONN_MAX_AGE'], 30)
+        for env in ({'SERVING_ASGI': '1'}, {'ASYNC_VIEWS': 'True'}):
+            with mock.patch.dict(os.environ, {'DB_CONN_MAX_AGE': '30', **env}):
+                self.assertEqual(sqlite_database('db.sqlite3')['CONN_MAX_AGE'], 0)
+                self.assertEqual(database_from_url('postgres://app@db/prince')['CONN_MAX_AGE'], 0)
+
+
+@override_settings(PIN_HASHER_POLICY='fast')
+class SyntheticDataTests(TestCase):
+    def generate(self, seed):
+        """What generate_data writes into an empty database, without the ids"""
+        from orders.models import Order, OrderItem, OrderItemExtra
+        from products.models import Extra, Product
+
+        with transaction.atomic():
+            call_command(
+                'generate_data', seed=seed, categories=3, products=30, max_extras=3, users=2, orders=150,
+                days=5, end_date=date(2026, 10, 1), batch_size=40, stdout=io.StringIO(),
+            )
+            data = {
+                'products': list(Product.objects.order_by('id').values_list(
+                    'category__name', 'name', 'price', 'is_popular'
+                )),
+                'extras': list(Extra.objects.order_by('id').values_list('product__name', 'name', 'price')),
+                'orders': list(Order.objects.order_by('id').values_list(
+                    'user__username', 'order_type', 'table_number', 'ordered_at', 'total_amount'
+                )),
+                'items': list(OrderItem.objects.order_by('id').values_list(
+                    'order__ordered_at', 'item__name', 'quantity', 'note', 'total_amount'
+                )),
+                'extra_lines': list(OrderItemExtra.objects.order_by('id').values_list(
+                    'order_item__item__name', 'extra__name', 'quantity', 'total_amount'
+                )),
+            }
+            # Back to an empty database for the next run
+            transaction.set_rollback(True)
+        return data
+
+    def test_same_seed_gives_the_same_data(self):
+        first = self.generate(seed=7)
+        self.assertEqual(len(first['orders']), 150)
+        self.assertTrue(first['extra_lines'])
+        self.assertEqual(self.generate(seed=7), first)
+        self.assertNotEqual(self.generate(seed=8)['orders'], first['orders'])
+
+
+class CompressionTests(SimpleTestCase):
+    def respond(self, response):
+        request = RequestFactory().get('/admin/', HTTP_ACCEPT_ENCODING='gzip')
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_json_is_compressed(self):
+        response = self.respond(JsonResponse({'items': ['x' * 40] * 100}))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_html_is_never_compressed(self):
+        response = self.respond(HttpResponse('<input value="csrf">' * 200, content_type='text/html'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+@override_settings(PIN_HASHER_POLICY='fast', QUERY_BUDGET_ACTION='log', QUERY_BUDGETS={})
+class FastJSONTests(SimpleTestCase):
+    data = {
+        'price': Decimal('12.50'),
+        'ordered_at': datetime(2026, 10, 19, 13, 5, 7, 123456, tzinfo=dt_timezone.utc),
+        'naive': datetime(2026, 10, 19, 13, 5),
+        'day': date(2026, 10, 19),
+        'at': time(9, 30, 15, 250000),
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'label': gettext_lazy('Parcel'),
+        'items': [{1: 'int key', 'note': 'line\u2028break'}],
+        'missing': None,
+    }
+
+    def test_output_matches_drf(self):
+        for accepted in (None, 'application/json; indent=2'):
+            self.assertEqual(
+                FastJSONRenderer().render(self.data, accepted), JSONRenderer().render(self.data, accepted)
+            )
+
+    def test_falls_back_to_the_drf_encoder(self):
+        # orjson can't encode integers beyond 64 bits
+        data = dict(self.data, huge=2 ** 70)
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        with mock.patch('prince.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_parser_round_trip(self):
+        body = FastJSONRenderer().render(self.data)
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), json.loads(body))
+        with mock.patch('prince.parsers.orjson', None):
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), json.loads(body))
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"price": '))
+
+
+class Gone(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        raise NotFound(f'Order {pk} is gone')
+
+
+class AsyncGone(AsyncAPIView, Gone):
+    async def get(self, request, pk):
+        return super().get(request, pk)
+
+
+@override_settings(PIN_HASHER_POLICY='fast')
+class AsyncAPIViewTests(TestCase):
+    """AsyncAPIView.dispatch goes through the same steps as APIView.dispatch"""
+
+    def respond(self, view_class, method, **headers):
+        request = getattr(RequestFactory(), method)('/', **headers)
+        view = view_class.as_view()
+        response = async_to_sync(view)(request, pk=7) if iscoroutinefunction(view) else view(request, pk=7)
+        response.render()
+        return response.status_code, response.content
+
+    def test_same_responses_as_apiview(self):
+        headers = {'HTTP_AUTHORIZATION': auth_client(make_user('7400000001'))._credentials['HTTP_AUTHORIZATION']}
+        cases = [('get', headers), ('get', {}), ('post', headers), ('get', {'HTTP_AUTHORIZATION': 'Bearer junk'})]
+        for method, case_headers in cases:
+            self.assertEqual(
+                self.respond(AsyncGone, method, **case_headers), self.respond(Gone, method, **case_headers), method
+            )
+        self.assertEqual(self.respond(AsyncGone, 'get', **headers)[0], 404)
+        self.assertEqual(self.respond(AsyncGone, 'post', **headers)[0], 405)
+        self.assertEqual(self.respond(AsyncGone, 'options', **headers)[0], 200)
+
+
+@override_settings(DATABASE_ROUTERS=['prince.routers.ReplicaRouter'], PIN_HASHER_POLICY='fast')
+class ReplicaRoutingTests(TransactionTestCase):
+    """Routing with a second alias that mirrors the test database, as REPLICA_DATABASE_URL sets up"""
+    @classmethod
+    def setUpClass(cls):
+        # Added once the test database exists (the runner checks declared aliases before that)
+        connections.settings[REPLICA_ALIAS] = {**connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}}
+        cls.databases = {'default', REPLICA_ALIAS}
+        cls.addClassCleanup(cls.remove_replica)
+        super().setUpClass()
+
+    @classmethod
+    def remove_replica(cls):
+        connections[REPLICA_ALIAS].close()
+        del connections[REPLICA_ALIAS]
+        del connections.settings[REPLICA_ALIAS]
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('7300000001')
+        self.client = auth_client(self.user)
+        _, self.products = make_catalog(2)
+
+    def queries(self, method, url, data=None):
+        """(response, queries on the replica) of one request"""
+        with CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica:
+            response = getattr(self.client, method)(url, data, format='json')
+        return response, len(replica)
+
+    def test_router(self):
+        from products.models import Product
+        self.assertEqual(router.db_for_read(Product), 'default')
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Product), REPLICA_ALIAS)
+            self.assertEqual(router.db_for_read(User), 'default')
+            self.assertEqual(router.db_for_write(Product), 'default')
+        self.assertEqual(router.db_for_read(Product), 'default')
+
+    def test_read_only_views_read_from_the_replica(self):
+        response, replica = self.queries('get', reverse('products-list'))
+        self.assertEqual((response.status_code, len(response.data)), (200, 2))
+        self.assertGreater(replica, 0)
+        # The flag is cleared with the response, so the next request on this thread is back on the primary
+        from products.models import Product
+        self.assertEqual(router.db_for_read(Product), 'default')
+        response, replica = self.queries('get', reverse('cart-detail'))
+        self.assertEqual((response.status_code, replica), (200, 0))
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        response, replica = self.queries('post', reverse('add-to-cart'), {'item': self.products[0].pk})
+        self.assertEqual((response.status_code, replica), (200, 0))
+        self.assertTrue(is_pinned_to_primary(self.user.pk))
+        response, replica = self.queries('get', reverse('order-list'))
+        self.assertEqual((response.status_code, replica), (200, 0))
+
+        # Other users aren't pinned, and the pin runs out
+        other = auth_client(make_user('7300000002'))
+        with CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica:
+            other.get(reverse('order-list'))
+        self.assertGreater(len(replica), 0)
+        cache.delete(_sticky_key(self.user.pk))
+        self.assertGreater(self.queries('get', reverse('order-list'))[1], 0)
+
+    def test_asgi_requests_set_and_clear_the_flag(self):
+        from products.models import Product
+        client = AsyncClient(headers={'Authorization': self.client._credentials['HTTP_AUTHORIZATION']})
+        for _ in range(2):
+            response = async_to_sync(client.get)(reverse('products-list'))
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(router.db_for_read(Product), 'default')
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = auth_client(make_user('7400000010'))
+
+    def test_fingerprint_ignores_parameters_and_in_list_sizes(self):
+        self.assertEqual(
+            fingerprint('SELECT *  FROM t\n WHERE id IN (%s, %s, %s)'), fingerprint('SELECT * FROM t WHERE id IN (%s)')
+        )
+        self.assertNotEqual(fingerprint('SELECT a FROM t'), fingerprint('SELECT b FROM t'))
+
+    def test_repeated_queries_are_counted_as_duplicates(self):
+        stats = QueryStats()
+        with stats.record(), connection.cursor() as cursor:
+            for ids in ([1], [1, 2], [3]):
+                cursor.execute(f"SELECT id FROM auth_user WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+            cursor.execute('SELECT COUNT(*) FROM auth_user')
+        self.assertEqual(stats.count, 4)
+        self.assertEqual(list(stats.duplicates().values()), [3])
+        self.assertEqual(stats.duplicate_count(), 2)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('cart-detail'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries", dupq;desc="\d+ duplicate queries", total;dur=[\d.]+')
+        with override_settings(QUERY_BUDGET_HEADERS=False):
+            self.assertFalse(self.client.get(reverse('cart-detail')).has_header('Server-Timing'))
+
+    def test_over_budget_actions(self):
+        with override_settings(QUERY_BUDGETS={'cart-detail': 0}):
+            with override_settings(QUERY_BUDGET_ACTION='raise'), self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('cart-detail'))
+            with override_settings(QUERY_BUDGET_ACTION='warn'), self.assertWarns(QueryBudgetWarning):
+                self.client.get(reverse('cart-detail'))
+            with self.assertLogs('prince.query_budget', 'WARNING') as logs:
+                self.assertEqual(self.client.get(reverse('cart-detail')).status_code, 200)
+            self.assertIn('(cart-detail) ran', logs.output[0])
+        with override_settings(QUERY_BUDGET_ACTION='raise', QUERY_BUDGETS={'cart-detail': 100}):
+            self.assertEqual(self.client.get(reverse('cart-detail')).status_code, 200)
+
+    def test_query_report_skips_a_torn_line(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'queries.jsonl')
+        with override_settings(QUERY_BUDGET_LOG=path):
+            self.client.get(reverse('cart-detail'))
+            self.client.get(reverse('cart-detail'))
+        with open(path, 'a') as log:
+            log.write('{"ts":1,"method":"GET","endp')
+
+        self.assertEqual([entry['endpoint'] for entry in read_log(path)], ['cart-detail', 'cart-detail'])
+        out = io.StringIO()
+        call_command('query_report', log=path, stdout=out)
+        self.assertIn('2 requests, 1 endpoints', out.getvalue())
+
+
+class CashierTests(SimpleTestCase):
+    def test_unexpected_errors_fail_the_session_not_the_cashier(self):
+        responses = iter([
+            ConnectionError('connection reset'),
+            (200, {'unexpected': 'body'}),
+        ])
+
+        def transport(method, path, body=None, token=None):
+            response = next(responses, (503, None))
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        recorder = Recorder()
+        Cashier(0, transport, recorder).run(stop_at=0, sessions=3, think=0)
+        self.assertEqual((recorder.sessions, recorder.failed_sessions), (3, 3))
+        self.assertEqual(recorder.session_errors, {'ConnectionError': 1, 'KeyError': 1, 'SessionFailed': 1})
+
+
+class MetricsTests(TestCase):
+    def test_exposition_adds_up_every_process_store(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        kitchen = metrics.PRINT_ATTEMPTS.child(['kitchen'])
+        db_time = metrics.REQUEST_DB_DURATION.child(['cart-detail'])
+        for pid, (prints, seconds) in {101: (1, 0.002), 102: (2, 0.3)}.items():
+            worker = metrics.MmapStore(os.path.join(directory.name, f'metrics_{pid}.db'))
+            worker.inc(kitchen.key, prints)
+            worker.inc(db_time.bucket_keys[metrics.REQUEST_DB_DURATION.buckets.index(0.0025)])
+            worker.inc(db_time.sum_key, seconds)
+            worker.inc(db_time.count_key)
+        # The last bucket (+Inf) of another store, left by a worker that exited
+        metrics.MmapStore(os.path.join(directory.name, 'metrics_103.db')).inc(db_time.bucket_keys[-1])
+
+        with override_settings(METRICS_DIR=directory.name):
+            self.assertEqual(metrics.collect()[kitchen.key], 3.0)
+            lines = metrics.exposition().splitlines()
+        self.assertIn('prince_print_attempts_total{printer="kitchen"} 3.0', lines)
+        self.assertIn('prince_http_request_db_seconds_bucket{view="cart-detail",le="0.001"} 0.0', lines)
+        self.assertIn('prince_http_request_db_seconds_bucket{view="cart-detail",le="0.0025"} 2.0', lines)
+        self.assertIn('prince_http_request_db_seconds_bucket{view="cart-detail",le="+Inf"} 3.0', lines)
+        self.assertIn('prince_http_request_db_seconds_sum{view="cart-detail"} 0.302', lines)
+        self.assertIn('prince_http_request_db_seconds_count{view="cart-detail"} 2.0', lines)
+
+    def test_made_up_methods_share_one_series(self):
+        self.client.generic('BREW', reverse('categories-list'))
+        self.client.generic('WHEN', reverse('categories-list'))
+        methods = {
+            json.loads(key)[2][1] for key in metrics.collect()
+            if json.loads(key)[0] == 'prince_http_request_duration_seconds'
+        }
+        self.assertIn('other', methods)
+        self.assertFalse({'BREW', 'WHEN'} & methods)
+
+    def test_scrapes_need_the_token(self):
+        url = reverse('metrics')
+        with override_settings(METRICS_TOKEN='', DEBUG=False):
+            self.assertEqual(self.client.get(url).status_code, 403)
+        with override_settings(METRICS_TOKEN='', DEBUG=True):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            response = self.client.get(url, HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE prince_http_request_duration_seconds histogram', response.content.decode())
+
+
+@override_settings(PIN_HASHER_POLICY='fast')
+class TrafficCaptureTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'capture.jsonl')
+
+    def test_sanitize_keeps_ids_and_choices_only(self):
+        body = {'phone': '9000000001', 'password': PIN, 'item': 12, 'quantity': '2', 'note': 'Ring Anil',
+                'order_type': 'table', 'extras': [{'extra_id': 3, 'quantity': 1}]}
+        self.assertEqual(sanitize(body), {
+            'phone': None, 'password': None, 'item': 12, 'quantity': '2', 'note': 'xxxxxxxxx',
+            'order_type': 'table', 'extras': [{'extra_id': 3, 'quantity': 1}],
+        })
+
+    def test_requests_are_captured_without_personal_data(self):
+        user = make_user('7400000000')
+        _, (product,) = make_catalog(1)
+        with override_settings(TRAFFIC_CAPTURE=self.path):
+            self.client.post(reverse('login'), {'phone': user.username, 'password': PIN},
+                             content_type='application/json')
+            auth_client(user).post(reverse('add-to-cart'), {'item': product.pk, 'note': 'No onion'}, format='json')
+        with override_settings(TRAFFIC_CAPTURE=''):
+            self.client.get(reverse('categories-list'))
+
+        login, add = read_capture(self.path)
+        self.assertEqual((login['r'], login['s'], login['u']), ('login', 200, user_key(user.pk)))
+        self.assertEqual(login['b'], {'phone': None, 'password': None})
+        self.assertEqual((add['m'], add['r'], add['u']), ('POST', 'add-to-cart', user_key(user.pk)))
+        self.assertEqual(add['b'], {'item': product.pk, 'note': 'xxxxxxxx'})
+        with open(self.path) as capture_file:
+            raw = capture_file.read()
+        self.assertNotIn(user.username, raw)
+        self.assertEqual(len(raw.splitlines()), 2)
+        self.assertTrue(all(json.loads(line)['ms'] >= 0 for line in raw.splitlines()))
+
+
+@override_settings(PROFILING=True, PIN_HASHER_POLICY='fast')
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiles.clear()
+        self.addCleanup(profiles.clear)
+        make_catalog(3)
+
+    def test_staff_request_with_header_is_profiled(self):
+        staff = auth_client(make_user('7400000001', staff=True))
+        response = staff.get(reverse('categories-list'), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = int(response['X-Profile-Id'])
+
+        record = staff.get(reverse('profile-detail', args=[profile_id])).json()
+        self.assertEqual((record['view'], record['reason'], record['status']), ('categories-list', 'header', 200))
+        self.assertGreater(record['queries'], 0)
+        self.assertTrue(record['tree'])
+        self.assertTrue(record['allocations'])
+        self.assertEqual(set(record['breakdown']), {'sql', 'serializers', 'decimal', 'rendering', 'other'})
+
+        listed = staff.get(reverse('profile-list')).json()
+        self.assertEqual([row['id'] for row in listed], [profile_id])
+        raw = staff.get(reverse('profile-download', args=[profile_id]))
+        self.assertIn('attachment', raw['Content-Disposition'])
+        self.assertTrue(marshal.loads(b''.join(raw)))
+        text = staff.get(reverse('profile-download', args=[profile_id]), {'file_format': 'txt'})
+        self.assertIn('Call tree:', b''.join(text).decode())
+
+    def test_other_requests_are_not_profiled(self):
+        user = auth_client(make_user('7400000002'))
+        response = user.get(reverse('categories-list'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(user.get(reverse('profile-list')).status_code, 403)
+        staff = auth_client(make_user('7400000003', staff=True))
+        self.assertNotIn('X-Profile-Id', staff.get(reverse('categories-list')))
+        self.assertEqual(profiles.list(), [])
+
+    def test_forged_staff_token_does_not_start_a_profile(self):
+        from account.views import get_tokens_for_user
+
+        header, payload, signature = get_tokens_for_user(make_user('7400000004'))['access'].split('.')
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        claims['is_staff'] = True
+        forged_payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip('=')
+        forged = f'{header}.{forged_payload}.{signature}'
+
+        request = RequestFactory().get('/api/categories/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Bearer {forged}')
+        self.assertIsNone(trigger(request))
+        response = self.client.get(
+            reverse('categories-list'), HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Bearer {forged}'
+        )
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(profiles.list(), [])
+
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_async_requests_are_profiled_alone(self):
+        async def scenario():
+            gate = asyncio.Event()
+
+            async def get_response(request):
+                if request.path.endswith('/slow/'):
+                    await gate.wait()
+                return HttpResponse('ok')
+
+            middleware = ProfilingMiddleware(get_response)
+            # A scrape (never profiled) is in flight, so the sampled request isn't profiled
+            scrape = asyncio.create_task(middleware(RequestFactory().get('/metrics/slow/')))
+            await asyncio.sleep(0)
+            refused = await middleware(RequestFactory().get('/refused/'))
+            gate.set()
+            await scrape
+
+            gate.clear()
+            slow = asyncio.create_task(middleware(RequestFactory().get('/slow/')))
+            await asyncio.sleep(0)
+            # Shares the loop with the profiled request: left alone, but counted in its profile
+            fast = await middleware(RequestFactory().get('/fast/'))
+            gate.set()
+            return refused, await slow, fast, await middleware(RequestFactory().get('/alone/'))
+
+        refused, slow, fast, alone = asyncio.run(scenario())
+        self.assertNotIn('X-Profile-Id', refused)
+        self.assertNotIn('X-Profile-Id', fast)
+        slow_record, _ = profiles.get(int(slow['X-Profile-Id']))
+        self.assertEqual(slow_record['overlapping_requests'], 1)
+        self.assertIn('process-wide profile', report(slow_record))
+        alone_record, _ = profiles.get(int(alone['X-Profile-Id']))
+        self.assertEqual(alone_record['overlapping_requests'], 0)
+
+
+class ImportTimeTests(TestCase):
+    # Only placing an order prints; escpos and its dependencies load then
+    LAZY_MODULES = ('escpos', 'pytz', 'barcode', 'qrcode', 'PIL', 'usb', 'serial')
+    # Self time of the project's own modules while loading every URL and view
+    PROJECT_BUDGET_MS = 250
+    PROJECT_PACKAGES = ('prince', 'account', 'products', 'orders')
+
+    def test_worker_startup_skips_the_printing_stack(self):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import django; django.setup(); import prince.urls'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        times = import_times(result.stderr)
+        self.assertIn('orders.views', times)
+
+        loaded = sorted(module for module in times if module.split('.')[0] in self.LAZY_MODULES)
+        self.assertEqual(loaded, [], 'imported at startup instead of on first print')
+        project_ms = sum(
+            self_us for module, (self_us, _) in times.items() if module.split('.')[0] in self.PROJECT_PACKAGES
+        ) / 1000
+        self.assertLess(project_ms, self.PROJECT_BUDGET_MS)
@@ -0,0 +1,517 @@
+"""Capture of real API traffic, and its replay for before/after comparisons.
+
+``TrafficCaptureMiddleware`` is opt-in: set ``TRAFFIC_CAPTURE`` to a file
+and it appends one compact JSON line per API request, e.g.::
+
+    {"t":1718000000.123,"m":"POST","r":"add-to-cart","p":"/api/cart/add/","q":"","a":{},
+     "b":{"item":12,"quantity":2,"note":"xxxxxxxx"},"u":"3f9a0c1e2b7d4a61","st":0,"s":200,"ms":12.4}
+
+``t`` is when the request started, ``r`` its URL name, ``a`` the URL
+arguments, ``u`` a keyed hash of the user id (never the id, name or phone),
+``st`` whether the user is staff, ``s`` the status and ``ms`` the time the
+rest of the stack took. Bodies and query strings are sanitized before they
+are written: numbers, booleans and the strings of ``SAFE_KEYS`` are kept,
+``SECRET_KEYS`` are dropped and any other string becomes x's of the same
+length. File uploads are marked (``"f":1``) but not stored.
+
+``replay_traffic`` re-issues a capture with ``Replayer``: every captured
+user becomes a cashier account, each on its own thread so their requests
+keep their order, paced at the original speed or faster. Ids are mapped
+onto the replay database: catalog ids that don't exist there are folded
+onto ones that do, cart lines and orders onto the ones the replaying user
+has actually created. Per-endpoint latencies are summarised by
+``summarise_replay`` and two runs compared with ``latency_diff``.
+"""
+import json
+import re
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from django.utils.crypto import salted_hmac
+from django.utils.functional import SimpleLazyObject, empty
+
+from .loadtest import PIN, percentile
+from .query_budget import TrafficLog
+from .routers import token_user_id
+
+# Strings kept as they are: choices, flags and menu searches, nothing personal
+SAFE_KEYS = {
+    'order_type', 'table_number', 'type', 'file_format', 'format', 'search', 'fields', 'expand',
+    'cursor', 'dry_run', 'is_popular', 'ordering',
+}
+SECRET_KEYS = {'password', 'pin', 'phone', 'refresh', 'access', 'token'}
+# URL names never captured
+SKIPPED_ROUTES = {'metrics'}
+_NUMBER = re.compile(r'^-?\d+(\.\d+)?$')
+
+capture_log = TrafficLog('TRAFFIC_CAPTURE')
+
+
+def sanitize(value, key=None):
+    """``value`` with secrets dropped and free text replaced by x's"""
+    if key in SECRET_KEYS:
+        return None
+    if isinstance(value, dict):
+        return {name: sanitize(item, name) for name, item in value.items()}
+    if isinstance(value, list):
+        return [sanitize(item, key) for item in value]
+    if isinstance(value, str) and key not in SAFE_KEYS and not _NUMBER.match(value):
+        return 'x' * len(value)
+    return value
+
+
+def sanitize_query(query_string):
+    return urlencode([
+        (key, sanitize(value, key) or '')
+        for key, value in parse_qsl(query_string, keep_blank_values=True)
+    ])
+
+
+def user_key(user_id):
+    """Stable pseudonym for a user id, keyed with SECRET_KEY"""
+    return salted_hmac('prince.traffic.user', str(user_id)).hexdigest()[:16]
+
+
+def request_body(request):
+    """(sanitized body, is a file upload) for a request, read before the view runs.
+
+    Reading ``request.body`` here keeps a copy that the view's parsers read
+    again, so this works whatever the view does with the stream.
+    """
+    if request.method not in ('POST', 'PUT', 'PATCH', 'DELETE'):
+        return None, False
+    if request.content_type == 'multipart/form-data':
+        return None, True
+    try:
+        raw = request.body
+        if not raw:
+            return None, False
+        if request.content_type == 'application/x-www-form-urlencoded':
+            return sanitize(dict(parse_qsl(raw.decode(), keep_blank_values=True))), False
+        return sanitize(json.loads(raw)), False
+    except Exception:
+        # Too big, not JSON: replay can't rebuild it anyway
+        return None, False
+
+
+def authenticated_user(request):
+    """The user the view authenticated, without evaluating a lazy session user"""
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject):
+        if user._wrapped is empty:
+            return None
+        user = user._wrapped
+    return user if user is not None and user.is_authenticated else None
+
+
+def _issued_user_id(response):
+    """User id of the tokens a login, signup or refresh answered with"""
+    data = getattr(response, 'data', None)
+    if not isinstance(data, dict):
+        return None
+    tokens = data.get('tokens') if isinstance(data.get('tokens'), dict) else data
+    access = tokens.get('access')
+    return token_user_id(access) if isinstance(access, str) else None
+
+
+def capture(request, response, started_at, seconds, body, upload):
+    """Append the request to ``TRAFFIC_CAPTURE``"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.view_name or match.url_name in SKIPPED_ROUTES:
+        return
+    user = authenticated_user(request)
+    user_id = user.pk if user is not None else _issued_user_id(response)
+    entry = {
+        't': round(started_at, 3),
+        'm': request.method,
+        'r': match.view_name,
+        'p': request.path,
+        'q': sanitize_query(request.META.get('QUERY_STRING', '')),
+        'a': match.kwargs,
+        'b': body,
+        'u': user_key(user_id) if user_id is not None else None,
+        'st': int(bool(user is not None and user.is_staff)),
+        's': response.status_code,
+        'ms': round(seconds * 1000, 2),
+    }
+    if upload:
+        entry['f'] = 1
+    capture_log.write(entry)
+
+
+def read_capture(path):
+    """The captured requests in time order (a torn last line is skipped)"""
+    entries = []
+    with open(path) as capture_file:
+        for line in capture_file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    entries.sort(key=lambda entry: entry['t'])
+    return entries
+
+
+def captured_users(entries):
+    """{user key: is staff}, in order of first appearance"""
+    users = {}
+    for entry in entries:
+        if entry.get('u'):
+            users[entry['u']] = users.get(entry['u'], False) or bool(entry.get('st'))
+    return users
+
+
+def prepare_accounts(accounts, pin=PIN):
+    """Create (or update) the replay accounts directly, staff included: {phone: is staff}"""
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from account.models import UserProfiles
+
+    existing = {user.username: user for user in User.objects.filter(username__in=list(accounts))}
+    password = make_password(pin)
+    with transaction.atomic():
+        for phone, staff in accounts.items():
+            user = existing.get(phone)
+            if user is None:
+                user = User.objects.create(username=phone, first_name=f'Replay {phone}', password=password,
+                                           is_staff=staff)
+                UserProfiles.objects.create(user=user, phone=phone)
+            elif user.is_staff != staff or not user.check_password(pin):
+                user.is_staff = staff
+                user.password = password
+                user.save(update_fields=['is_staff', 'password'])
+
+
+class CatalogIds:
+    """Folds captured catalog ids onto the ones in the replay database"""
+
+    def __init__(self, menu, categories):
+        self.extras_by_product = {
+            product['id']: [extra['id'] for extra in product.get('extras') or []]
+            for product in menu
+        }
+        self.products = sorted(self.extras_by_product)
+        self.categories = sorted(category['id'] for category in categories)
+        self.extras = sorted(extra for extras in self.extras_by_product.values() for extra in extras)
+
+    @staticmethod
+    def _fold(value, known):
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            return value
+        if not known or value in known:
+            return value
+        return known[value % len(known)]
+
+    def product(self, value):
+        return self._fold(value, self.products)
+
+    def category(self, value):
+        return self._fold(value, self.categories)
+
+    def extra(self, value, product_id=None):
+        """An extra of ``product_id`` when given (one that can go with it on a cart line)"""
+        if product_id is not None and product_id in self.extras_by_product:
+            return self._fold(value, self.extras_by_product[product_id])
+        return self._fold(value, self.extras)
+
+
+class ReplayUser:
+    def __init__(self, phone, staff=False):
+        self.phone = phone
+        self.staff = staff
+        self.access = None
+        self.refresh = None
+        self.cart_lines = {}  # cart line id -> product id, from the last cart response
+        self.orders = []
+        self.line_map = {}
+        self.order_map = {}
+
+    def take_tokens(self, data):
+        tokens = data.get('tokens', data) if isinstance(data, dict) else None
+        if isinstance(tokens, dict) and tokens.get('access'):
+            self.access = tokens['access']
+            self.refresh = tokens.get('refresh', self.refresh)
+
+    def learn(self, data):
+        """Remember the cart lines and orders a response shows"""
+        if not isinstance(data, (dict, list)):
+            return
+        if isinstance(data, list):
+            orders = [order['id'] for order in data if isinstance(order, dict) and 'ordered_at' in order]
+            self.orders += [order_id for order_id in orders if order_id not in self.orders]
+            return
+        if isinstance(data.get('order_id'), int):
+            self.orders.append(data['order_id'])
+        cart = data.get('cart', data)
+        if isinstance(cart, dict) and isinstance(cart.get('items'), list) and 'order_type' in cart:
+            self.cart_lines = {
+                line['id']: (line.get('item') or {}).get('id')
+                for line in cart['items'] if isinstance(line, dict)
+            }
+
+    @staticmethod
+    def _map(value, mapping, current):
+        """The replay row standing in for captured id ``value``"""
+        if not current:
+            return value
+        mapped = mapping.get(value)
+        if mapped in current:
+            return mapped
+        taken = set(mapping.values())
+        free = [row for row in current if row not in taken]
+        mapping[value] = free[0] if free else current[int(value) % len(current)]
+        return mapping[value]
+
+    def cart_line(self, value):
+        return self._map(value, self.line_map, list(self.cart_lines))
+
+    def order(self, value):
+        return self._map(value, self.order_map, self.orders)
+
+
+class ReplayRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {}
+        self.captured = {}
+        self.errors = {}
+        self.skipped = 0
+        self.max_lag = 0.0
+
+    def record(self, endpoint, seconds, captured_ms, status, captured_status, lag):
+        with self._lock:
+            self.timings.setdefault(endpoint, []).append(seconds)
+            if captured_ms is not None:
+                self.captured.setdefault(endpoint, []).append(captured_ms / 1000)
+            # A 4xx captured as a 4xx is the same behaviour, not an error
+            if status // 100 != captured_status // 100:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            self.max_lag = max(self.max_lag, lag)
+
+    def skip(self):
+        with self._lock:
+            self.skipped += 1
+
+
+class Replayer:
+    """Re-issues captured requests through a loadtest transport"""
+
+    def __init__(self, transport, entries, speed=1.0, phone_prefix='9100', create_accounts=True):
+        from django.urls import reverse
+
+        self.reverse = reverse
+        self.transport = transport
+        self.entries = entries
+        self.speed = speed
+        self.phone_prefix = phone_prefix
+        self.create_accounts = create_accounts
+        self.users = {
+            key: ReplayUser(f'{phone_prefix}{index:05d}', staff)
+            for index, (key, staff) in enumerate(captured_users(entries).items())
+        }
+        self.recorder = ReplayRecorder()
+        self.catalog = CatalogIds([], [])
+        self._signups = iter(range(50000, 100000))
+        self._signup_lock = threading.Lock()
+
+    def accounts(self):
+        """{phone: is staff} of the accounts the replay logs in as"""
+        return {user.phone: user.staff for user in self.users.values()}
+
+    def setup(self):
+        """Log every user in and load the catalog (not timed)"""
+        login, signup = self.reverse('login'), self.reverse('signup')
+        for user in self.users.values():
+            credentials = {'phone': user.phone, 'password': PIN}
+            status, data = self.transport('POST', login, credentials)
+            if status != 200 and self.create_accounts:
+                self.transport('POST', signup, {'name': f'Replay {user.phone}', **credentials})
+                status, data = self.transport('POST', login, credentials)
+            if status != 200:
+                raise RuntimeError(f"Could not log in replay account {user.phone}: {status} {data}")
+            user.take_tokens(data)
+
+        token = next((user.access for user in self.users.values()), None)
+        _, menu = self.transport('GET', self.reverse('products-list'), None, token)
+        _, categories = self.transport('GET', self.reverse('categories-list'), None, token)
+        self.catalog = CatalogIds(menu if isinstance(menu, list) else [],
+                                  categories if isinstance(categories, list) else [])
+
+    def run(self):
+        self.setup()
+        groups = {}
+        for entry in self.entries:
+            groups.setdefault(entry.get('u'), []).append(entry)
+
+        first = self.entries[0]['t'] if self.entries else 0
+        started = time.perf_counter()
+        start_at = time.monotonic()
+        threads = [
+            threading.Thread(target=self.replay_user, args=(self.users.get(key), group, first, start_at))
+            for key, group in groups.items()
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        recorder = self.recorder
+        return {
+            'elapsed': time.perf_counter() - started,
+            'captured_span': (self.entries[-1]['t'] - first) if self.entries else 0.0,
+            'timings': recorder.timings,
+            'captured': recorder.captured,
+            'errors': recorder.errors,
+            'skipped': recorder.skipped,
+            'max_lag': recorder.max_lag,
+        }
+
+    def replay_user(self, user, entries, first, start_at):
+        for entry in entries:
+            due = start_at + (entry['t'] - first) / self.speed if self.speed else 0
+            lag = time.monotonic() - due if due else 0.0
+            if lag < 0:
+                time.sleep(-lag)
+                lag = 0.0
+            request = self.build(user, entry)
+            if request is None:
+                self.recorder.skip()
+                continue
+            method, path, body, token = request
+            began = time.perf_counter()
+            try:
+                status, data = self.transport(method, path, body, token)
+            except (ConnectionError, OSError):
+                status, data = 0, None
+            self.recorder.record(f"{method} {entry['r']}", time.perf_counter() - began, entry.get('ms'),
+                                 status, entry['s'], lag)
+            if user is None or status >= 400:
+                continue
+            if entry['r'] in ('login', 'signup', 'token_refresh'):
+                user.take_tokens(data)
+            else:
+                user.learn(data)
+
+    def build(self, user, entry):
+        """(method, path, body, token) for a captured request, or None if it can't be replayed"""
+        if entry.get('f'):
+            return None
+        route, body = entry['r'], entry.get('b')
+        token = user.access if user is not None else None
+
+        if route == 'login':
+            phone = user.phone if user is not None else f'{self.phone_prefix}99999'
+            body, token = {'phone': phone, 'password': PIN}, None
+        elif route == 'signup':
+            with self._signup_lock:
+                phone = f'{self.phone_prefix}{next(self._signups):05d}'
+            body, token = {'name': f'Replay {phone}', 'phone': phone, 'password': PIN}, None
+        elif route == 'token_refresh':
+            body, token = {'refresh': user.refresh if user is not None else ''}, None
+        else:
+            body = self.map_body(user, entry, body)
+
+        kwargs = {name: self.map_arg(user, route, name, value, entry['a']) for name, value in entry['a'].items()}
+        try:
+            path = self.reverse(route, kwargs=kwargs)
+        except Exception:
+            return None
+        if entry.get('q'):
+            path = f"{path}?{entry['q']}"
+        return entry['m'], path, body, token
+
+    def map_arg(self, user, route, name, value, captured_args):
+        catalog = self.catalog
+        if name == 'item_id':
+            return user.cart_line(value) if user is not None else value
+        if name == 'order_id':
+            return user.order(value) if user is not None else value
+        if name == 'extra_id':
+            line = user.cart_line(captured_args.get('item_id')) if user is not None else None
+            return catalog.extra(value, user.cart_lines.get(line) if user is not None else None)
+        if name == 'category_id' or route.startswith('categories-'):
+            return catalog.category(value)
+        if name == 'product_id' or route.startswith('products-'):
+            return catalog.product(value)
+        if route.startswith('extras-'):
+            return catalog.extra(value)
+        return value
+
+    def map_body(self, user, entry, body):
+        if not isinstance(body, dict):
+            return body
+        catalog = self.catalog
+        body = dict(body)
+        product = None
+        if entry['a'].get('item_id') is not None and user is not None:
+            product = user.cart_lines.get(user.cart_line(entry['a']['item_id']))
+        if 'item' in body:
+            body['item'] = product = catalog.product(body['item'])
+        if 'product' in body:
+            body['product'] = catalog.product(body['product'])
+        if 'category' in body and entry['r'] != 'catalog-import':
+            body['category'] = catalog.category(body['category'])
+        if 'extra_id' in body:
+            body['extra_id'] = catalog.extra(body['extra_id'], product)
+        if isinstance(body.get('extras'), list):
+            body['extras'] = [
+                {**extra, 'extra_id': catalog.extra(extra.get('extra_id'), product)} if isinstance(extra, dict) else extra
+                for extra in body['extras']
+            ]
+        return body
+
+
+def _endpoint_summary(timings, captured, errors):
+    ordered = sorted(timings)
+    captured = sorted(captured)
+    return {
+        'requests': len(ordered),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        'captured_p50_ms': round(percentile(captured, 0.50) * 1000, 2),
+        'captured_p95_ms': round(percentile(captured, 0.95) * 1000, 2),
+        'errors': errors,
+    }
+
+
+def summarise_replay(result, **meta):
+    """The JSON-friendly report of a replay, the input of ``latency_diff``"""
+    endpoints = {
+        endpoint: _endpoint_summary(timings, result['captured'].get(endpoint, []), result['errors'].get(endpoint, 0))
+        for endpoint, timings in sorted(result['timings'].items())
+    }
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        **meta,
+        'elapsed': round(result['elapsed'], 3),
+        'captured_span': round(result['captured_span'], 3),
+        'requests': sum(row['requests'] for row in endpoints.values()),
+        'errors': sum(result['errors'].values()),
+        'skipped': result['skipped'],
+        'max_lag_ms': round(result['max_lag'] * 1000, 2),
+        'endpoints': endpoints,
+    }
+
+
+def latency_diff(before, after, tolerance=0.25):
+    """(endpoint, metric, before, after, change, regressed) for the endpoints in both runs.
+
+    A regression is a p50 or p95 more than ``tolerance`` (a fraction)
+    slower, or errors where the first run had none.
+    """
+    rows = []
+    for endpoint in sorted(set(before['endpoints']) & set(after['endpoints'])):
+        old_row, new_row = before['endpoints'][endpoint], after['endpoints'][endpoint]
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            old, new = old_row[metric], new_row[metric]
+            change = (new - old) / old if old else 0.0
+            rows.append((endpoint, metric, old, new, change, metric != 'p99_ms' and change > tolerance))
+        if new_row['errors'] and not old_row['errors']:
+            rows.append((endpoint, 'errors', old_row['errors'], new_row['errors'], 0.0, True))
+    return rows
@@ -19,11 +19,19 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path,include
 
+from prince.metrics import metrics_view
+from prince.profiling import ProfileDetailView, ProfileDownloadView, ProfileListView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/',include('account.urls')),
     path('api/',include('products.urls')),
     path('api/',include('orders.urls')),
+    path('api/',include('reports.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/profiles/', ProfileListView.as_view(), name='profile-list'),
+    path('api/profiles/<int:profile_id>/', ProfileDetailView.as_view(), name='profile-detail'),
+    path('api/profiles/<int:profile_id>/download/', ProfileDownloadView.as_view(), name='profile-download'),
 ]
 
 if settings.DEBUG:
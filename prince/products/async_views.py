@@ -0,0 +1,13 @@
+"""Async version of the product list, served when ASYNC_VIEWS is on (see orders/async_views.py)"""
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.response import Response
+
+from prince.async_views import AsyncAPIView
+from .views import ProductsListView
+
+
+class AsyncProductsListView(AsyncAPIView, ProductsListView):
+    async def get(self, request):
+        # Filtering, paging and building the rows is a few queries; one hop to a thread
+        return Response(await sync_to_async(self.list_products)(request), status=status.HTTP_200_OK)
@@ -0,0 +1,345 @@
+# catalog.py
+"""Bulk import/export of categories, products and extras.
+
+Every row has the columns in ``CATALOG_FIELDS``. Rows are matched by name:
+a category by its name, a product by (category, product) and an extra by
+(category, product, extra), so an exported file can be edited and imported
+again to update prices.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import Category, Product, Extra
+from .price_cache import bump_catalog_version
+
+CATALOG_FIELDS = ['type', 'category', 'product', 'extra', 'price', 'is_popular']
+ROW_TYPES = ('category', 'product', 'extra')
+EXPORT_CHUNK_SIZE = 2000
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'no', 'n'}
+
+
+class CatalogFormatError(ValueError):
+    """Raised when an import file can't be parsed at all"""
+
+
+def parse_catalog(content, file_format):
+    """Turn CSV or JSON text/bytes into a list of row dicts"""
+    if isinstance(content, bytes):
+        content = content.decode('utf-8-sig')
+
+    if file_format == 'csv':
+        reader = csv.DictReader(io.StringIO(content))
+        if not reader.fieldnames or 'type' not in reader.fieldnames:
+            raise CatalogFormatError("CSV header must include a 'type' column")
+        return list(reader)
+
+    if file_format == 'json':
+        try:
+            data = json.loads(content)
+        except ValueError as e:
+            raise CatalogFormatError(f"Invalid JSON: {e}")
+        return rows_from_data(data)
+
+    raise CatalogFormatError(f"Unsupported format '{file_format}'. Use csv or json")
+
+
+def rows_from_data(data):
+    """Accept either a list of rows or {"rows": [...]}"""
+    if isinstance(data, dict):
+        data = data.get('rows')
+    if not isinstance(data, list):
+        raise CatalogFormatError("Expected a list of rows")
+    return data
+
+
+def _text(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def _load_lookups():
+    """Fetch everything needed to validate the import in a few queries"""
+    categories = {}
+    for category_id, name in Category.objects.order_by('id').values_list('id', 'name'):
+        categories.setdefault(name, category_id)
+
+    products = {}
+    for product in Product.objects.order_by('id').values('id', 'category_id', 'name', 'price', 'is_popular'):
+        products.setdefault((product['category_id'], product['name']), product)
+
+    extras = {}
+    for extra in Extra.objects.order_by('id').values('id', 'product_id', 'name', 'price'):
+        extras.setdefault((extra['product_id'], extra['name']), extra)
+
+    return categories, products, extras
+
+
+def _clean_row(row):
+    """Validate a single row on its own, returning (cleaned, errors)"""
+    errors = {}
+    if not isinstance(row, dict):
+        return None, {'row': 'Expected an object with catalog fields'}
+
+    row_type = _text(row.get('type')).lower()
+    cleaned = {
+        'type': row_type,
+        'category': _text(row.get('category')),
+        'product': _text(row.get('product')),
+        'extra': _text(row.get('extra')),
+        'price': None,
+        'is_popular': None,
+    }
+
+    if row_type not in ROW_TYPES:
+        errors['type'] = f"Must be one of: {', '.join(ROW_TYPES)}"
+        return cleaned, errors
+
+    if not cleaned['category']:
+        errors['category'] = 'This field is required.'
+    elif len(cleaned['category']) > Category._meta.get_field('name').max_length:
+        errors['category'] = 'Name is too long.'
+
+    if row_type in ('product', 'extra'):
+        if not cleaned['product']:
+            errors['product'] = 'This field is required.'
+        elif len(cleaned['product']) > Product._meta.get_field('name').max_length:
+            errors['product'] = 'Name is too long.'
+
+        try:
+            price = Decimal(_text(row.get('price')))
+            if not price.is_finite() or price < 0:
+                raise InvalidOperation
+            cleaned['price'] = price.quantize(Decimal('0.01'))
+            if len(cleaned['price'].as_tuple().digits) > 10:
+                raise InvalidOperation
+        except InvalidOperation:
+            errors['price'] = 'A valid non-negative price is required.'
+
+    if row_type == 'product':
+        is_popular = _text(row.get('is_popular')).lower()
+        if is_popular in TRUE_VALUES:
+            cleaned['is_popular'] = True
+        elif is_popular in FALSE_VALUES:
+            cleaned['is_popular'] = False
+        elif is_popular:
+            errors['is_popular'] = 'Must be true or false.'
+
+    if row_type == 'extra':
+        if not cleaned['extra']:
+            errors['extra'] = 'This field is required.'
+        elif len(cleaned['extra']) > Extra._meta.get_field('name').max_length:
+            errors['extra'] = 'Name is too long.'
+
+    return cleaned, errors
+
+
+def validate_catalog(rows):
+    """Validate all rows in one pass.
+
+    Returns (cleaned_rows, errors, categories, products): errors is a list
+    of {"row": <1-based row number>, "errors": {...}} and the two sets hold
+    the category names and (category, product) names defined by the file.
+    """
+    cleaned_rows = []
+    errors = []
+    seen = set()
+    categories = set()
+    products = set()
+
+    for number, row in enumerate(rows, start=1):
+        cleaned, row_errors = _clean_row(row)
+        if not row_errors:
+            key = (cleaned['type'], cleaned['category'], cleaned['product'], cleaned['extra'])
+            if key in seen:
+                row_errors['row'] = 'Duplicate row.'
+            seen.add(key)
+
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+            continue
+
+        cleaned['row'] = number
+        cleaned_rows.append(cleaned)
+        if cleaned['type'] == 'category':
+            categories.add(cleaned['category'])
+        elif cleaned['type'] == 'product':
+            products.add((cleaned['category'], cleaned['product']))
+
+    return cleaned_rows, errors, categories, products
+
+
+@transaction.atomic
+def import_catalog(rows, dry_run=False):
+    """Validate and upsert catalog rows inside a single transaction.
+
+    Nothing is written when any row is invalid or when ``dry_run`` is set.
+    """
+    result = {
+        'created': {'categories': 0, 'products': 0, 'extras': 0},
+        'updated': {'products': 0, 'extras': 0},
+        'errors': [],
+    }
+
+    cleaned_rows, errors, imported_categories, imported_products = validate_catalog(rows)
+    category_ids, products, extras = _load_lookups()
+    category_names = set(category_ids)
+
+    # Resolve references against existing rows plus the rows in this file
+    known_categories = category_names | imported_categories
+    category_by_id = {category_id: name for name, category_id in category_ids.items()}
+    product_names = {
+        (category_by_id.get(category_id), name) for category_id, name in products
+    } | imported_products
+
+    for cleaned in cleaned_rows:
+        row_errors = {}
+        if cleaned['type'] in ('product', 'extra'):
+            if cleaned['category'] not in known_categories:
+                row_errors['category'] = f"Category '{cleaned['category']}' does not exist."
+        if cleaned['type'] == 'extra' and not row_errors:
+            if (cleaned['category'], cleaned['product']) not in product_names:
+                row_errors['product'] = f"Product '{cleaned['product']}' does not exist."
+        if row_errors:
+            errors.append({'row': cleaned['row'], 'errors': row_errors})
+
+    if errors:
+        result['errors'] = sorted(errors, key=lambda error: error['row'])
+        return result
+
+    # Categories
+    new_categories = sorted(
+        {row['category'] for row in cleaned_rows} - category_names
+    )
+    if new_categories and not dry_run:
+        Category.objects.bulk_create([Category(name=name) for name in new_categories])
+        for category_id, name in Category.objects.filter(name__in=new_categories).order_by('id').values_list('id', 'name'):
+            category_ids.setdefault(name, category_id)
+    result['created']['categories'] = len(new_categories)
+
+    # Products
+    to_create = {}
+    to_update = []
+    for row in cleaned_rows:
+        if row['type'] != 'product':
+            continue
+        key = (category_ids.get(row['category']), row['product'])
+        existing = products.get(key)
+        if existing is None:
+            to_create[key] = Product(
+                category_id=key[0],
+                name=row['product'],
+                price=row['price'],
+                is_popular=bool(row['is_popular']),
+            )
+            continue
+        is_popular = existing['is_popular'] if row['is_popular'] is None else row['is_popular']
+        if existing['price'] != row['price'] or existing['is_popular'] != is_popular:
+            to_update.append(Product(id=existing['id'], price=row['price'], is_popular=is_popular))
+
+    if not dry_run:
+        Product.objects.bulk_create(to_create.values(), batch_size=500)
+        Product.objects.bulk_update(to_update, ['price', 'is_popular'], batch_size=500)
+    result['created']['products'] = len(to_create)
+    result['updated']['products'] = len(to_update)
+
+    # Extras
+    extra_rows = [row for row in cleaned_rows if row['type'] == 'extra']
+    if extra_rows and to_create and not dry_run:
+        created_ids = {key[0] for key in to_create}
+        for product in Product.objects.filter(category_id__in=created_ids).values('id', 'category_id', 'name', 'price', 'is_popular'):
+            products.setdefault((product['category_id'], product['name']), product)
+
+    to_create = []
+    to_update = []
+    for row in extra_rows:
+        product = products.get((category_ids.get(row['category']), row['product']))
+        existing = extras.get((product['id'], row['extra'])) if product else None
+        if existing is None:
+            to_create.append(Extra(
+                product_id=product['id'] if product else None,
+                name=row['extra'],
+                price=row['price'],
+            ))
+        elif existing['price'] != row['price']:
+            to_update.append(Extra(id=existing['id'], price=row['price']))
+
+    if not dry_run:
+        Extra.objects.bulk_create(to_create, batch_size=500)
+        Extra.objects.bulk_update(to_update, ['price'], batch_size=500)
+    result['created']['extras'] = len(to_create)
+    result['updated']['extras'] = len(to_update)
+
+    # bulk_create/bulk_update don't send the signals that bump the version
+    if not dry_run:
+        bump_catalog_version()
+
+    return result
+
+
+def iter_catalog_rows():
+    """Yield every category, product and extra as an export row"""
+    categories = Category.objects.order_by('name', 'id').values_list('name', flat=True)
+    for name in categories.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {'type': 'category', 'category': name, 'product': '', 'extra': '', 'price': '', 'is_popular': ''}
+
+    products = Product.objects.order_by('category__name', 'name', 'id').values_list(
+        'category__name', 'name', 'price', 'is_popular'
+    )
+    for category, name, price, is_popular in products.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'type': 'product',
+            'category': category,
+            'product': name,
+            'extra': '',
+            'price': str(price),
+            'is_popular': 'true' if is_popular else 'false',
+        }
+
+    extras = Extra.objects.order_by('product__category__name', 'product__name', 'name', 'id').values_list(
+        'product__category__name', 'product__name', 'name', 'price'
+    )
+    for category, product, name, price in extras.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield {
+            'type': 'extra',
+            'category': category,
+            'product': product,
+            'extra': name,
+            'price': str(price),
+            'is_popular': '',
+        }
+
+
+class _Echo:
+    """File-like object that hands back whatever csv.writer writes"""
+    def write(self, value):
+        return value
+
+
+def stream_catalog(file_format):
+    """Yield the exported catalog as CSV or JSON text chunks"""
+    rows = iter_catalog_rows()
+
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(CATALOG_FIELDS)
+        for row in rows:
+            yield writer.writerow([row[field] for field in CATALOG_FIELDS])
+        return
+
+    if file_format == 'json':
+        yield '['
+        separator = ''
+        for row in rows:
+            yield separator + json.dumps(row)
+            separator = ',\n'
+        yield ']\n'
+        return
+
+    raise CatalogFormatError(f"Unsupported format '{file_format}'. Use csv or json")
@@ -0,0 +1,110 @@
+# fast_serializers.py
+"""Plain-dict serializers for the hot catalog read endpoints.
+
+They return exactly what ``ProductSerializer``/``ExtraSerializer`` return,
+but build the dicts straight from ``values()`` rows instead of going through
+DRF's per-field machinery. FastSerializerTests fails if the two outputs
+drift apart; ``manage.py bench_serializers`` compares their speed at scale.
+"""
+from decimal import Decimal
+
+from django.db.models import Count
+
+from .models import Product, Extra
+
+CENT = Decimal('0.01')
+
+# Product field -> values() columns it is built from, in ProductSerializer order
+PRODUCT_COLUMNS = {
+    'id': ('id',),
+    'is_popular': ('is_popular',),
+    'category': ('category_id', 'category__name'),
+    'name': ('name',),
+    'price': ('price',),
+    'image': ('image',),
+    'extras': (),
+}
+PRODUCT_FIELDS = tuple(PRODUCT_COLUMNS)
+
+_image_storage = Product._meta.get_field('image').storage
+
+
+def decimal_str(value):
+    """Same output as DRF's DecimalField(decimal_places=2)"""
+    if value is None:
+        return None
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value).strip())
+    return '{:f}'.format(value.quantize(CENT))
+
+
+def image_url(name):
+    """Same output as DRF's ImageField without a request in the context"""
+    return _image_storage.url(name) if name else None
+
+
+def product_values(queryset, fields=None):
+    """``values()`` queryset with just the columns needed for ``fields``"""
+    columns = {'id'}
+    for name in PRODUCT_FIELDS if fields is None else fields:
+        columns.update(PRODUCT_COLUMNS.get(name, ()))
+    return queryset.values(*sorted(columns))
+
+
+def extras_by_product(product_ids):
+    """{product_id: [extra dict, ...]} in the same order as the prefetch"""
+    extras = {}
+    rows = (
+        Extra.objects.filter(product_id__in=product_ids)
+        .order_by('id')
+        .values_list('product_id', 'id', 'name', 'price')
+    )
+    for product_id, extra_id, name, price in rows:
+        extras.setdefault(product_id, []).append({
+            'id': extra_id,
+            'name': name,
+            'price': decimal_str(price),
+        })
+    return extras
+
+
+def products_per_category(category_ids):
+    """{category_id: number of products}, i.e. CategoriesSerializer.products_count"""
+    rows = (
+        Product.objects.filter(category_id__in=category_ids)
+        .order_by()
+        .values_list('category_id')
+        .annotate(count=Count('id'))
+    )
+    return dict(rows)
+
+
+def build_products(rows, fields=None):
+    """Turn ``product_values()`` rows into ProductSerializer-shaped dicts"""
+    wanted = [name for name in PRODUCT_FIELDS if fields is None or name in fields]
+    rows = list(rows)
+
+    extras = extras_by_product([row['id'] for row in rows]) if 'extras' in wanted else {}
+    counts = products_per_category({row['category_id'] for row in rows}) if 'category' in wanted else {}
+
+    builders = {
+        'id': lambda row: row['id'],
+        'is_popular': lambda row: row['is_popular'],
+        'category': lambda row: {
+            'id': row['category_id'],
+            'name': row['category__name'],
+            'products_count': counts.get(row['category_id'], 0),
+        },
+        'name': lambda row: row['name'],
+        'price': lambda row: decimal_str(row['price']),
+        'image': lambda row: image_url(row['image']),
+        'extras': lambda row: extras.get(row['id'], []),
+    }
+    field_map = [(name, builders[name]) for name in wanted]
+
+    return [{name: build(row) for name, build in field_map} for row in rows]
+
+
+def serialize_products(queryset, fields=None):
+    """Fast equivalent of ``ProductSerializer(queryset, many=True).data``"""
+    return build_products(product_values(queryset, fields), fields)
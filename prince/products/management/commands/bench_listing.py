@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from prince.benchmark import measure, rolled_back, seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Compare payload size, time and queries of full vs sparse/paginated product and extra listings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--extras', type=int, default=2, help="Extras per product")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST='localhost')
+        cases = [
+            ('products (full)', '/api/products/'),
+            ('products fields=id,name,price', '/api/products/?fields=id,name,price'),
+            ('products expand=extras', '/api/products/?expand=extras'),
+            ('products page_size=50', '/api/products/?page_size=50'),
+            ('products page_size=50 fields=id,name,price', '/api/products/?page_size=50&fields=id,name,price'),
+            ('extras (full)', '/api/extras/'),
+            ('extras fields=id,price', '/api/extras/?fields=id,price'),
+        ]
+
+        with rolled_back():
+            seed_catalog(products=options['products'], extras_per_product=options['extras'])
+
+            self.stdout.write(f"{'case':<45} {'bytes':>10} {'queries':>8} {'best ms':>9} {'median ms':>10}")
+            for label, url in cases:
+                queries = []
+                with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                    client.get(url)
+                response, best, median = measure(lambda: client.get(url), options['repeat'])
+                self.stdout.write(
+                    f"{label:<45} {len(response.content):>10} {len(queries):>8} {best:>9.1f} {median:>10.1f}"
+                )
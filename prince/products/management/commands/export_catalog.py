@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from products.catalog import stream_catalog
+
+
+class Command(BaseCommand):
+    help = "Export categories, products and extras as CSV or JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=['csv', 'json'], default='csv')
+        parser.add_argument('--output', help="File to write to (defaults to stdout)")
+
+    def handle(self, *args, **options):
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                for chunk in stream_catalog(options['format']):
+                    f.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Catalog exported to {options['output']}"))
+            return
+
+        for chunk in stream_catalog(options['format']):
+            self.stdout.write(chunk, ending='')
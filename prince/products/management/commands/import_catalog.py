@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog import CatalogFormatError, import_catalog, parse_catalog
+
+
+class Command(BaseCommand):
+    help = "Bulk import categories, products and extras from a CSV or JSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON file in the catalog export format")
+        parser.add_argument('--format', choices=['csv', 'json'], help="Defaults to the file extension")
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, don't save anything")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+
+        try:
+            with open(path, 'rb') as f:
+                rows = parse_catalog(f.read(), file_format)
+        except OSError as e:
+            raise CommandError(f"Can't read {path}: {e}")
+        except CatalogFormatError as e:
+            raise CommandError(str(e))
+
+        result = import_catalog(rows, dry_run=options['dry_run'])
+
+        if result['errors']:
+            for error in result['errors']:
+                details = '; '.join(f"{field}: {message}" for field, message in error['errors'].items())
+                self.stderr.write(f"Row {error['row']}: {details}")
+            raise CommandError(f"{len(result['errors'])} invalid row(s), nothing imported")
+
+        created, updated = result['created'], result['updated']
+        prefix = "Dry run: would import" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {len(rows)} rows - created {created['categories']} categories, "
+            f"{created['products']} products, {created['extras']} extras; "
+            f"updated {updated['products']} products, {updated['extras']} extras"
+        ))
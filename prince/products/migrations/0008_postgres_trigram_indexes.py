@@ -0,0 +1,54 @@
+# PostgreSQL-only indexes; a no-op on SQLite
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import migrations
+from django.db.models.functions import Upper
+
+try:
+    from django.contrib.postgres.operations import TrigramExtension
+except ImportError:
+    # django.contrib.postgres.operations needs psycopg, which SQLite-only
+    # installs don't have; the extension is skipped on SQLite anyway
+    TrigramExtension = None
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """AddIndex that only builds the index on PostgreSQL.
+
+    The index is in the model state on every backend, so the models' Meta
+    can declare it without makemigrations trying to add it again.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    """Trigram indexes for the menu search (name__icontains).
+
+    On PostgreSQL name__icontains compiles to UPPER("name"::text) LIKE
+    UPPER('%...%'), so the indexes are on UPPER(name) for the planner to
+    use them. CREATE EXTENSION pg_trgm needs a superuser (or, from
+    PostgreSQL 13, a database owner); otherwise have one run it before
+    migrating, after which TrigramExtension finds it and does nothing.
+    """
+
+    dependencies = [
+        ('products', '0007_catalogversion'),
+    ]
+
+    operations = ([TrigramExtension()] if TrigramExtension else []) + [
+        AddPostgresIndex(
+            model_name='product',
+            index=GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='product_name_upper_trgm'),
+        ),
+        AddPostgresIndex(
+            model_name='category',
+            index=GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='category_name_upper_trgm'),
+        ),
+    ]
@@ -1,8 +1,15 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
 
+    class Meta:
+        # Menu search trigram index, built on PostgreSQL only (migration 0008)
+        indexes = [GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='category_name_upper_trgm')]
+
     def __str__(self):
         return self.name
 
@@ -13,6 +20,10 @@ class Product(models.Model):
     image = models.ImageField(upload_to='uploads/images/', null=True, blank=True)
     is_popular = models.BooleanField(default=False)
 
+    class Meta:
+        # Menu search trigram index, built on PostgreSQL only (migration 0008)
+        indexes = [GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='product_name_upper_trgm')]
+
     def __str__(self):
         return self.name
 
@@ -22,4 +33,12 @@ class Extra(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
-        return f"{self.name} - Rs{self.price}"
\ No newline at end of file
+        return f"{self.name} - Rs{self.price}"
+
+class CatalogVersion(models.Model):
+    """Single row bumped on every catalog change, so per-process caches
+    (see products.price_cache) know when to reload"""
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Catalog v{self.version}"
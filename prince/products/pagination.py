@@ -0,0 +1,93 @@
+# pagination.py
+import base64
+import json
+
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetCursorPagination:
+    """Forward-only cursor pagination over a fixed multi-column ordering.
+
+    The cursor is the ordering values of the last row of the previous page,
+    so every page is a single indexed range query no matter how deep the
+    client has paged. ``ordering`` must end with a unique column (``id``).
+    Pagination only kicks in when the client sends ``cursor`` or
+    ``page_size``; without them the view keeps returning a plain list.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 500
+
+    def __init__(self, ordering):
+        self.ordering = tuple(ordering)
+        self.next_position = None
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound('Invalid cursor')
+        return position
+
+    def _position_filter(self, position):
+        """(a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ..."""
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            term = Q(**{f'{field}__gt': position[index]})
+            for previous, value in zip(self.ordering[:index], position[:index]):
+                term &= Q(**{previous: value})
+            condition |= term
+        return condition
+
+    def _annotations(self):
+        return {f'_cursor_{index}': F(field) for index, field in enumerate(self.ordering)}
+
+    def paginate_queryset(self, queryset, request):
+        """Return one page of rows (model instances or ``values()`` dicts)"""
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.annotate(**self._annotations()).order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self._position_filter(self.decode_cursor(cursor)))
+
+        rows = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            get = last.get if isinstance(last, dict) else lambda name: getattr(last, name)
+            self.next_position = [get(f'_cursor_{index}') for index in range(len(self.ordering))]
+        return rows
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'results': data,
+        }
@@ -0,0 +1,189 @@
+# price_cache.py
+"""Process-local cache of the prices and names needed to price carts.
+
+Records are loaded lazily, in one query per batch of missing ids, and kept
+in bounded LRUs. Every ``CATALOG_CACHE_CHECK_INTERVAL`` seconds the cache
+compares its version with ``CatalogVersion`` and drops everything when the
+catalog has changed. Saves in this process invalidate it straight away.
+
+Everything is read from the primary database, never a read replica, so a
+lagging replica can't put stale prices into the cache.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+
+from .models import CatalogVersion, Extra, Product
+
+ProductRecord = namedtuple('ProductRecord', 'price name category_id extra_ids')
+ExtraRecord = namedtuple('ExtraRecord', 'price name product_id')
+
+
+def current_catalog_version():
+    return CatalogVersion.objects.using(DEFAULT_DB_ALIAS).filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def bump_catalog_version():
+    """Mark the catalog as changed for every process"""
+    if not CatalogVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        CatalogVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+    catalog_cache.invalidate()
+
+
+_batch = threading.local()
+
+
+@contextmanager
+def batched_catalog_changes():
+    """Bump the catalog version once for all the saves and deletes in the block.
+
+    A category delete cascades to every product and extra in it; without
+    this each row would bump the version on its own.
+    """
+    if getattr(_batch, 'active', False):
+        yield
+        return
+    _batch.active = True
+    _batch.changed = False
+    try:
+        yield
+        changed = _batch.changed
+    finally:
+        _batch.active = False
+    if changed:
+        bump_catalog_version()
+
+
+def catalog_changed():
+    """Bump the version now, or once at the end of ``batched_catalog_changes()``"""
+    if getattr(_batch, 'active', False):
+        _batch.changed = True
+    else:
+        bump_catalog_version()
+
+
+def _to_ids(ids):
+    result = set()
+    for value in ids:
+        try:
+            result.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return result
+
+
+class CatalogCache:
+    def __init__(self, max_products=5000, max_extras=20000, check_interval=5.0):
+        self.max_products = max_products
+        self.max_extras = max_extras
+        self.check_interval = check_interval
+        self._products = OrderedDict()
+        self._extras = OrderedDict()
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._products.clear()
+            self._extras.clear()
+            self._version = None
+            self._checked_at = 0.0
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        version = current_catalog_version()
+        with self._lock:
+            if version != self._version:
+                self._products.clear()
+                self._extras.clear()
+                self._version = version
+            self._checked_at = now
+
+    def _store(self, lru, key, record, limit):
+        lru[key] = record
+        lru.move_to_end(key)
+        while len(lru) > limit:
+            lru.popitem(last=False)
+
+    def _lookup(self, lru, ids):
+        found = {}
+        with self._lock:
+            for record_id in ids:
+                record = lru.get(record_id)
+                if record is not None:
+                    lru.move_to_end(record_id)
+                    found[record_id] = record
+        return found
+
+    def products(self, ids):
+        """{product_id: ProductRecord} for the ids that exist"""
+        ids = _to_ids(ids)
+        self._check_version()
+        found = self._lookup(self._products, ids)
+        missing = ids - set(found)
+        if not missing:
+            return found
+
+        rows = list(
+            Product.objects.using(DEFAULT_DB_ALIAS).filter(id__in=missing)
+            .values_list('id', 'price', 'name', 'category_id')
+        )
+        extras = {}
+        extra_rows = (
+            Extra.objects.using(DEFAULT_DB_ALIAS).filter(product_id__in=[row[0] for row in rows])
+            .order_by('id')
+            .values_list('id', 'price', 'name', 'product_id')
+        )
+        for extra_id, price, name, product_id in extra_rows:
+            extras.setdefault(product_id, []).append((extra_id, ExtraRecord(price, name, product_id)))
+
+        with self._lock:
+            for product_id, price, name, category_id in rows:
+                product_extras = extras.get(product_id, [])
+                record = ProductRecord(price, name, category_id, tuple(extra_id for extra_id, _ in product_extras))
+                self._store(self._products, product_id, record, self.max_products)
+                found[product_id] = record
+                for extra_id, extra in product_extras:
+                    self._store(self._extras, extra_id, extra, self.max_extras)
+        return found
+
+    def extras(self, ids):
+        """{extra_id: ExtraRecord} for the ids that exist"""
+        ids = _to_ids(ids)
+        self._check_version()
+        found = self._lookup(self._extras, ids)
+        missing = ids - set(found)
+        if not missing:
+            return found
+
+        rows = (
+            Extra.objects.using(DEFAULT_DB_ALIAS).filter(id__in=missing)
+            .values_list('id', 'price', 'name', 'product_id')
+        )
+        with self._lock:
+            for extra_id, price, name, product_id in rows:
+                record = ExtraRecord(price, name, product_id)
+                self._store(self._extras, extra_id, record, self.max_extras)
+                found[extra_id] = record
+        return found
+
+    def product(self, product_id):
+        return next(iter(self.products([product_id]).values()), None)
+
+    def extra(self, extra_id):
+        return next(iter(self.extras([extra_id]).values()), None)
+
+
+catalog_cache = CatalogCache(
+    max_products=getattr(settings, 'CATALOG_CACHE_MAX_PRODUCTS', 5000),
+    max_extras=getattr(settings, 'CATALOG_CACHE_MAX_EXTRAS', 20000),
+    check_interval=getattr(settings, 'CATALOG_CACHE_CHECK_INTERVAL', 5.0),
+)
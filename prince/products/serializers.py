@@ -1,6 +1,42 @@
 from rest_framework import serializers
 from .models import Category, Product, Extra
 
+
+def parse_fieldset(request, serializer_class):
+    """Read ``fields=`` and ``expand=`` from the query string.
+
+    Returns the set of field names to render, or None for the full default
+    representation. Raises ValidationError for unknown names.
+    """
+    fields = request.query_params.get('fields')
+    expand = request.query_params.get('expand')
+    if not fields and not expand:
+        return None
+
+    known = set(serializer_class.Meta.fields)
+    expandable = set(getattr(serializer_class.Meta, 'expandable_fields', ()))
+    requested = {name.strip() for name in (fields or '').split(',') if name.strip()}
+    expanded = {name.strip() for name in (expand or '').split(',') if name.strip()}
+
+    unknown = (requested - known) | (expanded - expandable)
+    if unknown:
+        raise serializers.ValidationError({'fields': f"Unknown field(s): {', '.join(sorted(unknown))}"})
+
+    if not requested:
+        requested = known - expandable
+    return requested | expanded
+
+
+class SparseFieldsMixin:
+    """Only render the fields passed in ``context['fields']`` (if any)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 class CategoriesSerializer(serializers.ModelSerializer):
     products_count = serializers.SerializerMethodField()
     
@@ -9,14 +45,16 @@ class CategoriesSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'products_count']
     
     def get_products_count(self, obj):
-        return obj.products.count()
+        # List views annotate the count; a single category is counted here
+        count = getattr(obj, 'products_count', None)
+        return obj.products.count() if count is None else count
 
-class ExtraSerializer(serializers.ModelSerializer):
+class ExtraSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Extra
         fields = ['id', 'name', 'price']
 
-class ProductSerializer(serializers.ModelSerializer):  # Fixed: Changed from productserializer
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):  # Fixed: Changed from productserializer
     category = CategoriesSerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True, required=False)
     extras = ExtraSerializer(many=True, read_only=True)
@@ -24,6 +62,7 @@ class ProductSerializer(serializers.ModelSerializer):  # Fixed: Changed from pro
     class Meta:
         model = Product
         fields = ['id','is_popular','category', 'category_id', 'name', 'price', 'image', 'extras']
+        expandable_fields = ['category', 'extras']
 
     def validate_category_id(self, value):
         if not Category.objects.filter(id=value).exists():
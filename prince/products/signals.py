@@ -0,0 +1,19 @@
+# signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Category, Product, Extra
+from . import price_cache
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Extra)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Extra)
+def catalog_changed(sender, **kwargs):
+    """Keep per-process price caches in step with the catalog"""
+    if kwargs.get('raw'):
+        return
+    price_cache.catalog_changed()
@@ -1,3 +1,386 @@
-from django.test import TestCase
+import base64
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from orders.pricing import price_cart
+from prince.testing import QueryCountMixin, auth_client, fill_cart, make_catalog, make_user
+from .async_views import AsyncProductsListView
+from .catalog import CatalogFormatError, import_catalog, parse_catalog
+from .fast_serializers import serialize_products
+from .models import CatalogVersion, Category, Extra, Product
+from .price_cache import catalog_cache, current_catalog_version
+from .serializers import ProductSerializer
+from .urls import urlpatterns
+from .views import ProductsListView
+
+
+@override_settings(QUERY_BUDGET_ACTION='raise', PIN_HASHER_POLICY='fast')
+class ProductsQueryCountTests(QueryCountMixin, TestCase):
+    """Catalog endpoints run the same queries for 2 rows as for 20"""
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.invalidate()
+        self.client = auth_client(make_user('7100000000', staff=True))
+
+    def test_routes_covered(self):
+        self.assertRoutesCovered(urlpatterns)
+
+    def test_categories_create(self):
+        def prepare(size):
+            make_catalog(size)
+            body = {'name': f'New Category {Category.objects.count()}'}
+            return lambda: self.client.post(reverse('categories-create'), body, format='json')
+        self.assertFlatQueries('POST categories/create', prepare, status=201)
+
+    def test_categories_list(self):
+        def prepare(size):
+            for _ in range(size):
+                make_catalog(size)
+            return lambda: self.client.get(reverse('categories-list'))
+        self.assertFlatQueries('GET categories', prepare)
+
+    def test_categories_detail_get(self):
+        def prepare(size):
+            category, _ = make_catalog(size)
+            return lambda: self.client.get(reverse('categories-detail', args=[category.pk]))
+        self.assertFlatQueries('GET categories/<id>', prepare)
+
+    def test_categories_detail_put(self):
+        def prepare(size):
+            category, _ = make_catalog(size)
+            body = {'name': f'{category.name} renamed'}
+            return lambda: self.client.put(reverse('categories-detail', args=[category.pk]), body, format='json')
+        self.assertFlatQueries('PUT categories/<id>', prepare)
+
+    def test_categories_detail_delete(self):
+        def prepare(size):
+            category, _ = make_catalog(size, extras_per_product=2)
+            return lambda: self.client.delete(reverse('categories-detail', args=[category.pk]))
+        self.assertFlatQueries('DELETE categories/<id>', prepare)
+
+    def test_products_create(self):
+        def prepare(size):
+            category, _ = make_catalog(size)
+            body = {'category': category.pk, 'name': 'New Dish', 'price': '99.00'}
+            return lambda: self.client.post(reverse('products-create'), body, format='json')
+        self.assertFlatQueries('POST products/create', prepare, status=201)
+
+    def test_products_list(self):
+        def prepare(size):
+            make_catalog(size, extras_per_product=2)
+            return lambda: self.client.get(reverse('products-list'))
+        self.assertFlatQueries('GET products', prepare)
+
+    def test_products_detail_get(self):
+        def prepare(size):
+            _, products = make_catalog(1, extras_per_product=size)
+            return lambda: self.client.get(reverse('products-detail', args=[products[0].pk]))
+        self.assertFlatQueries('GET products/<id>', prepare)
+
+    def test_products_detail_put(self):
+        def prepare(size):
+            category, products = make_catalog(1, extras_per_product=size)
+            body = {'category': category.pk, 'name': 'Renamed Dish', 'price': '120.00'}
+            return lambda: self.client.put(reverse('products-detail', args=[products[0].pk]), body, format='json')
+        self.assertFlatQueries('PUT products/<id>', prepare)
+
+    def test_products_detail_delete(self):
+        def prepare(size):
+            _, products = make_catalog(1, extras_per_product=size)
+            return lambda: self.client.delete(reverse('products-detail', args=[products[0].pk]))
+        self.assertFlatQueries('DELETE products/<id>', prepare)
+
+    def test_products_by_category(self):
+        def prepare(size):
+            category, _ = make_catalog(size, extras_per_product=2)
+            return lambda: self.client.get(reverse('products-by-category', args=[category.pk]))
+        self.assertFlatQueries('GET categories/<id>/products', prepare)
+
+    def test_extras_create(self):
+        def prepare(size):
+            _, products = make_catalog(1, extras_per_product=size)
+            body = {'product': products[0].pk, 'name': 'New Extra', 'price': '15.00'}
+            return lambda: self.client.post(reverse('extras-create'), body, format='json')
+        self.assertFlatQueries('POST extras/create', prepare, status=201)
+
+    def test_extras_list(self):
+        def prepare(size):
+            make_catalog(size, extras_per_product=3)
+            return lambda: self.client.get(reverse('extras-list'))
+        self.assertFlatQueries('GET extras', prepare)
+
+    def test_extras_detail_get(self):
+        def prepare(size):
+            _, products = make_catalog(1, extras_per_product=size)
+            extra = products[0].extras.first()
+            return lambda: self.client.get(reverse('extras-detail', args=[extra.pk]))
+        self.assertFlatQueries('GET extras/<id>', prepare)
+
+    def test_extras_detail_put(self):
+        def prepare(size):
+            _, products = make_catalog(1, extras_per_product=size)
+            extra = products[0].extras.first()
+            body = {'product': products[0].pk, 'name': 'Renamed Extra', 'price': '20.00'}
+            return lambda: self.client.put(reverse('extras-detail', args=[extra.pk]), body, format='json')
+        self.assertFlatQueries('PUT extras/<id>', prepare)
+
+    def test_extras_detail_delete(self):
+        def prepare(size):
+            _, products = make_catalog(1, extras_per_product=size)
+            extra = products[0].extras.first()
+            return lambda: self.client.delete(reverse('extras-detail', args=[extra.pk]))
+        self.assertFlatQueries('DELETE extras/<id>', prepare)
+
+    def test_product_extras(self):
+        def prepare(size):
+            _, products = make_catalog(1, extras_per_product=size)
+            return lambda: self.client.get(reverse('product-extras', args=[products[0].pk]))
+        self.assertFlatQueries('GET products/<id>/extras', prepare)
+
+    def test_catalog_import(self):
+        def prepare(size):
+            category = f'Imported {Category.objects.count()}'
+            rows = [{'type': 'category', 'category': category}]
+            for i in range(size):
+                dish = f'Imported Dish {i}'
+                rows.append({'type': 'product', 'category': category, 'product': dish, 'price': str(60 + i)})
+                rows.append({'type': 'extra', 'category': category, 'product': dish, 'extra': 'Cheese', 'price': '10'})
+            return lambda: self.client.post(reverse('catalog-import'), {'rows': rows}, format='json')
+        self.assertFlatQueries('POST catalog/import', prepare)
+
+    def test_catalog_export(self):
+        def prepare(size):
+            make_catalog(size, extras_per_product=2)
+            return lambda: self.client.get(reverse('catalog-export'))
+        self.assertFlatQueries('GET catalog/export', prepare)
+
+
+class CatalogBatchTests(TestCase):
+    def test_category_delete_bumps_the_version_once(self):
+        category = Category.objects.create(name='Grills')
+        for i in range(3):
+            product = Product.objects.create(category=category, name=f'Grill {i}', price=Decimal('100'))
+            Extra.objects.create(product=product, name='Mayo', price=Decimal('10'))
+        client = auth_client(make_user('7100000001', staff=True))
+
+        version = current_catalog_version()
+        response = client.delete(reverse('categories-detail', args=[category.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(current_catalog_version(), version + 1)
+        self.assertFalse(Product.objects.filter(category_id=category.pk).exists())
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        # Names tie within a category, so only the id tells the rows apart
+        for name in ('Biryani', 'Alpha Grills'):
+            category = Category.objects.create(name=name)
+            for i in range(4):
+                product = Product.objects.create(category=category, name=f'Dish {i % 2}', price=Decimal(50 + i))
+                Extra.objects.create(product=product, name='Mayo', price=Decimal('10'))
+        self.client = APIClient()
+
+    def walk(self, url, **params):
+        response = self.client.get(url, params)
+        pages = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data['results'])
+            if response.data['next'] is None:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_pages_cover_every_row_once(self):
+        expected = list(Product.objects.order_by('category__name', 'name', 'id').values_list('id', flat=True))
+        pages = self.walk(reverse('products-list'), page_size=3)
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual([row['id'] for page in pages for row in page], expected)
+
+        expected = list(Extra.objects.order_by('product__name', 'name', 'id').values_list('id', flat=True))
+        pages = self.walk(reverse('extras-list'), page_size=5, fields='id')
+        self.assertEqual([row['id'] for page in pages for row in page], expected)
+        self.assertEqual(set(pages[0][0]), {'id'})
+
+    def test_bad_cursors_are_not_found(self):
+        tampered = base64.urlsafe_b64encode(json.dumps(['Biryani', 'Dish 0']).encode()).decode()
+        not_json = base64.urlsafe_b64encode(b'Biryani').decode()
+        for cursor in (tampered, not_json, 'not a cursor!'):
+            response = self.client.get(reverse('products-list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+
+    def test_unknown_fields_are_rejected(self):
+        for params in ({'fields': 'id,cost'}, {'expand': 'name'}):
+            response = self.client.get(reverse('products-list'), params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('fields', response.data)
+        self.assertEqual(self.client.get(reverse('extras-list'), {'fields': 'product'}).status_code, 400)
+
+    def test_plain_list_without_pagination_params(self):
+        response = self.client.get(reverse('products-list'))
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 8)
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'price', 'is_popular', 'image', 'category', 'extras'})
+        first_page = self.client.get(reverse('products-list'), {'page_size': 8}).data
+        self.assertEqual(first_page['results'], response.data)
+
+
+class FastSerializerTests(TestCase):
+    def test_products_render_like_product_serializer(self):
+        _, products = make_catalog(3, extras_per_product=2)
+        make_catalog(1, extras_per_product=0)
+        Product.objects.filter(pk=products[0].pk).update(image='uploads/images/tikka.jpg', is_popular=True)
+        queryset = Product.objects.order_by('category__name', 'name', 'id')
+        render = JSONRenderer().render
+
+        drf = ProductSerializer(queryset.select_related('category').prefetch_related('extras'), many=True).data
+        self.assertEqual(render(serialize_products(queryset)), render(drf))
+        fields = {'id', 'price', 'extras'}
+        drf = ProductSerializer(queryset.prefetch_related('extras'), many=True, context={'fields': fields}).data
+        self.assertEqual(render(serialize_products(queryset, fields)), render(drf))
+
+
+class AsyncProductsListTests(TestCase):
+    def test_same_answer_as_the_sync_view(self):
+        make_catalog(3, extras_per_product=2)
+        make_catalog(2, name='Shakes')
+        for params in ({}, {'search': 'shakes'}, {'fields': 'id,name', 'page_size': 2}, {'cursor': 'bad'},
+                       {'fields': 'cost'}, {'min_price': '51', 'limit': 2}):
+            sync = ProductsListView.as_view()(RequestFactory().get('/', params))
+            answer = async_to_sync(AsyncProductsListView.as_view())(RequestFactory().get('/', params))
+            sync.render()
+            answer.render()
+            self.assertEqual((answer.status_code, answer.content), (sync.status_code, sync.content), params)
+
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Grills')
+        self.product = Product.objects.create(category=self.category, name='Chicken Tikka', price=Decimal('200'))
+        Extra.objects.create(product=self.product, name='Mayo', price=Decimal('10'))
+
+    def test_rows_are_upserted_by_name(self):
+        rows = [
+            {'type': 'category', 'category': 'Shakes'},
+            {'type': 'product', 'category': 'Grills', 'product': 'Chicken Tikka', 'price': '220', 'is_popular': 'yes'},
+            {'type': 'product', 'category': 'Shakes', 'product': 'Mango Shake', 'price': '90'},
+            {'type': 'extra', 'category': 'Grills', 'product': 'Chicken Tikka', 'extra': 'Mayo', 'price': '15'},
+            {'type': 'extra', 'category': 'Shakes', 'product': 'Mango Shake', 'extra': 'Ice Cream', 'price': '30'},
+        ]
+        version = current_catalog_version()
+        result = import_catalog(rows)
+
+        self.assertEqual(result['errors'], [])
+        self.assertEqual(result['created'], {'categories': 1, 'products': 1, 'extras': 1})
+        self.assertEqual(result['updated'], {'products': 1, 'extras': 1})
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.price, self.product.is_popular), (Decimal('220'), True))
+        self.assertEqual(self.product.extras.get().price, Decimal('15'))
+        shake = Product.objects.get(name='Mango Shake')
+        self.assertEqual((shake.category.name, shake.extras.get().name), ('Shakes', 'Ice Cream'))
+        self.assertEqual(current_catalog_version(), version + 1)
+
+        # The same file again changes nothing
+        result = import_catalog(rows)
+        self.assertEqual(result['created'], {'categories': 0, 'products': 0, 'extras': 0})
+        self.assertEqual(result['updated'], {'products': 0, 'extras': 0})
+
+    def test_invalid_rows_are_reported_and_nothing_is_saved(self):
+        rows = [
+            {'type': 'product', 'category': 'Grills', 'product': 'Seekh Kebab', 'price': '180'},
+            {'type': 'dish', 'category': 'Grills'},
+            {'type': 'product', 'category': 'Grills', 'product': 'Malai Tikka', 'price': '-5', 'is_popular': 'maybe'},
+            {'type': 'product', 'category': 'Soups', 'product': 'Manchow', 'price': '90'},
+            {'type': 'extra', 'category': 'Grills', 'product': 'Tandoori', 'extra': 'Mayo', 'price': '10'},
+            {'type': 'product', 'category': 'Grills', 'product': 'Seekh Kebab', 'price': '180'},
+        ]
+        result = import_catalog(rows)
+
+        self.assertEqual([error['row'] for error in result['errors']], [2, 3, 4, 5, 6])
+        errors = {error['row']: error['errors'] for error in result['errors']}
+        self.assertEqual(set(errors[2]), {'type'})
+        self.assertEqual(set(errors[3]), {'price', 'is_popular'})
+        self.assertEqual(errors[4], {'category': "Category 'Soups' does not exist."})
+        self.assertEqual(errors[5], {'product': "Product 'Tandoori' does not exist."})
+        self.assertEqual(errors[6], {'row': 'Duplicate row.'})
+        self.assertFalse(Product.objects.filter(name='Seekh Kebab').exists())
+
+    def test_dry_run_writes_nothing(self):
+        rows = [
+            {'type': 'product', 'category': 'Grills', 'product': 'Chicken Tikka', 'price': '250'},
+            {'type': 'product', 'category': 'Grills', 'product': 'Seekh Kebab', 'price': '180'},
+        ]
+        version = current_catalog_version()
+        result = import_catalog(rows, dry_run=True)
+
+        self.assertEqual((result['created']['products'], result['updated']['products']), (1, 1))
+        self.assertEqual(Product.objects.get(pk=self.product.pk).price, Decimal('200'))
+        self.assertFalse(Product.objects.filter(name='Seekh Kebab').exists())
+        self.assertEqual(current_catalog_version(), version)
+
+    def test_csv_and_json_parse_to_the_same_rows(self):
+        csv_rows = parse_catalog(
+            '\ufefftype,category,product,extra,price,is_popular\r\nproduct,Grills,Seekh Kebab,,180,true\r\n'.encode(),
+            'csv',
+        )
+        json_rows = parse_catalog(
+            '{"rows": [{"type": "product", "category": "Grills", "product": "Seekh Kebab", '
+            '"extra": "", "price": "180", "is_popular": "true"}]}',
+            'json',
+        )
+        self.assertEqual(csv_rows, json_rows)
+        for content, file_format in (('category,product\nGrills,Kebab\n', 'csv'), ('{"rows": 1}', 'json'),
+                                     ('[', 'json'), ('', 'xlsx')):
+            with self.assertRaises(CatalogFormatError):
+                parse_catalog(content, file_format)
+
+    def test_upload_through_the_view(self):
+        client = auth_client(make_user('7100000004', staff=True))
+        upload = SimpleUploadedFile('menu.csv', b'type,category,product,price\nproduct,Grills,Seekh Kebab,180\n')
+        response = client.post(reverse('catalog-import') + '?dry_run=1', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created']['products'], 1)
+        self.assertFalse(Product.objects.filter(name='Seekh Kebab').exists())
+
+        upload = SimpleUploadedFile('menu.txt', b'type,category\n')
+        response = client.post(reverse('catalog-import'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
+
+
+@override_settings(PIN_HASHER_POLICY='fast')
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.invalidate()
+        self.category, (self.product,) = make_catalog(1)
+        self.cart = fill_cart(make_user('7100000002'), [self.product])
+
+    def test_price_edit_is_used_by_the_next_price_cart(self):
+        self.assertEqual(price_cart(self.cart).total, Decimal('60'))
+        client = auth_client(make_user('7100000003', staff=True))
+        body = {'category': self.category.pk, 'name': self.product.name, 'price': '80.00'}
+        response = client.put(reverse('products-detail', args=[self.product.pk]), body, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(price_cart(self.cart, refresh=True).total, Decimal('90'))
+
+    def test_edit_in_another_process_is_seen_after_the_check_interval(self):
+        self.assertEqual(price_cart(self.cart).total, Decimal('60'))
+        # Another worker's edit: the version moves but this process's cache isn't told
+        Product.objects.filter(pk=self.product.pk).update(price=Decimal('80'))
+        CatalogVersion.objects.filter(pk=1).update(version=current_catalog_version() + 1)
+
+        with mock.patch.object(catalog_cache, 'check_interval', 3600):
+            self.assertEqual(price_cart(self.cart, refresh=True).total, Decimal('60'))
+        with mock.patch.object(catalog_cache, 'check_interval', 0):
+            self.assertEqual(price_cart(self.cart, refresh=True).total, Decimal('90'))
@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.urls import path
 from .views import *
 
+if settings.ASYNC_VIEWS:
+    from .async_views import AsyncProductsListView as ProductsListView
+
 urlpatterns = [
     # Category URLs
     path('categories/create/', CategoriesCreateView.as_view(), name='categories-create'),
@@ -18,4 +22,8 @@ urlpatterns = [
     path('extras/', ExtrasListView.as_view(), name='extras-list'),
     path('extras/<int:pk>/', ExtrasDetailView.as_view(), name='extras-detail'),
     path('products/<int:product_id>/extras/', ProductExtrasView.as_view(), name='product-extras'),
+
+    # Bulk catalog
+    path('catalog/import/', CatalogImportView.as_view(), name='catalog-import'),
+    path('catalog/export/', CatalogExportView.as_view(), name='catalog-export'),
 ]
\ No newline at end of file
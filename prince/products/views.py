@@ -1,17 +1,29 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db.models import Count, Q
 from .models import Category, Product, Extra
+from .catalog import (
+    CatalogFormatError,
+    import_catalog,
+    parse_catalog,
+    rows_from_data,
+    stream_catalog,
+)
 from .serializers import (
     CategoriesSerializer, 
     ProductSerializer, 
     ProductCreateUpdateSerializer,
     ExtraSerializer,
-    ExtraCreateUpdateSerializer
+    ExtraCreateUpdateSerializer,
+    parse_fieldset,
 )
+from .pagination import KeysetCursorPagination
+from .price_cache import batched_catalog_changes
+from .fast_serializers import build_products, product_values, serialize_products
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,11 +42,13 @@ class CategoriesCreateView(APIView):
 
 
 class CategoriesListView(APIView):
+    read_from_replica = True
+
     def get(self, request):
         # Get query parameters
         search = request.query_params.get('search', None)
         
-        categories = Category.objects.all()
+        categories = Category.objects.annotate(products_count=Count('products'))
         
         # Apply search filter
         if search:
@@ -62,7 +76,9 @@ class CategoriesDetailView(APIView):
     def delete(self, request, pk):
         category = get_object_or_404(Category, pk=pk)
         category_name = category.name
-        category.delete()
+        # The cascade would bump the catalog version once per product and extra
+        with batched_catalog_changes():
+            category.delete()
         logger.info(f"Category '{category_name}' deleted successfully")
         return Response(
             {'message': f'Category "{category_name}" deleted successfully'}, 
@@ -85,15 +101,29 @@ class ProductsCreateView(APIView):
 
 
 class ProductsListView(APIView):
+    """List products.
+
+    Optional: ``fields``/``expand`` to pick the fields rendered, and
+    ``page_size``/``cursor`` for cursor pagination ordered by
+    (category name, name, id).
+    """
+    ordering = ('category__name', 'name', 'id')
+    read_from_replica = True
+    query_budget = 5
+
     def get(self, request):
+        return Response(self.list_products(request), status=status.HTTP_200_OK)
+
+    def list_products(self, request):
         # Get query parameters
         category_id = request.query_params.get('category', None)
         search = request.query_params.get('search', None)
         min_price = request.query_params.get('min_price', None)
         max_price = request.query_params.get('max_price', None)
         limit = request.query_params.get('limit', None)
-        
-        products = Product.objects.select_related('category').prefetch_related('extras')
+        fields = parse_fieldset(request, ProductSerializer)
+
+        products = Product.objects.all()
         
         # Apply filters
         if category_id:
@@ -117,18 +147,24 @@ class ProductsListView(APIView):
             except ValueError:
                 pass
         
-        products = products.order_by('category__name', 'name')
+        products = products.order_by(*self.ordering)
+        # Hot path: plain dicts from values() rows, only the requested columns
+        rows = product_values(products, fields)
+
+        paginator = KeysetCursorPagination(self.ordering)
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(rows, request)
+            return paginator.get_paginated_data(build_products(page, fields))
         
         # Apply limit
         if limit:
             try:
                 limit = int(limit)
-                products = products[:limit]
+                rows = rows[:limit]
             except ValueError:
                 pass
         
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return build_products(rows, fields)
 
 
 class ProductsDetailView(APIView):
@@ -154,7 +190,8 @@ class ProductsDetailView(APIView):
     def delete(self, request, pk):
         product = get_object_or_404(Product, pk=pk)
         product_name = product.name
-        product.delete()
+        with batched_catalog_changes():
+            product.delete()
         logger.info(f"Product '{product_name}' deleted successfully")
         return Response(
             {'message': f'Product "{product_name}" deleted successfully'}, 
@@ -165,7 +202,7 @@ class ProductsDetailView(APIView):
 class ProductsByCategoryView(APIView):
     def get(self, request, category_id):
         category = get_object_or_404(Category, pk=category_id)
-        products = Product.objects.filter(category=category).prefetch_related('extras')
+        products = Product.objects.filter(category=category)
         
         # Apply search if provided
         search = request.query_params.get('search', None)
@@ -173,11 +210,10 @@ class ProductsByCategoryView(APIView):
             products = products.filter(name__icontains=search)
         
         products = products.order_by('name')
-        serializer = ProductSerializer(products, many=True)
         
         return Response({
             'category': CategoriesSerializer(category).data,
-            'products': serializer.data
+            'products': serialize_products(products)
         }, status=status.HTTP_200_OK)
 
 
@@ -194,16 +230,27 @@ class ExtrasCreateView(APIView):
 
 
 class ExtrasListView(APIView):
+    """List extras, with the same ``fields`` and cursor options as products"""
+    ordering = ('product__name', 'name', 'id')
+
     def get(self, request):
         product_id = request.query_params.get('product', None)
+        fields = parse_fieldset(request, ExtraSerializer)
         
-        extras = Extra.objects.select_related('product')
+        extras = Extra.objects.all()
         
         if product_id:
             extras = extras.filter(product_id=product_id)
         
-        extras = extras.order_by('product__name', 'name')
-        serializer = ExtraSerializer(extras, many=True)
+        extras = extras.order_by(*self.ordering)
+
+        paginator = KeysetCursorPagination(self.ordering)
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(extras, request)
+            serializer = ExtraSerializer(page, many=True, context={'fields': fields})
+            return Response(paginator.get_paginated_data(serializer.data), status=status.HTTP_200_OK)
+
+        serializer = ExtraSerializer(extras, many=True, context={'fields': fields})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -249,3 +296,48 @@ class ProductExtrasView(APIView):
             },
             'extras': serializer.data
         }, status=status.HTTP_200_OK)
+
+
+class CatalogImportView(APIView):
+    """Bulk upsert categories, products and extras from CSV or JSON.
+
+    Send a ``file`` upload (format taken from ``file_format`` or the file
+    extension) or a JSON body with the rows. Nothing is saved unless every
+    row is valid.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        dry_run = str(request.query_params.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        upload = request.FILES.get('file')
+
+        try:
+            if upload:
+                file_format = request.data.get('file_format') or upload.name.rsplit('.', 1)[-1]
+                rows = parse_catalog(upload.read(), file_format.lower())
+            else:
+                rows = rows_from_data(request.data)
+        except CatalogFormatError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = import_catalog(rows, dry_run=dry_run)
+        if result['errors']:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f"Catalog import ({len(rows)} rows, dry_run={dry_run}): {result['created']} created, {result['updated']} updated")
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class CatalogExportView(APIView):
+    """Stream the whole catalog in the import format"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'csv').lower()
+        if file_format not in ('csv', 'json'):
+            return Response({'error': 'file_format must be csv or json'}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = 'text/csv' if file_format == 'csv' else 'application/json'
+        response = StreamingHttpResponse(stream_catalog(file_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="catalog.{file_format}"'
+        return response
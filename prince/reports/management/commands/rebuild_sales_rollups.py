@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.export import ExportError, export_range
+from reports.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily and hourly sales rollups from the order history, for every day or for "
+        "--start to --end. Needed after orders are written outside PlaceOrderView (generate_data, the admin)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day, YYYY-MM-DD (default: the first order)")
+        parser.add_argument('--end', help="Last day, YYYY-MM-DD, included (default: the last order)")
+
+    def handle(self, *args, **options):
+        try:
+            since, until = export_range(options['start'], options['end'])
+        except ExportError as e:
+            raise CommandError(str(e))
+        started = time.perf_counter()
+        written = rebuild_rollups(since, until)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} rollup rows in {time.perf_counter() - started:.1f}s"
+        ))
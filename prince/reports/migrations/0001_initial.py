@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('hour', 'Hour')], max_length=4)),
+                ('start', models.DateTimeField()),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('order_type', 'Order type'), ('product', 'Product'), ('category', 'Category')], max_length=16)),
+                ('key', models.CharField(blank=True, default='', max_length=32)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period', 'dimension', 'start', 'key'), name='sales_rollup_bucket')],
+            },
+        ),
+    ]
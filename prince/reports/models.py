@@ -0,0 +1,38 @@
+# models.py
+from django.db import models
+
+
+class SalesRollup(models.Model):
+    """Orders, items sold and revenue of one local day or hour, per dimension.
+
+    ``key`` is '' for the ``total`` dimension, the order type for
+    ``order_type`` and the product or category id for the others. Kept up
+    to date by PlaceOrderView; see ``reports.rollups``.
+    """
+    PERIOD_CHOICES = (
+        ('day', 'Day'),
+        ('hour', 'Hour'),
+    )
+    DIMENSION_CHOICES = (
+        ('total', 'Total'),
+        ('order_type', 'Order type'),
+        ('product', 'Product'),
+        ('category', 'Category'),
+    )
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    start = models.DateTimeField()
+    dimension = models.CharField(max_length=16, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=32, blank=True, default='')
+    orders = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index the reports read: one dimension over a range of buckets
+            models.UniqueConstraint(fields=['period', 'dimension', 'start', 'key'], name='sales_rollup_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_dimension_display()} {self.key} {self.period} {self.start:%Y-%m-%d %H:%M}"
@@ -0,0 +1,310 @@
+# rollups.py
+"""Pre-aggregated sales: orders, items sold and revenue per local day and hour.
+
+Every bucket (a day or an hour in ``TIME_ZONE``) has a ``SalesRollup`` row
+per dimension:
+
+- ``total``: every order
+- ``order_type``: per delivery, parcel and table
+- ``product``: the lines of each product (revenue includes their extras)
+- ``category``: the lines of each product category
+
+``orders`` counts the orders in the row (an order with two lines of one
+product counts once for it), ``quantity`` the items on their lines and
+``revenue`` their totals as charged.
+
+PlaceOrderView adds each order with ``record_sale()`` inside its write
+transaction, one upsert that increments the rows in place. Orders written
+any other way (``generate_data``, the admin) are only counted after
+``rebuild_rollups()``, which the ``rebuild_sales_rollups`` command runs.
+Reports read nothing else, so they cost the same however many orders
+there are.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F, Max, Min, Sum
+from django.utils.timezone import localdate, localtime, make_aware
+
+from orders.models import Order, OrderItem
+from orders.transactions import write_transaction
+from products.fast_serializers import decimal_str
+from products.models import Category, Product
+from products.price_cache import catalog_cache
+from .models import SalesRollup
+
+REPORT_PERIODS = ('day', 'hour', 'total')
+DIMENSIONS = ('total', 'order_type', 'product', 'category')
+# Rows per INSERT, well under SQLite's limit on statement parameters
+UPSERT_BATCH_SIZE = 100
+REBUILD_BATCH_SIZE = 1000
+
+COUNTERS = ('orders', 'quantity', 'revenue')
+_UPSERT_VENDORS = ('sqlite', 'postgresql')
+
+
+class ReportError(ValueError):
+    """Raised for report parameters that can't be used"""
+
+
+def bucket_starts(ordered_at):
+    """[(period, start)] of the local day and hour ``ordered_at`` falls in"""
+    local = localtime(ordered_at).replace(tzinfo=None)
+    return [
+        ('day', make_aware(datetime.combine(local.date(), time.min))),
+        ('hour', make_aware(local.replace(minute=0, second=0, microsecond=0))),
+    ]
+
+
+def order_rollups(ordered_at, order_type, total, lines):
+    """{(period, start, dimension, key): [orders, quantity, revenue]} one order adds.
+
+    ``lines`` are (product_id, category_id, quantity, revenue) tuples; a
+    None category_id leaves the line out of the category rows.
+    """
+    quantity = sum(line[2] for line in lines)
+    groups = {'product': {}, 'category': {}}
+    for product_id, category_id, line_quantity, revenue in lines:
+        for dimension, key in (('product', product_id), ('category', category_id)):
+            if key is None:
+                continue
+            counters = groups[dimension].setdefault(str(key), [0, 0])
+            counters[0] += line_quantity
+            counters[1] += revenue
+
+    rows = {}
+    for period, start in bucket_starts(ordered_at):
+        rows[(period, start, 'total', '')] = [1, quantity, total]
+        rows[(period, start, 'order_type', order_type)] = [1, quantity, total]
+        for dimension, keys in groups.items():
+            for key, (line_quantity, revenue) in keys.items():
+                rows[(period, start, dimension, key)] = [1, line_quantity, revenue]
+    return rows
+
+
+def record_sale(order, pricing):
+    """Add a new order to the rollups (PlaceOrderView, in its write transaction)"""
+    products = catalog_cache.products({line.product_id for line in pricing.lines})
+    lines = []
+    for line in pricing.lines:
+        record = products.get(line.product_id)
+        lines.append((line.product_id, record.category_id if record else None, line.quantity, line.total))
+    add_to_rollups(order_rollups(order.ordered_at, order.order_type, pricing.total, lines))
+
+
+def add_to_rollups(rows):
+    """Increment the counters of ``rows`` (as from ``order_rollups()``), creating missing ones"""
+    if not rows:
+        return
+    using = router.db_for_write(SalesRollup)
+    connection = connections[using]
+    if connection.vendor not in _UPSERT_VENDORS:
+        _add_one_by_one(rows, using)
+        return
+
+    quote = connection.ops.quote_name
+    table = quote(SalesRollup._meta.db_table)
+    columns = ', '.join(quote(name) for name in ('period', 'start', 'dimension', 'key', *COUNTERS))
+    bucket = ', '.join(quote(name) for name in ('period', 'dimension', 'start', 'key'))
+    updates = ', '.join(f'{quote(name)} = {table}.{quote(name)} + excluded.{quote(name)}' for name in COUNTERS)
+
+    items = list(rows.items())
+    with connection.cursor() as cursor:
+        for offset in range(0, len(items), UPSERT_BATCH_SIZE):
+            batch = items[offset:offset + UPSERT_BATCH_SIZE]
+            params = []
+            for (period, start, dimension, key), (orders, quantity, revenue) in batch:
+                params += [
+                    period, connection.ops.adapt_datetimefield_value(start), dimension, key, orders, quantity,
+                    connection.ops.adapt_decimalfield_value(revenue, 14, 2),
+                ]
+            values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(batch))
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {values} ON CONFLICT ({bucket}) DO UPDATE SET {updates}',
+                params,
+            )
+
+
+def _add_one_by_one(rows, using):
+    with transaction.atomic(using=using):
+        for (period, start, dimension, key), (orders, quantity, revenue) in rows.items():
+            rollup, created = SalesRollup.objects.using(using).get_or_create(
+                period=period, start=start, dimension=dimension, key=key,
+                defaults={'orders': orders, 'quantity': quantity, 'revenue': revenue},
+            )
+            if not created:
+                SalesRollup.objects.using(using).filter(pk=rollup.pk).update(
+                    orders=F('orders') + orders, quantity=F('quantity') + quantity, revenue=F('revenue') + revenue
+                )
+
+
+def _in_range(queryset, field, since, until):
+    if since:
+        queryset = queryset.filter(**{f'{field}__gte': since})
+    if until:
+        queryset = queryset.filter(**{f'{field}__lt': until})
+    return queryset
+
+
+def _rebuilt_rows(since, until):
+    """{(period, start, dimension, key): [orders, quantity, revenue]} of the orders in [since, until).
+
+    Goes through ``order_rollups()`` like the incremental path, a chunk of
+    orders at a time, so both always agree.
+    """
+    rows = {}
+    orders = _in_range(Order.objects.order_by('id'), 'ordered_at', since, until).values_list(
+        'id', 'ordered_at', 'order_type', 'total_amount'
+    )
+    chunk = []
+    for order in orders.iterator(chunk_size=REBUILD_BATCH_SIZE):
+        chunk.append(order)
+        if len(chunk) == REBUILD_BATCH_SIZE:
+            _add_chunk(rows, chunk)
+            chunk = []
+    _add_chunk(rows, chunk)
+    return rows
+
+
+def _add_chunk(rows, orders):
+    lines = {}
+    items = OrderItem.objects.filter(order_id__in=[order[0] for order in orders]).values_list(
+        'order_id', 'item_id', 'item__category_id', 'quantity', 'total_amount'
+    )
+    for order_id, *line in items:
+        lines.setdefault(order_id, []).append(line)
+    for order_id, ordered_at, order_type, total in orders:
+        for bucket, counters in order_rollups(ordered_at, order_type, total, lines.get(order_id, [])).items():
+            current = rows.setdefault(bucket, [0, 0, 0])
+            for index, value in enumerate(counters):
+                current[index] += value
+
+
+def _midnight(day):
+    return make_aware(datetime.combine(day, time.min))
+
+
+def _rebuild_days(since, until):
+    """[(start, end)] of the local days in [since, until).
+
+    An open bound becomes the first or last day with an order or a rollup,
+    so rollups left by deleted orders are cleared too.
+    """
+    if since is None or until is None:
+        bounds = [
+            *Order.objects.aggregate(first=Min('ordered_at'), last=Max('ordered_at')).values(),
+            *SalesRollup.objects.aggregate(first=Min('start'), last=Max('start')).values(),
+        ]
+        days = [localtime(bound).date() for bound in bounds if bound is not None]
+        if not days:
+            return []
+        since = since or _midnight(min(days))
+        until = until or _midnight(max(days) + timedelta(days=1))
+
+    ranges = []
+    start, day = since, localtime(since).date()
+    while start < until:
+        day += timedelta(days=1)
+        end = min(_midnight(day), until)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def rebuild_rollups(since=None, until=None):
+    """Recompute the rollups of [since, until) from the orders; returns the rows written.
+
+    ``since`` and ``until`` should be local midnights (``orders.export.export_range``)
+    so no day is rebuilt from only part of its orders. Either may be None.
+    Each day is recomputed and replaced in its own write transaction, so a
+    checkout waits for one day at most and is neither lost nor counted twice.
+    """
+    return sum(_rebuild_day(start, end) for start, end in _rebuild_days(since, until))
+
+
+@write_transaction
+def _rebuild_day(start, end):
+    connection = connections[router.db_for_write(SalesRollup)]
+    if connection.vendor == 'postgresql':
+        # SQLite's BEGIN IMMEDIATE already holds off other writers
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {connection.ops.quote_name(SalesRollup._meta.db_table)} IN EXCLUSIVE MODE')
+
+    # Read under the lock: an order placed before it is in the rows, one placed
+    # after it increments the rows written here
+    rows = _rebuilt_rows(start, end)
+    _in_range(SalesRollup.objects.all(), 'start', start, end).delete()
+    # Plain inserts once the day is empty, without bulk_create's per-model cost
+    add_to_rollups(rows)
+    return len(rows)
+
+
+def _names(dimension, keys):
+    """{key: display name} for the keys of one dimension"""
+    if dimension == 'order_type':
+        return dict(Order.ORDER_TYPE_CHOICES)
+    model = {'product': Product, 'category': Category}.get(dimension)
+    if model is None:
+        return {}
+    ids = {int(key) for key in keys if key.isdigit()}
+    return {str(pk): name for pk, name in model.objects.filter(id__in=ids).values_list('id', 'name')}
+
+
+def report_range(period, since, until):
+    """(since, until) a report reads for the requested range.
+
+    Day and hour reports cover the ``SALES_REPORT_DEFAULT_DAYS`` local days
+    up to ``until`` (default: today) unless ``since`` is given, and at most
+    ``SALES_REPORT_MAX_DAYS``. Total reports keep an open range.
+    """
+    if period == 'total':
+        return since, until
+    if until is None:
+        until = _midnight(localdate() + timedelta(days=1))
+    if since is None:
+        since = _midnight(localtime(until).date() - timedelta(days=settings.SALES_REPORT_DEFAULT_DAYS))
+    if until - since > timedelta(days=settings.SALES_REPORT_MAX_DAYS):
+        raise ReportError(f"day and hour reports cover at most {settings.SALES_REPORT_MAX_DAYS} days")
+    return since, until
+
+
+def sales_report(period='day', dimension='total', since=None, until=None, limit=None):
+    """Rows of a sales report, read from the rollups only.
+
+    ``period`` day or hour gives one row per bucket and key, oldest first,
+    for a bounded range (see ``report_range()``); ``total`` sums the day
+    rows of the range into one row per key, highest revenue first. Either
+    way there are at most ``limit`` rows.
+    """
+    if period not in REPORT_PERIODS:
+        raise ReportError("period must be day, hour or total")
+    if dimension not in DIMENSIONS:
+        raise ReportError("by must be total, order_type, product or category")
+    if period != 'total' and (since is None or until is None):
+        raise ReportError("day and hour reports need a start and an end")
+
+    rollups = _in_range(
+        SalesRollup.objects.filter(period='hour' if period == 'hour' else 'day', dimension=dimension),
+        'start', since, until,
+    )
+    if period == 'total':
+        rows = list(
+            rollups.values('key').annotate(orders=Sum('orders'), quantity=Sum('quantity'), revenue=Sum('revenue'))
+            .order_by('-revenue', 'key')[:limit]
+        )
+    else:
+        rows = list(rollups.order_by('start', 'key').values('start', 'key', *COUNTERS)[:limit])
+
+    names = _names(dimension, {row['key'] for row in rows})
+    return [
+        {
+            'start': localtime(row['start']).isoformat() if 'start' in row else None,
+            'key': row['key'],
+            'name': names.get(row['key']),
+            'orders': row['orders'],
+            'quantity': row['quantity'],
+            'revenue': decimal_str(row['revenue']),
+        }
+        for row in rows
+    ]
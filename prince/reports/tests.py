@@ -0,0 +1,171 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.models import Order
+from prince.benchmark import FakePrinter, seed_orders
+from prince.testing import QueryCountMixin, auth_client, fill_cart, make_catalog, make_user
+from products.price_cache import catalog_cache
+from .models import SalesRollup
+from .rollups import _rebuild_day, rebuild_rollups
+from .urls import urlpatterns
+
+
+@override_settings(QUERY_BUDGET_ACTION='raise', PIN_HASHER_POLICY='fast')
+class ReportsQueryCountTests(QueryCountMixin, TestCase):
+    """Reports run the same queries for 2 products (or orders) as for 20"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = auth_client(make_user('7500000000', staff=True))
+        self.user = make_user('7500000001')
+        _, self.menu = make_catalog(20)
+
+    def test_routes_covered(self):
+        self.assertRoutesCovered(urlpatterns)
+
+    def test_sales_report(self):
+        def prepare(size):
+            Order.objects.all().delete()
+            seed_orders(self.user, self.menu[:size], orders=size, items_per_order=2)
+            rebuild_rollups()
+            return lambda: self.client.get(reverse('sales-report'), {'period': 'total', 'by': 'product'})
+        self.assertFlatQueries('GET reports/sales', prepare)
+
+
+@override_settings(PIN_HASHER_POLICY='fast')
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        catalog_cache.invalidate()
+        printer = FakePrinter()
+        self.addCleanup(printer.close)
+        printing = override_settings(
+            KITCHEN_PRINTER_IP='127.0.0.1', COUNTER_PRINTER_IP='127.0.0.1', PRINTER_PORT=printer.port
+        )
+        printing.enable()
+        self.addCleanup(printing.disable)
+        self.staff = auth_client(make_user('7500000002', staff=True))
+        self.cashier = make_user('7500000003')
+        self.category, self.products = make_catalog(3, extras_per_product=1)
+
+    def place_order(self, products, order_type='parcel'):
+        fill_cart(self.cashier, products)
+        response = auth_client(self.cashier).post(
+            reverse('place-order'), {'order_type': order_type, 'table_number': '4'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return Order.objects.get(pk=response.data['order_id'])
+
+    def snapshot(self):
+        return sorted(SalesRollup.objects.values_list(
+            'period', 'start', 'dimension', 'key', 'orders', 'quantity', 'revenue'
+        ))
+
+    def report(self, **params):
+        response = self.staff.get(reverse('sales-report'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_orders_are_rolled_up_as_they_are_placed(self):
+        first = self.place_order(self.products)
+        second = self.place_order(self.products[:1], order_type='table')
+
+        (total,) = self.report(period='total')
+        self.assertEqual((total['orders'], total['revenue']), (2, str(first.total_amount + second.total_amount)))
+        self.assertEqual(total['quantity'], sum(item.quantity for order in (first, second) for item in order.items.all()))
+
+        by_type = {row['key']: row for row in self.report(period='total', by='order_type')}
+        self.assertEqual(by_type['table']['revenue'], str(second.total_amount))
+        self.assertEqual(by_type['parcel']['name'], 'Parcel')
+
+        top = self.report(period='total', by='product', limit=1)[0]
+        self.assertEqual((top['key'], top['orders']), (str(self.products[0].pk), 2))
+        self.assertEqual(top['name'], self.products[0].name)
+
+        (day,) = self.report(by='category')
+        self.assertEqual((day['key'], day['orders']), (str(self.category.pk), 2))
+        self.assertEqual(len(self.report(period='hour')), 1)
+
+    def test_rebuild_matches_the_incremental_rollups(self):
+        self.place_order(self.products)
+        self.place_order(self.products[1:], order_type='delivery')
+        self.place_order(self.products[:2], order_type='table')
+        incremental = self.snapshot()
+
+        SalesRollup.objects.update(orders=0, quantity=0, revenue=Decimal('0'))
+        self.assertEqual(rebuild_rollups(), len(incremental))
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_checkouts_during_a_rebuild_are_counted_once(self):
+        self.place_order(self.products)
+        Order.objects.update(ordered_at=timezone.now() - timedelta(days=1))
+        self.place_order(self.products[:1])
+        days = []
+
+        def rebuild_day(start, end):
+            rows = _rebuild_day(start, end)
+            days.append(start)
+            # Lands after yesterday is rebuilt (today's rebuild reads it) and
+            # after today is (only its own upsert counts it)
+            self.place_order(self.products[1:])
+            return rows
+
+        with mock.patch('reports.rollups._rebuild_day', side_effect=rebuild_day):
+            rebuild_rollups()
+        self.assertEqual(len(days), 2)
+        during = self.snapshot()
+
+        SalesRollup.objects.all().delete()
+        rebuild_rollups()
+        self.assertEqual(self.snapshot(), during)
+        today = timezone.localdate().isoformat()
+        (row,) = self.report(start=today, end=today)
+        self.assertEqual(row['orders'], 3)
+
+    def test_rebuild_clears_rollups_of_deleted_orders(self):
+        self.place_order(self.products)
+        Order.objects.all().delete()
+        self.assertEqual(rebuild_rollups(), 0)
+        self.assertFalse(SalesRollup.objects.exists())
+
+    def test_date_range(self):
+        self.place_order(self.products)
+        Order.objects.update(ordered_at=timezone.now() - timedelta(days=3))
+        self.place_order(self.products[:1])
+        rebuild_rollups()
+
+        today = timezone.localdate().isoformat()
+        (row,) = self.report(period='total', start=today, end=today)
+        self.assertEqual(row['orders'], 1)
+        self.assertEqual(len(self.report()), 2)
+        self.assertEqual(self.staff.get(reverse('sales-report'), {'by': 'cashier'}).status_code, 400)
+
+    @override_settings(SALES_REPORT_DEFAULT_DAYS=2, SALES_REPORT_MAX_DAYS=10, SALES_REPORT_MAX_ROWS=5)
+    def test_day_and_hour_reports_are_bounded(self):
+        self.place_order(self.products)
+        Order.objects.update(ordered_at=timezone.now() - timedelta(days=3))
+        self.place_order(self.products[:1])
+        rebuild_rollups()
+        today = timezone.localdate()
+
+        response = self.staff.get(reverse('sales-report'), {'period': 'hour'})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(
+            (response.data['start'], response.data['end']),
+            ((today - timedelta(days=1)).isoformat(), today.isoformat()),
+        )
+        start = (today - timedelta(days=3)).isoformat()
+        (oldest,) = self.report(start=start, limit=1)
+        self.assertEqual(oldest['start'][:10], start)
+        self.assertEqual(len(self.report(period='total', by='product')), 3)
+
+        for params in ({'start': (today - timedelta(days=10)).isoformat()}, {'limit': 6}, {'limit': 0}):
+            response = self.staff.get(reverse('sales-report'), params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.data)
@@ -0,0 +1,57 @@
+# views.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils.timezone import localtime
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from rest_framework import status
+
+from orders.export import ExportError, export_range
+from .rollups import ReportError, report_range, sales_report
+
+
+class SalesReportView(APIView):
+    """Orders, items sold and revenue, answered from the sales rollups only.
+
+    ``period`` is day, hour or total (the whole range in one row per key,
+    highest revenue first), ``by`` is total, order_type, product or category
+    and ``start``/``end`` are local dates, both included. Day and hour
+    reports default to the last ``SALES_REPORT_DEFAULT_DAYS`` days and the
+    response gives the range used. Every report returns at most ``limit``
+    rows, ``SALES_REPORT_MAX_ROWS`` by default and at most.
+    """
+    permission_classes = [IsAdminUser]
+    read_from_replica = True
+    query_budget = 4
+
+    def get(self, request):
+        period = request.query_params.get('period', 'day')
+        dimension = request.query_params.get('by', 'total')
+        start = request.query_params.get('start')
+        end = request.query_params.get('end')
+        max_rows = settings.SALES_REPORT_MAX_ROWS
+        limit = request.query_params.get('limit')
+        try:
+            limit = int(limit) if limit else max_rows
+            if not 1 <= limit <= max_rows:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {'error': f'limit must be a number from 1 to {max_rows}'}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            since, until = report_range(period, *export_range(start, end))
+            results = sales_report(period, dimension, since, until, limit)
+        except (ExportError, ReportError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'period': period,
+            'by': dimension,
+            'start': localtime(since).date().isoformat() if since else None,
+            'end': (localtime(until) - timedelta(days=1)).date().isoformat() if until else None,
+            'results': results,
+        }, status=status.HTTP_200_OK)